@@ -0,0 +1,164 @@
+"""Requests per second of one API worker, sync vs async request path.
+
+Starts a single uvicorn worker for each app in turn and drives it with
+concurrent clients that create a case and read it back:
+
+  sync   the previous request path: `async def` endpoints calling the sync
+         Session and redis-py, defined below as `sync_app`
+  async  main:app on AsyncSession/asyncpg and redis.asyncio
+
+    python benchmarks/api_throughput.py --concurrency 64 --duration 20
+
+Needs the Postgres and Redis configured by set_env.sh. The benchmark
+hospital and its cases are left in place so repeated runs see the same data.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import Depends, FastAPI, HTTPException
+from sqlalchemy.orm import Session
+
+from crud.cases import get_case
+from database import SessionLocal, get_db, init_db
+from models.models import CaseResponse, HospitalPolicy, PatientProfile
+from services.queue_manager import QueueManager
+
+HOSPITAL_ID = "bench_hospital"
+
+sync_app = FastAPI(title="Sync request path (benchmark baseline)")
+
+
+@sync_app.post('/cases/{hospital_id}', response_model=CaseResponse)
+async def sync_create_case_ep(hospital_id: str, patient: PatientProfile, db_session: Session = Depends(get_db)):
+    case = QueueManager(db_session).add_case(patient, hospital_id)
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not Queued")
+    return case
+
+
+@sync_app.get('/cases/{case_id}', response_model=CaseResponse)
+async def sync_get_case_ep(case_id: str, db_session: Session = Depends(get_db)):
+    case = get_case(db_session, case_id)
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return case
+
+
+def ensure_hospital():
+    db = SessionLocal()
+    try:
+        manager = QueueManager(db)
+        if not manager.get_hospital(HOSPITAL_ID):
+            manager.add_hospital(HospitalPolicy(
+                hospital_id=HOSPITAL_ID,
+                name="Benchmark hospital",
+                sla_rules={"emergency": 15, "urgent": 60, "routine": 240},
+                working_hours={"monday": "00:00-23:59"},
+            ))
+    finally:
+        db.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app: str, port: int) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--workers", "1", "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"{app} did not start")
+
+
+def _request(method: str, url: str, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def client_loop(base_url: str, deadline: float, latencies: list, errors: list):
+    while time.time() < deadline:
+        patient = {
+            "patient_id": f"bench_{uuid.uuid4()}",
+            "age": 42,
+            "gender": "F",
+            "medical_history": ["hypertension"],
+            "symptoms": ["chest_pain"],
+            "urgency_level": "urgent",
+            "arrival_time": datetime.now().isoformat(),
+        }
+        try:
+            start = time.perf_counter()
+            case = _request("POST", f"{base_url}/cases/{HOSPITAL_ID}", patient)
+            latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            _request("GET", f"{base_url}/cases/{case['case_id']}")
+            latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(str(e))
+
+
+def run_load(app: str, concurrency: int, duration: float) -> dict:
+    port = _free_port()
+    proc = start_server(app, port)
+    try:
+        latencies, errors = [], []
+        deadline = time.time() + duration
+        with ThreadPoolExecutor(concurrency) as pool:
+            for _ in range(concurrency):
+                pool.submit(client_loop, f"http://127.0.0.1:{port}", deadline, latencies, errors)
+        latencies.sort()
+        return {
+            "rps": len(latencies) / duration,
+            "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+            "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+            "errors": len(errors),
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args()
+
+    init_db()
+    ensure_hospital()
+    results = {}
+    for name, app in (("sync", "benchmarks.api_throughput:sync_app"), ("async", "main:app")):
+        results[name] = run_load(app, args.concurrency, args.duration)
+        r = results[name]
+        print(f"{name:>5}: {r['rps']:8.1f} req/s per worker  p50 {r['p50_ms']:7.1f} ms  "
+              f"p99 {r['p99_ms']:7.1f} ms  errors {r['errors']}")
+    if results["sync"]["rps"]:
+        print(f"speedup: {results['async']['rps'] / results['sync']['rps']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Case intake throughput: the previous add_case flow vs the single-transaction one.
+
+    python benchmarks/case_intake.py --cases 2000 --concurrency 32
+
+legacy  create_patient (commit + refresh), hospital SELECT for the SLA rules,
+        create_case (commit + refresh), then the Redis pipeline
+current AsyncQueueManager.add_case: cached SLA rules, one commit for patient,
+        case and outbox entry, then the Redis pipeline
+
+Runs against the Postgres and Redis configured by set_env.sh and prints
+intakes per second for each flow.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from crud.aio.cases import create_case
+from crud.aio.hospitals import get_hospital
+from crud.aio.patients import create_patient
+from database import AsyncSessionLocal, Case, Hospital, Patient, async_engine, init_db
+from models.models import HospitalPolicy, PatientProfile
+from services.async_queue_manager import AsyncQueueManager
+from services.queue_keys import QUEUE_EVENTS_KEY, QUEUE_REGISTRY_KEY, queue_key
+from services.redis_client import get_async_redis_client
+
+HOSPITAL_ID = "bench_intake_hospital"
+
+
+def make_patient() -> PatientProfile:
+    return PatientProfile(
+        patient_id=f"bench_{uuid.uuid4()}",
+        age=42,
+        gender="F",
+        medical_history=["hypertension"],
+        symptoms=["chest_pain"],
+        urgency_level="urgent",
+        arrival_time=datetime.now(),
+    )
+
+
+async def legacy_add_case(db, redis_client, patient: PatientProfile, hospital_id: str):
+    await create_patient(db, Patient(
+        patient_id=patient.patient_id,
+        age=patient.age,
+        gender=patient.gender,
+        medical_history=patient.medical_history,
+        symptoms=patient.symptoms,
+        urgency_level=patient.urgency_level,
+        preferred_doctor=patient.preferred_doctor,
+        arrival_time=patient.arrival_time
+    ))
+    hospital = await db.scalar(select(Hospital).where(Hospital.hospital_id == hospital_id))
+    sla_deadline = datetime.now() + timedelta(minutes=hospital.sla_rules.get(patient.urgency_level.value, 120))
+    case = await create_case(db, Case(
+        case_id=f"case_{datetime.now().timestamp()}_{uuid.uuid4()}",
+        hospital_id=hospital_id,
+        patient_id=patient.patient_id,
+        status="pending",
+        priority_score=0.0,
+        created_at=datetime.now(),
+        sla_deadline=sla_deadline
+    ))
+    pipe = redis_client.pipeline()
+    pipe.zadd(queue_key(hospital_id), {case.case_id: sla_deadline.timestamp()})
+    pipe.sadd(QUEUE_REGISTRY_KEY, hospital_id)
+    pipe.lpush(QUEUE_EVENTS_KEY, hospital_id)
+    await pipe.execute()
+    return case
+
+
+async def current_add_case(db, redis_client, patient: PatientProfile, hospital_id: str):
+    return await AsyncQueueManager(db, redis_client).add_case(patient, hospital_id)
+
+
+async def run(flow, cases: int, concurrency: int) -> float:
+    redis_client = get_async_redis_client()
+    remaining = iter(range(cases))
+
+    async def worker():
+        for _ in remaining:
+            async with AsyncSessionLocal() as db:
+                await flow(db, redis_client, make_patient(), HOSPITAL_ID)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return cases / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    async with AsyncSessionLocal() as db:
+        if not await get_hospital(db, HOSPITAL_ID):
+            await AsyncQueueManager(db).add_hospital(HospitalPolicy(
+                hospital_id=HOSPITAL_ID,
+                name="Intake benchmark hospital",
+                sla_rules={"emergency": 15, "urgent": 60, "routine": 240},
+                working_hours={"monday": "00:00-23:59"},
+            ))
+
+    results = {}
+    for name, flow in (("legacy", legacy_add_case), ("current", current_add_case)):
+        results[name] = await run(flow, args.cases, args.concurrency)
+        print(f"{name:>7}: {results[name]:8.1f} intakes/s")
+    print(f"speedup: {results['current'] / results['legacy']:.2f}x")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    init_db()
+    asyncio.run(main())
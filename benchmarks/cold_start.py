@@ -0,0 +1,170 @@
+"""Cold start to first assignment, with and without the startup warmup.
+
+Starts the API the way start.sh does (gunicorn with gunicorn.conf.py and
+--preload) plus one queue consumer, then times:
+
+  listening          until the port accepts connections
+  ready              until GET /health/ready answers 200
+  first case         the POST of the first case
+  first assignment   until that case has a doctor, from the start
+
+  preload  WARMUP_PRELOAD_MODEL=true, the first case is sent once ready
+  lazy     WARMUP_PRELOAD_MODEL=false, the first case is sent once listening
+
+    python benchmarks/cold_start.py --workers 4 --runs 3
+
+Needs the Postgres and Redis configured by set_env.sh, and a saved model
+for the preload run to have something to load. The benchmark hospital and
+doctor are left in place.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import SessionLocal, init_db
+from models.models import DoctorProfile, HospitalPolicy
+from services.queue_manager import QueueManager
+
+HOSPITAL_ID = "bench_cold_start_hospital"
+DOCTOR_ID = "bench_cold_start_doctor"
+
+
+def ensure_hospital():
+    db = SessionLocal()
+    try:
+        manager = QueueManager(db)
+        if not manager.get_hospital(HOSPITAL_ID):
+            manager.add_hospital(HospitalPolicy(
+                hospital_id=HOSPITAL_ID,
+                name="Cold start benchmark hospital",
+                sla_rules={"emergency": 15, "urgent": 60, "routine": 240},
+                working_hours={"monday": "00:00-23:59"},
+            ))
+            manager.register_doctor(DoctorProfile(
+                doctor_id=DOCTOR_ID,
+                name="Cold start benchmark doctor",
+                specialty="general",
+                hospital_id=HOSPITAL_ID,
+                working_hours={"monday": "00:00-23:59"},
+                current_workload=0,
+                max_daily_cases=1_000_000,
+                experience_years=10,
+                patient_rating=4.5,
+            ))
+    finally:
+        db.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(method: str, url: str, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def _wait_until(check, timeout: float = 120) -> float:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if check():
+                return time.perf_counter()
+        except (OSError, urllib.error.URLError):
+            pass
+        time.sleep(0.02)
+    raise RuntimeError("Timed out waiting for the server")
+
+
+def _listening(port: int) -> bool:
+    socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+    return True
+
+
+def _ready(base_url: str) -> bool:
+    return _request("GET", f"{base_url}/health/ready")["ready"]
+
+
+def _assigned(base_url: str, case_id: str) -> bool:
+    return _request("GET", f"{base_url}/cases/{case_id}")["assigned_doctor_id"] is not None
+
+
+def cold_start(mode: str, workers: int) -> dict:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "WARMUP_PRELOAD_MODEL": "true" if mode == "preload" else "false"}
+    start = time.perf_counter()
+    api = subprocess.Popen(
+        ["gunicorn", "-c", "gunicorn.conf.py", "-w", str(workers), "-k", "uvicorn.workers.UvicornWorker",
+         "main:app", "--bind", f"127.0.0.1:{port}", "--log-level", "warning", "--preload"],
+        cwd=ROOT, env=env,
+    )
+    consumer = subprocess.Popen([sys.executable, "queue_consumer.py"], cwd=ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        listening = _wait_until(lambda: _listening(port))
+        ready = _wait_until(lambda: _ready(base_url)) if mode == "preload" else None
+        patient = {
+            "patient_id": f"bench_{uuid.uuid4()}",
+            "age": 42,
+            "gender": "F",
+            "medical_history": ["hypertension"],
+            "symptoms": ["chest_pain"],
+            "urgency_level": "urgent",
+            "arrival_time": datetime.now().isoformat(),
+        }
+        sent = time.perf_counter()
+        case = _request("POST", f"{base_url}/cases/{HOSPITAL_ID}", patient)
+        created = time.perf_counter()
+        assigned = _wait_until(lambda: _assigned(base_url, case["case_id"]))
+        return {
+            "listening_s": listening - start,
+            "ready_s": ready - start if ready else None,
+            "first_case_ms": (created - sent) * 1000,
+            "first_assignment_s": assigned - start,
+        }
+    finally:
+        for proc in (api, consumer):
+            proc.terminate()
+        for proc in (api, consumer):
+            proc.wait()
+
+
+def _median(runs, key):
+    values = [run[key] for run in runs if run[key] is not None]
+    return statistics.median(values) if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    init_db()
+    ensure_hospital()
+    for mode in ("lazy", "preload"):
+        runs = [cold_start(mode, args.workers) for _ in range(args.runs)]
+        print(f"{mode:>7}: listening {_median(runs, 'listening_s'):6.2f} s  ready {_median(runs, 'ready_s'):6.2f} s  "
+              f"first case {_median(runs, 'first_case_ms'):8.1f} ms  "
+              f"first assignment {_median(runs, 'first_assignment_s'):6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
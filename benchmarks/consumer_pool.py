@@ -0,0 +1,294 @@
+"""Local multi-process harness for the consumer group mode.
+
+Runs N real CaseQueueConsumer processes in group mode: ConsumerGroup
+membership, ownership and wakeup routing, drain_queue(), QueueLeases
+reserve/ack through the RedisBatcher, and process_case()/process_batch().
+Only the database is simulated. SimulatedQueueManager and SimulatedSession
+stand in for QueueManager and the SQLAlchemy session, with a fixed cost per
+assignment and per commit. Case state is kept in a Redis set shared by all
+workers, so a case assigned twice is counted.
+
+It reports drain throughput for several pool sizes, next to the bound set by
+how evenly rendezvous hashing spread the hospitals (total cases over the
+busiest worker's cases), and checks that a killed worker's hospitals are
+picked up by the survivors.
+
+    python benchmarks/consumer_pool.py --workers 1 2 4 --hospitals 32 --cases 50
+
+Uses REDIS_HOST/REDIS_PORT when --external is given, otherwise starts a
+local redis-server if one is on PATH and falls back to fakeredis' TCP server.
+The fakeredis server is single-threaded Python and shares the harness
+process, so it caps throughput well below a real Redis; scaling measured
+against it understates the pool. Needs the full requirements installed, the
+consumer imports the ML stack.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+
+from services.consumer_group import GROUP_MEMBERS_KEY
+from services.queue_keys import QUEUE_EVENTS_KEY, QUEUE_REGISTRY_KEY, queue_key
+
+PROCESSED_KEY = "harness:processed"
+ASSIGNED_KEY = "harness:assigned"
+DUPLICATES_KEY = "harness:duplicates"
+PER_WORKER_KEY = "harness:per_worker"
+OWNERS_KEY = "harness:owners"
+HEARTBEAT_INTERVAL = 0.5
+HEARTBEAT_TTL = 1.5
+# A killed worker's cases come back once their lease expires and a survivor rescans
+LEASE_SECONDS = 2
+RESCAN_INTERVAL = 1
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_redis():
+    port = _free_port()
+    if shutil.which("redis-server"):
+        proc = subprocess.Popen(["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+                                stdout=subprocess.DEVNULL)
+        stop = proc.terminate
+    else:
+        from fakeredis import TcpFakeServer
+        import threading
+        server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stop = server.shutdown
+    client = redis.Redis(host="127.0.0.1", port=port)
+    for _ in range(50):
+        try:
+            client.ping()
+            return port, stop
+        except redis.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError("Redis stand-in did not start")
+
+
+class SimulatedCase:
+    def __init__(self, case_id: str, hospital_id: str, status: str):
+        self.case_id = case_id
+        self.hospital_id = hospital_id
+        self.status = status
+
+
+class SimulatedDoctor:
+    doctor_id = "harness_doctor"
+
+
+class SimulatedSession:
+    """The session calls the consumer makes, commit costs `commit_seconds` plus `work_seconds` per assignment."""
+
+    def __init__(self, client: redis.Redis, work_seconds: float, commit_seconds: float):
+        self.client = client
+        self.work_seconds = work_seconds
+        self.commit_seconds = commit_seconds
+        self.staged = []
+
+    def commit(self):
+        time.sleep(self.commit_seconds + self.work_seconds * len(self.staged))
+        if self.staged:
+            pipe = self.client.pipeline()
+            for case in self.staged:
+                pipe.sadd(ASSIGNED_KEY, case.case_id)
+            for added in pipe.execute():
+                if not added:
+                    self.client.incr(DUPLICATES_KEY)
+        self.staged = []
+
+    def rollback(self):
+        self.staged = []
+
+
+class SimulatedQueueManager:
+    """The QueueManager methods process_case() and process_batch() call, without a database."""
+
+    def __init__(self, client: redis.Redis, db: SimulatedSession, worker_id: str):
+        self.client = client
+        self.db = db
+        self.worker_id = worker_id
+        self.doctor = SimulatedDoctor()
+
+    def lock_cases(self, case_ids, *options):
+        assigned = self.client.smismember(ASSIGNED_KEY, case_ids)
+        cases = {
+            case_id: SimulatedCase(case_id, case_id.split("-")[0], "assigned" if done else "pending")
+            for case_id, done in zip(case_ids, assigned)
+        }
+        return cases, []
+
+    def find_best_doctor(self, case):
+        return self.doctor
+
+    def get_available_doctors(self, hospital_id: str):
+        return [self.doctor]
+
+    def select_doctors_for_batch(self, cases, doctors):
+        return [self.doctor] * len(cases)
+
+    def predict_cases(self, cases):
+        pass
+
+    def assign_case_to_doctor(self, case, doctor) -> bool:
+        case.status = "assigned"
+        self.db.staged.append(case)
+        return True
+
+    def assignment_record(self, case, doctor):
+        return case.hospital_id, case.case_id
+
+    def publish_doctor_changes(self, doctors):
+        pass
+
+    def record_assignments(self, records, started: float):
+        if not records:
+            return
+        pipe = self.client.pipeline()
+        pipe.incrby(PROCESSED_KEY, len(records))
+        pipe.hincrby(PER_WORKER_KEY, self.worker_id, len(records))
+        for hospital_id, _ in records:
+            pipe.sadd(f"{OWNERS_KEY}:{hospital_id}", self.worker_id)
+        pipe.execute()
+
+    def discard_pending_assignments(self, hospital_id: str):
+        self.db.rollback()
+
+
+def worker(host: str, port: int, work_seconds: float, commit_seconds: float, batch_size: int):
+    os.environ.update(REDIS_HOST=host, REDIS_PORT=str(port), QUEUE_LEASE_SECONDS=str(LEASE_SECONDS),
+                      CONSUMER_RESCAN_INTERVAL=str(RESCAN_INTERVAL))
+    import queue_consumer
+    from services import consumer_group
+    from services.queue_leases import QueueLeases
+    from services.redis_batch import RedisBatcher
+
+    consumer_group.CONSUMER_HEARTBEAT_INTERVAL = HEARTBEAT_INTERVAL
+    consumer_group.CONSUMER_HEARTBEAT_TTL = HEARTBEAT_TTL
+    logging.getLogger().setLevel(logging.WARNING)
+    # Per-process stats are not part of what is measured
+    for name in ("publish_pool_stats", "publish_db_pool_stats", "publish_inference_stats", "publish_model_version_stats"):
+        setattr(queue_consumer, name, lambda role: None)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    client = redis.Redis(host=host, port=port)
+    # The real consumer, minus the listeners and the database its __init__ sets up
+    consumer = queue_consumer.CaseQueueConsumer.__new__(queue_consumer.CaseQueueConsumer)
+    consumer.redis_client = client
+    consumer.db = SimulatedSession(client, work_seconds, commit_seconds)
+    consumer.batcher = RedisBatcher(client)
+    consumer.leases = QueueLeases(client, batcher=consumer.batcher)
+    consumer.queue_manager = SimulatedQueueManager(client, consumer.db, consumer.leases.worker_id)
+    consumer.batch_size = batch_size
+    consumer.group = None
+    consumer.rebalance_pending = False
+    consumer.run_group()
+
+
+def seed(client: redis.Redis, hospitals: int, cases: int):
+    pipe = client.pipeline()
+    for h in range(hospitals):
+        hospital_id = f"h{h}"
+        pipe.zadd(queue_key(hospital_id), {f"{hospital_id}-c{c}": c for c in range(cases)})
+        pipe.sadd(QUEUE_REGISTRY_KEY, hospital_id)
+        pipe.lpush(QUEUE_EVENTS_KEY, hospital_id)
+    pipe.execute()
+
+
+def wait_for_members(client: redis.Redis, count: int):
+    while client.zcard(GROUP_MEMBERS_KEY) < count:
+        time.sleep(0.05)
+    # Let every worker see the full member list before work arrives
+    time.sleep(2 * HEARTBEAT_INTERVAL)
+
+
+def wait_drained(client: redis.Redis, total: int, timeout: float) -> float:
+    start = time.time()
+    while client.scard(ASSIGNED_KEY) < total:
+        if time.time() - start > timeout:
+            raise TimeoutError(f"only {client.scard(ASSIGNED_KEY)}/{total} cases drained")
+        time.sleep(0.01)
+    return time.time() - start
+
+
+def run_pool(host: str, port: int, workers: int, args, kill_after: float = None):
+    client = redis.Redis(host=host, port=port)
+    client.flushdb()
+    procs = [
+        multiprocessing.Process(
+            target=worker, args=(host, port, args.work_ms / 1000, args.commit_ms / 1000, args.batch_size), daemon=True
+        )
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    wait_for_members(client, workers)
+    total = args.hospitals * args.cases
+    seed(client, args.hospitals, args.cases)
+    if kill_after is not None:
+        time.sleep(kill_after)
+        os.kill(procs[0].pid, signal.SIGKILL)
+    elapsed = wait_drained(client, total, timeout=args.timeout)
+    shared = sum(1 for h in range(args.hospitals) if client.scard(f"{OWNERS_KEY}:h{h}") > 1)
+    per_worker = [int(count) for count in client.hgetall(PER_WORKER_KEY).values()]
+    duplicates = int(client.get(DUPLICATES_KEY) or 0)
+    for proc in procs:
+        proc.terminate()
+        proc.join()
+    return total, elapsed, shared, per_worker, duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--hospitals", type=int, default=32)
+    parser.add_argument("--cases", type=int, default=50)
+    parser.add_argument("--work-ms", type=float, default=2.0, help="simulated DB cost per assignment")
+    parser.add_argument("--commit-ms", type=float, default=1.0, help="simulated DB cost per commit")
+    parser.add_argument("--batch-size", type=int, default=1, help="CONSUMER_BATCH_SIZE of the workers")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--external", action="store_true", help="use REDIS_HOST/REDIS_PORT instead of a local server")
+    args = parser.parse_args()
+
+    if args.external:
+        host, port, stop = os.getenv("REDIS_HOST", "localhost"), int(os.getenv("REDIS_PORT", "6379")), (lambda: None)
+    else:
+        host = "127.0.0.1"
+        port, stop = start_redis()
+    try:
+        baseline = None
+        print(f"{'workers':>8} {'cases':>8} {'seconds':>8} {'cases/s':>10} {'speedup':>8} "
+              f"{'bound':>6} {'shared':>7} {'dupes':>6}")
+        for workers in args.workers:
+            total, elapsed, shared, per_worker, duplicates = run_pool(host, port, workers, args)
+            rate = total / elapsed
+            baseline = baseline or rate / workers
+            # Cases sharded by hospital: the busiest worker sets the best possible drain time
+            bound = sum(per_worker) / max(per_worker) if per_worker else float("nan")
+            print(f"{workers:>8} {total:>8} {elapsed:>8.2f} {rate:>10.1f} {rate / baseline:>8.2f} "
+                  f"{bound:>6.2f} {shared:>7} {duplicates:>6}")
+
+        failover_workers = max(max(args.workers), 2)
+        total, elapsed, _, _, duplicates = run_pool(host, port, failover_workers, args, kill_after=0.2)
+        print(f"failover: killed 1 of {failover_workers} workers, all {total} cases drained in {elapsed:.2f}s, "
+              f"{duplicates} assigned twice")
+    finally:
+        stop()
+
+
+if __name__ == "__main__":
+    main()
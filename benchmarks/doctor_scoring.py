@@ -0,0 +1,78 @@
+"""Compare per-doctor Python scoring with the vectorized DoctorScoringEngine.
+
+    python benchmarks/doctor_scoring.py --doctors 1000 --cases 10000
+
+Scores every case against every doctor both ways, checks that the chosen
+doctor is identical for every case and prints wall times.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.doctor_scoring import DoctorScoringEngine, score_doctor
+
+TAGS = [f"tag_{i}" for i in range(150)]
+SYMPTOMS = TAGS + [f"symptom_{i}" for i in range(100)]
+
+
+def make_doctors(count: int, rng: random.Random):
+    doctors = []
+    for i in range(count):
+        max_cases = rng.randint(5, 30)
+        doctors.append(SimpleNamespace(
+            doctor_id=f"d{i}",
+            experience_years=rng.randint(0, 40),
+            patient_rating=round(rng.uniform(1, 5), 1),
+            success_rate=rng.choice([None, 0.0, round(rng.uniform(0.5, 1), 2)]),
+            specialization_tags=rng.sample(TAGS, rng.randint(0, 4)),
+            current_workload=rng.randint(0, max_cases - 1),
+            max_daily_cases=max_cases,
+        ))
+    return doctors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doctors", type=int, default=1000)
+    parser.add_argument("--cases", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    doctors = make_doctors(args.doctors, rng)
+    symptom_lists = [rng.sample(SYMPTOMS, rng.randint(1, 6)) for _ in range(args.cases)]
+
+    start = time.perf_counter()
+    scalar_best = [max(doctors, key=lambda doc: score_doctor(doc, symptoms)).doctor_id for symptoms in symptom_lists]
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = DoctorScoringEngine(doctors)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    per_case_best = [engine.best(symptoms).doctor_id for symptoms in symptom_lists]
+    per_case_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    scores = engine.score_batch(symptom_lists)
+    batch_best = [doctors[i].doctor_id for i in scores.argmax(axis=1)]
+    batch_seconds = time.perf_counter() - start
+
+    pairs = args.doctors * args.cases
+    print(f"{args.doctors} doctors x {args.cases} cases = {pairs:,} scores")
+    print(f"{'python max(calculate score)':<30} {scalar_seconds:>9.3f}s")
+    print(f"{'engine build':<30} {build_seconds:>9.3f}s")
+    print(f"{'engine per case':<30} {per_case_seconds:>9.3f}s  {scalar_seconds / per_case_seconds:>6.1f}x")
+    print(f"{'engine batch':<30} {batch_seconds:>9.3f}s  {scalar_seconds / batch_seconds:>6.1f}x")
+    mismatches = sum(a != b for a, b in zip(scalar_best, per_case_best)) + sum(a != b for a, b in zip(scalar_best, batch_best))
+    print(f"ranking mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Query plans and latencies of the hot queries with and without the composite indexes.
+
+Builds a synthetic dataset in its own Postgres schema (default 1M cases over
+200 hospitals, 20k doctors, 200k outcomes), then for each hot query prints
+the EXPLAIN (ANALYZE, BUFFERS) plan and median latency, first without the
+indexes declared in database.py and then after upgrade_indexes() created them.
+
+    python benchmarks/query_indexes.py --cases 1000000
+
+Uses the Postgres configured by set_env.sh. The schema is dropped at the end
+unless --keep is given.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+
+from database import SQLALCHEMY_DATABASE_URL, Base, upgrade_indexes
+
+SCHEMA = "index_bench"
+
+QUERIES = {
+    "available doctors": (
+        "SELECT * FROM doctors WHERE hospital_id = :hospital_id AND availability = true "
+        "AND current_workload < max_daily_cases"
+    ),
+    "pending cases": "SELECT * FROM cases WHERE hospital_id = :hospital_id AND status = 'pending'",
+    "case outcome": "SELECT * FROM case_outcomes WHERE case_id = :case_id LIMIT 1",
+    "training join": (
+        "SELECT cases.case_id FROM cases JOIN case_outcomes ON cases.case_id = case_outcomes.case_id "
+        "WHERE cases.status = 'completed'"
+    ),
+}
+
+SEED = """
+INSERT INTO hospitals (hospital_id, name, sla_rules, max_cases_per_specialist, max_cases_per_general, working_hours)
+SELECT 'h' || i, 'Hospital ' || i, '{"emergency": 15, "urgent": 60, "routine": 240}', 5, 6, '{}'
+FROM generate_series(1, :hospitals) i;
+
+INSERT INTO patients (patient_id, age, gender, medical_history, symptoms, urgency_level, arrival_time)
+SELECT 'p' || i, 20 + i % 60, 'F', '[]', '["fever"]',
+       (ARRAY['EMERGENCY', 'URGENT', 'ROUTINE'])[1 + i % 3]::urgencylevelenum, now()
+FROM generate_series(1, :cases) i;
+
+INSERT INTO doctors (doctor_id, name, specialty, hospital_id, availability, working_hours,
+                     current_workload, max_daily_cases, experience_years, patient_rating,
+                     specialization_tags, success_rate)
+SELECT 'd' || i, 'Doctor ' || i, 'general', 'h' || (1 + i % :hospitals), i % 10 = 0, '{}',
+       i % 12, 10, i % 40, 1 + (i % 40) / 10.0, '["fever"]', 0.9
+FROM generate_series(1, :doctors) i;
+
+-- 2% pending, outcomes for the first :outcomes completed cases
+INSERT INTO cases (case_id, hospital_id, patient_id, status, priority_score, created_at, last_updated,
+                   sla_deadline, assignment_history)
+SELECT 'c' || i, 'h' || (1 + i % :hospitals), 'p' || i,
+       CASE WHEN i % 50 = 0 THEN 'pending' WHEN i % 5 = 0 THEN 'assigned' ELSE 'completed' END,
+       0, now() - (i || ' seconds')::interval, now(), now(), '[]'
+FROM generate_series(1, :cases) i;
+
+INSERT INTO case_outcomes (id, case_id, final_status, actual_duration, was_reassigned, met_sla, created_at)
+SELECT 'o' || i, 'c' || i, 'completed', 30, false, true, now()
+FROM generate_series(1, :cases) i
+WHERE i % 5 != 0 AND i % 50 != 0
+LIMIT :outcomes;
+"""
+
+
+def measure(connection, name: str, params: dict, repeat: int):
+    plan = connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {QUERIES[name]}"), params).scalars().all()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        connection.execute(text(QUERIES[name]), params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return plan, statistics.median(timings)
+
+
+def run_queries(connection, repeat: int) -> dict:
+    params = {"hospital_id": "h7", "case_id": "c1234"}
+    results = {}
+    for name in QUERIES:
+        plan, median_ms = measure(connection, name, params, repeat)
+        results[name] = median_ms
+        print(f"\n--- {name}: {median_ms:.2f} ms median")
+        print("\n".join(plan))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=1_000_000)
+    parser.add_argument("--hospitals", type=int, default=200)
+    parser.add_argument("--doctors", type=int, default=20_000)
+    parser.add_argument("--outcomes", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help=f"keep the {SCHEMA} schema")
+    args = parser.parse_args()
+
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"options": f"-c search_path={SCHEMA}"})
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        try:
+            Base.metadata.create_all(bind=connection)
+            new_indexes = [
+                index.name for table in Base.metadata.sorted_tables for index in table.indexes
+                if index.dialect_options["postgresql"]["concurrently"]
+            ]
+            for name in new_indexes:
+                connection.execute(text(f'DROP INDEX "{name}"'))
+
+            print(f"Seeding {args.cases} cases...")
+            start = time.perf_counter()
+            for statement in SEED.split(";\n"):
+                if statement.strip():
+                    connection.execute(text(statement), {
+                        "hospitals": args.hospitals, "cases": args.cases,
+                        "doctors": args.doctors, "outcomes": args.outcomes,
+                    })
+            connection.execute(text("ANALYZE"))
+            print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+            print("\n===== without indexes =====")
+            before = run_queries(connection, args.repeat)
+
+            start = time.perf_counter()
+            upgrade_indexes(connection)
+            connection.execute(text("ANALYZE"))
+            print(f"\nCreated {', '.join(new_indexes)} in {time.perf_counter() - start:.1f}s")
+
+            print("\n===== with indexes =====")
+            after = run_queries(connection, args.repeat)
+
+            print("\nquery                 before ms   after ms   speedup")
+            for name in QUERIES:
+                speedup = before[name] / after[name] if after[name] else float("inf")
+                print(f"{name:<20} {before[name]:>10.2f} {after[name]:>10.2f} {speedup:>8.1f}x")
+        finally:
+            if not args.keep:
+                connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Redis round trips per assigned case, with and without the RedisBatcher.
+
+Replays the consumer's per-case Redis traffic against a hospital queue:
+reserve the head case, ack it after the (skipped) DB commit and publish the
+doctor's new state, until the queue is empty.
+
+unbatched  QueueLeases on the plain client: EVALSHA, ack pipeline, PUBLISH
+batched    QueueLeases with a RedisBatcher: the ack and PUBLISH of one case
+           go out in the same round trip as the reserve of the next
+
+    python benchmarks/redis_batching.py --cases 5000
+
+Round trips are counted on the client connection. Uses REDIS_HOST/REDIS_PORT
+when --external is given, otherwise starts a local redis-server if one is on
+PATH and falls back to fakeredis' TCP server.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+
+from benchmarks.consumer_pool import start_redis
+from services.doctor_index import DoctorRecord, publish_doctor_upsert
+from services.queue_keys import queue_key
+from services.queue_leases import QueueLeases, inflight_key, inflight_meta_key
+from services.redis_batch import RedisBatcher
+
+HOSPITAL_ID = "bench_batching_hospital"
+
+
+class CountingConnection(redis.Connection):
+    round_trips = 0
+
+    def send_packed_command(self, command, check_health=True):
+        CountingConnection.round_trips += 1
+        return super().send_packed_command(command, check_health)
+
+
+def seed(client: redis.Redis, cases: int):
+    client.delete(queue_key(HOSPITAL_ID), inflight_key(HOSPITAL_ID), inflight_meta_key(HOSPITAL_ID))
+    for start in range(0, cases, 1000):
+        client.zadd(queue_key(HOSPITAL_ID), {f"case_{i}": i for i in range(start, min(start + 1000, cases))})
+
+
+def run(client: redis.Redis, batched: bool, cases: int):
+    seed(client, cases)
+    batcher = RedisBatcher(client) if batched else None
+    leases = QueueLeases(client, worker_id="bench", batcher=batcher)
+    doctor = DoctorRecord(doctor_id="bench_doctor", hospital_id=HOSPITAL_ID, availability=True,
+                          max_daily_cases=cases, specialization_tags=["general"])
+    # Warm the script cache so both runs start from the same state
+    leases.reserve("bench_warmup")
+
+    CountingConnection.round_trips = 0
+    start = time.perf_counter()
+    assigned = 0
+    while True:
+        case_ids = leases.reserve(HOSPITAL_ID, 1)
+        if not case_ids:
+            break
+        leases.ack(HOSPITAL_ID, case_ids)
+        doctor.current_workload += 1
+        if batcher:
+            batcher.defer(lambda pipe: publish_doctor_upsert(pipe, doctor))
+        else:
+            publish_doctor_upsert(client, doctor)
+        assigned += 1
+    if batcher:
+        batcher.flush()
+    elapsed = time.perf_counter() - start
+    leftover = client.zcard(inflight_key(HOSPITAL_ID))
+    return assigned, elapsed, CountingConnection.round_trips, leftover
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--external", action="store_true", help="use REDIS_HOST/REDIS_PORT instead of a local server")
+    args = parser.parse_args()
+
+    if args.external:
+        host, port, stop = os.getenv("REDIS_HOST", "localhost"), int(os.getenv("REDIS_PORT", "6379")), (lambda: None)
+    else:
+        host = "127.0.0.1"
+        port, stop = start_redis()
+    client = redis.Redis(connection_pool=redis.ConnectionPool(connection_class=CountingConnection, host=host, port=port))
+    try:
+        results = {}
+        print(f"{'mode':>10} {'cases':>8} {'seconds':>8} {'cases/s':>10} {'trips/case':>11} {'inflight':>9}")
+        for name, batched in (("unbatched", False), ("batched", True)):
+            assigned, elapsed, round_trips, leftover = run(client, batched, args.cases)
+            results[name] = (assigned / elapsed, round_trips / assigned)
+            print(f"{name:>10} {assigned:>8} {elapsed:>8.2f} {assigned / elapsed:>10.1f} "
+                  f"{round_trips / assigned:>11.2f} {leftover:>9}")
+        print(f"round trips: {results['unbatched'][1] / results['batched'][1]:.2f}x fewer, "
+              f"throughput: {results['batched'][0] / results['unbatched'][0]:.2f}x")
+    finally:
+        client.delete(queue_key(HOSPITAL_ID), inflight_key(HOSPITAL_ID), inflight_meta_key(HOSPITAL_ID))
+        stop()
+
+
+if __name__ == "__main__":
+    main()
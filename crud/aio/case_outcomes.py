@@ -0,0 +1,52 @@
+from typing import Optional, List
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import CaseOutcome
+
+async def create_case_outcome(db: AsyncSession, case_outcome: CaseOutcome) -> Optional[CaseOutcome]:
+    """
+    Create a new case outcome.
+
+    Args:
+        db: SQLAlchemy async database session
+        case_outcome: CaseOutcome object to create
+
+    Returns:
+        The created CaseOutcome object, None if the case already has an outcome
+    """
+    db.add(case_outcome)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return None
+    await db.refresh(case_outcome)
+    return case_outcome
+
+async def get_case_outcome(db: AsyncSession, case_id: str) -> Optional[CaseOutcome]:
+    """
+    Get a case outcome by case ID.
+
+    Args:
+        db: SQLAlchemy async database session
+        case_id: ID of the case to get outcome for
+
+    Returns:
+        The CaseOutcome object if found, None otherwise
+    """
+    return await db.scalar(select(CaseOutcome).where(CaseOutcome.case_id == case_id))
+
+async def get_all_case_outcomes(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[CaseOutcome]:
+    """
+    Get all case outcomes with pagination.
+
+    Args:
+        db: SQLAlchemy async database session
+        skip: Number of records to skip
+        limit: Maximum number of records to return
+
+    Returns:
+        List of CaseOutcome objects
+    """
+    return list(await db.scalars(select(CaseOutcome).offset(skip).limit(limit)))
@@ -0,0 +1,34 @@
+from typing import Optional, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import Case
+
+async def create_case(db: AsyncSession, case: Case) -> Case:
+    db.add(case)
+    await db.commit()
+    await db.refresh(case)
+    return case
+
+async def get_case(db: AsyncSession, case_id: str) -> Optional[Case]:
+    return await db.scalar(select(Case).where(Case.case_id == case_id))
+
+async def update_case(db: AsyncSession, case_id: str, case_data: dict) -> Optional[Case]:
+    case = await get_case(db, case_id)
+    if case:
+        for key, value in case_data.items():
+            if value:
+                setattr(case, key, value)
+        await db.commit()
+        await db.refresh(case)
+    return case
+
+async def delete_case(db: AsyncSession, case_id: str) -> bool:
+    case = await get_case(db, case_id)
+    if case:
+        await db.delete(case)
+        await db.commit()
+        return True
+    return False
+
+async def get_cases(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Case]:
+    return list(await db.scalars(select(Case).offset(skip).limit(limit)))
@@ -0,0 +1,33 @@
+from typing import Optional, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import Doctor
+
+async def create_doctor(db: AsyncSession, doctor: Doctor) -> Doctor:
+    db.add(doctor)
+    await db.commit()
+    await db.refresh(doctor)
+    return doctor
+
+async def get_doctor(db: AsyncSession, doctor_id: str) -> Optional[Doctor]:
+    return await db.scalar(select(Doctor).where(Doctor.doctor_id == doctor_id))
+
+async def update_doctor(db: AsyncSession, doctor_id: str, doctor_data: dict) -> Optional[Doctor]:
+    doctor = await get_doctor(db, doctor_id)
+    if doctor:
+        for key, value in doctor_data.items():
+            setattr(doctor, key, value)
+        await db.commit()
+        await db.refresh(doctor)
+    return doctor
+
+async def delete_doctor(db: AsyncSession, doctor_id: str) -> bool:
+    doctor = await get_doctor(db, doctor_id)
+    if doctor:
+        await db.delete(doctor)
+        await db.commit()
+        return True
+    return False
+
+async def get_doctors(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Doctor]:
+    return list(await db.scalars(select(Doctor).offset(skip).limit(limit)))
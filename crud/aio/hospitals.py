@@ -0,0 +1,34 @@
+from typing import Optional, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import Hospital
+
+async def create_hospital(db: AsyncSession, hospital: Hospital) -> Hospital:
+    db.add(hospital)
+    await db.commit()
+    await db.refresh(hospital)
+    return hospital
+
+async def get_hospital(db: AsyncSession, hospital_id: str) -> Optional[Hospital]:
+    return await db.scalar(select(Hospital).where(Hospital.hospital_id == hospital_id))
+
+async def update_hospital(db: AsyncSession, hospital_id: str, hospital_data: dict) -> Optional[Hospital]:
+    hospital = await get_hospital(db, hospital_id)
+    if hospital:
+        for key, value in hospital_data.items():
+            if value:
+                setattr(hospital, key, value)
+        await db.commit()
+        await db.refresh(hospital)
+    return hospital
+
+async def delete_hospital(db: AsyncSession, hospital_id: str) -> bool:
+    hospital = await get_hospital(db, hospital_id)
+    if hospital:
+        await db.delete(hospital)
+        await db.commit()
+        return True
+    return False
+
+async def get_hospitals(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Hospital]:
+    return list(await db.scalars(select(Hospital).offset(skip).limit(limit)))
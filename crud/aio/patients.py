@@ -0,0 +1,33 @@
+from typing import Optional, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import Patient
+
+async def create_patient(db: AsyncSession, patient: Patient) -> Patient:
+    db.add(patient)
+    await db.commit()
+    await db.refresh(patient)
+    return patient
+
+async def get_patient(db: AsyncSession, patient_id: str) -> Optional[Patient]:
+    return await db.scalar(select(Patient).where(Patient.patient_id == patient_id))
+
+async def update_patient(db: AsyncSession, patient_id: str, patient_data: dict) -> Optional[Patient]:
+    patient = await get_patient(db, patient_id)
+    if patient:
+        for key, value in patient_data.items():
+            setattr(patient, key, value)
+        await db.commit()
+        await db.refresh(patient)
+    return patient
+
+async def delete_patient(db: AsyncSession, patient_id: str) -> bool:
+    patient = await get_patient(db, patient_id)
+    if patient:
+        await db.delete(patient)
+        await db.commit()
+        return True
+    return False
+
+async def get_patients(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Patient]:
+    return list(await db.scalars(select(Patient).offset(skip).limit(limit)))
@@ -1,9 +1,20 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, JSON, ForeignKey, Enum
+from sqlalchemy import create_engine, text, true, Column, Index, Integer, String, Float, Boolean, DateTime, JSON, ForeignKey, Enum
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from services.redis_client import publish_process_stats
+import argparse
 import enum
 import os
 import datetime
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 
 POSTGRES_USER = os.getenv("POSTGRES_USER", "navneetkumar")
@@ -13,10 +24,104 @@ POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "medical_queue")
 
 SQLALCHEMY_DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
+
+# Per engine and per process. A web worker holds both engines, size them against WEB_WORKERS in start.sh.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_POOL_STATS_KEY = "db_pool_stats"
+# Serializes schema bootstrap across processes starting at the same time
+SCHEMA_BOOTSTRAP_LOCK_ID = 727100
+
+
+class PoolMetrics:
+    """Checkout wait times and timeouts of one connection pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += int(timed_out)
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            capacity = pool.size() + pool._max_overflow
+            checked_out = pool.checkedout()
+            return {
+                "pool_size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "checked_out": checked_out,
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "saturation": checked_out / capacity if capacity else 0.0,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": self.total_wait / self.checkouts * 1000 if self.checkouts else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
+POOL_METRICS = {"sync": PoolMetrics(), "async": PoolMetrics()}
 
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+class _InstrumentedPoolMixin:
+    metrics_name = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            POOL_METRICS[self.metrics_name].record(time.perf_counter() - start, timed_out=True)
+            raise
+        POOL_METRICS[self.metrics_name].record(time.perf_counter() - start)
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    metrics_name = "sync"
+
+
+class InstrumentedAsyncPool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+
+_pool_options = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+)
+
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+    **_pool_options,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Used by the API. The consumer, scheduler and ML training keep the sync engine.
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    poolclass=InstrumentedAsyncPool,
+    connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+    **_pool_options,
+)
+# Objects stay readable after commit, async sessions cannot lazy load expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 class UrgencyLevelEnum(str, enum.Enum):
@@ -56,6 +161,14 @@ class Doctor(Base):
     hospital = relationship("Hospital", back_populates="doctors")
     assigned_cases = relationship("Case", back_populates="assigned_doctor")
 
+    __table_args__ = (
+        # Candidate doctors of a hospital (get_available_doctors)
+        Index(
+            "ix_doctors_hospital_available", "hospital_id", "current_workload", "max_daily_cases",
+            postgresql_where=availability == true(), postgresql_concurrently=True,
+        ),
+    )
+
 class Patient(Base):
     __tablename__ = "patients"
 
@@ -94,6 +207,19 @@ class Case(Base):
     assigned_doctor = relationship("Doctor", back_populates="assigned_cases")
     outcome = relationship("CaseOutcome", back_populates="case", uselist=False)
 
+    __table_args__ = (
+        # Pending cases of a hospital in creation order (update_queue_priorities)
+        Index(
+            "ix_cases_hospital_pending", "hospital_id", "created_at",
+            postgresql_where=status == "pending", postgresql_concurrently=True,
+        ),
+        # Training set join on completed cases
+        Index(
+            "ix_cases_completed", "case_id",
+            postgresql_where=status == "completed", postgresql_concurrently=True,
+        ),
+    )
+
 class CaseOutcome(Base):
     __tablename__ = "case_outcomes"
 
@@ -108,6 +234,21 @@ class CaseOutcome(Base):
 
     case = relationship("Case", back_populates="outcome")
 
+    __table_args__ = (
+        # One outcome per case, also serves get_case_outcome
+        Index("uq_case_outcomes_case_id", "case_id", unique=True, postgresql_concurrently=True),
+    )
+
+class QueueOutbox(Base):
+    """Queue entries committed with their case, pushed to Redis by services/queue_outbox.py."""
+    __tablename__ = "queue_outbox"
+
+    id = Column(String, primary_key=True)
+    case_id = Column(String, nullable=False)
+    hospital_id = Column(String, nullable=False)
+    score = Column(Float, nullable=False)
+    created_at = Column(DateTime, nullable=False, index=True)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -115,5 +256,108 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def db_pool_stats() -> dict:
+    """Checkout wait and saturation of this process' sync and async pools."""
+    return {
+        "sync": POOL_METRICS["sync"].snapshot(engine.pool),
+        "async": POOL_METRICS["async"].snapshot(async_engine.sync_engine.pool),
+    }
+
+def publish_db_pool_stats(role: str = "web"):
+    publish_process_stats(DB_POOL_STATS_KEY, db_pool_stats(), role)
+
+def dispose_pools_after_fork():
+    """Give a forked worker empty pools. Connections opened by the parent stay open for the parent."""
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+def _drop_invalid_index(connection, name: str):
+    """A failed CREATE INDEX CONCURRENTLY leaves an INVALID index that IF NOT EXISTS would keep."""
+    invalid = connection.execute(text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {"name": name}).first()
+    if invalid:
+        logger.warning(f"Dropping invalid index {name}")
+        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+
+def _index_exists(connection, name: str) -> bool:
+    return connection.execute(text("SELECT 1 FROM pg_class WHERE relname = :name AND relkind = 'i'"),
+                              {"name": name}).first() is not None
+
+def _duplicated_case_outcomes(connection) -> int:
+    """Number of case_ids with more than one outcome, possible before uq_case_outcomes_case_id existed."""
+    return connection.execute(text(
+        "SELECT count(*) FROM ("
+        " SELECT case_id FROM case_outcomes WHERE case_id IS NOT NULL GROUP BY case_id HAVING count(*) > 1"
+        ") duplicated"
+    )).scalar()
+
+def delete_duplicate_case_outcomes(connection) -> int:
+    """Delete all but the newest outcome of each case, logging every outcome removed. Opt-in only."""
+    removed = connection.execute(text(
+        "DELETE FROM case_outcomes WHERE id IN ("
+        " SELECT id FROM ("
+        "  SELECT id, row_number() OVER (PARTITION BY case_id ORDER BY created_at DESC NULLS LAST, id DESC) AS rn"
+        "  FROM case_outcomes WHERE case_id IS NOT NULL"
+        " ) ranked WHERE rn > 1"
+        ") RETURNING id, case_id, created_at"
+    )).all()
+    for outcome_id, case_id, created_at in removed:
+        logger.warning(f"Deleted duplicate outcome {outcome_id} of case {case_id} (created {created_at})")
+    logger.warning(f"Deleted {len(removed)} duplicate case outcomes, kept the newest per case")
+    return len(removed)
+
+def _check_case_outcomes(connection, dedupe: bool):
+    duplicated = _duplicated_case_outcomes(connection)
+    if not duplicated:
+        return
+    if not dedupe:
+        raise RuntimeError(
+            f"{duplicated} case_ids have more than one case outcome, so uq_case_outcomes_case_id cannot be built. "
+            f"Review them, then run `python database.py --dedupe-case-outcomes` to keep only the newest outcome per case."
+        )
+    delete_duplicate_case_outcomes(connection)
+
+# Unique indexes existing rows may violate, checked before their first build
+UNIQUE_INDEX_CHECKS = {"uq_case_outcomes_case_id": _check_case_outcomes}
+
+def upgrade_indexes(connection, dedupe_case_outcomes: bool = False):
+    """Create indexes added to the models after their tables already existed.
+
+    Uses CREATE INDEX CONCURRENTLY so existing databases stay writable while
+    the indexes build. `connection` must be in autocommit mode. A unique
+    index that existing rows violate is not built and raises instead, unless
+    `dedupe_case_outcomes` allows deleting the duplicates.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            _drop_invalid_index(connection, index.name)
+            check = UNIQUE_INDEX_CHECKS.get(index.name)
+            if check and not _index_exists(connection, index.name):
+                check(connection, dedupe_case_outcomes)
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+def init_db(dedupe_case_outcomes: bool = False):
+    """Create missing tables and indexes. Run once per deploy (start.sh) rather than on import."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": SCHEMA_BOOTSTRAP_LOCK_ID})
+        try:
+            Base.metadata.create_all(bind=connection)
+            upgrade_indexes(connection, dedupe_case_outcomes)
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": SCHEMA_BOOTSTRAP_LOCK_ID})
+    logger.info("Database schema is up to date")
+
 
-Base.metadata.create_all(bind=engine)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create missing tables and indexes.")
+    parser.add_argument("--dedupe-case-outcomes", action="store_true",
+                        help="delete all but the newest outcome of each case so uq_case_outcomes_case_id can be built")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    init_db(dedupe_case_outcomes=args.dedupe_case_outcomes)
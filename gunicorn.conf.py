@@ -0,0 +1,12 @@
+# Loaded by start.sh. The app itself is imported in the master by --preload.
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any worker is forked
+    from services.warmup import preload_model
+    preload_model()
+
+
+def post_fork(server, worker):
+    from services.warmup import reset_after_fork
+    reset_after_fork()
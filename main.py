@@ -1,144 +1,240 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import *
 from models.models import *
-from database import get_db
-from services.queue_manager import QueueManager
+from database import get_async_db
+from services.async_queue_manager import AsyncQueueManager
+from services.bulk_intake import BulkIntake
+from services.hospital_cache import HOSPITAL_CACHE_STATS_KEY, hospital_cache, publish_hospital_cache_stats
+from services.queue_metrics import prometheus_text
+from ml.inference import ML_INFERENCE_STATS_KEY, publish_inference_stats
 from ml.model_manager import ModelManager
-from crud.doctors import get_doctor, update_doctor, delete_doctor
-from crud.cases import get_case, update_case, delete_case
+from ml.model_rollout import model_version_watcher, publish_model_version, rollout_status
+from ml.training_jobs import MODE_FULL, TRAINING_MODES, get_training_job, submit_training_job
+from crud.aio.doctors import get_doctor
+from crud.aio.cases import get_case, update_case, delete_case
 from scheduler import start_scheduler
+from services.warmup import warmup
+from services.redis_client import close_async_redis_client, get_async_redis_client, get_redis_client, collect_pool_stats, collect_process_stats, publish_pool_stats
 from typing import Optional, List
+import asyncio
+import json
 
 
 app = FastAPI(title="Medical Case Queue Management System")
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     start_scheduler()
+    hospital_cache.start_listener(get_redis_client())
+    model_version_watcher.start_listener(get_redis_client())
+    # Serves right away, GET /health/ready holds the worker back until warm
+    app.state.warmup_task = asyncio.create_task(warmup.run())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await close_async_redis_client()
+    await async_engine.dispose()
+
+@app.get('/health/live')
+async def liveness():
+    return {"status": "ok"}
+
+@app.get('/health/ready')
+async def readiness():
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 @app.post('/hospitals', response_model=HospitalResponse)
-async def register_hospital_ep(policy: HospitalPolicy, db_session: Session = Depends(get_db)):
-    queue_manager = QueueManager(db_session)
-    queue_manager.add_hospital(policy)
+async def register_hospital_ep(policy: HospitalPolicy, db_session: AsyncSession = Depends(get_async_db)):
+    queue_manager = AsyncQueueManager(db_session)
+    await queue_manager.add_hospital(policy)
     return policy
 
 @app.get('/hospitals/{hospital_id}', response_model=HospitalResponse)
-async def get_hospital_ep(hospital_id: str, db_session: Session = Depends(get_db)):
-    queue_manager = QueueManager(db_session)
-    hospital = queue_manager.get_hospital(hospital_id)
+async def get_hospital_ep(hospital_id: str, db_session: AsyncSession = Depends(get_async_db)):
+    queue_manager = AsyncQueueManager(db_session)
+    hospital = await queue_manager.get_hospital(hospital_id)
     if not hospital:
         raise HTTPException(status_code=404, detail="Hospital not found")
     return hospital
 
 @app.put('/hospitals/{hospital_id}', response_model=HospitalResponse)
-async def update_hospital_ep(hospital_id: str, policy: HospitalPolicyUpdate, db_session: Session = Depends(get_db)):
-    queue_manager = QueueManager(db_session)
-    policy = queue_manager.update_hospital(hospital_id, policy)
-    return policy
+async def update_hospital_ep(hospital_id: str, policy: HospitalPolicyUpdate, db_session: AsyncSession = Depends(get_async_db)):
+    queue_manager = AsyncQueueManager(db_session)
+    hospital = await queue_manager.update_hospital(hospital_id, policy)
+    if not hospital:
+        raise HTTPException(status_code=404, detail="Hospital not found")
+    return hospital
 
 @app.delete('/hospitals/{hospital_id}')
-async def delete_hospital_ep(hospital_id: str, db_session: Session = Depends(get_db)):
-    queue_manager = QueueManager(db_session)
-    if not queue_manager.delete_hospital(hospital_id):
+async def delete_hospital_ep(hospital_id: str, db_session: AsyncSession = Depends(get_async_db)):
+    queue_manager = AsyncQueueManager(db_session)
+    if not await queue_manager.delete_hospital(hospital_id):
         raise HTTPException(status_code=404, detail="Hospital not found")
     return {"message": "Hospital deleted successfully"}
 
 
 @app.post('/doctors', response_model=DoctorResponse)
-async def register_doctor_ep(doctor: DoctorProfile, db_session: Session = Depends(get_db)):
-    queue_manager = QueueManager(db_session)
-    queue_manager.register_doctor(doctor)
+async def register_doctor_ep(doctor: DoctorProfile, db_session: AsyncSession = Depends(get_async_db)):
+    queue_manager = AsyncQueueManager(db_session)
+    await queue_manager.register_doctor(doctor)
     return doctor
 
 @app.get('/doctors/{doctor_id}', response_model=DoctorResponse)
-async def get_doctor_ep(doctor_id: str, db_session: Session = Depends(get_db)):
-    doctor =  get_doctor(db_session, doctor_id)
+async def get_doctor_ep(doctor_id: str, db_session: AsyncSession = Depends(get_async_db)):
+    doctor = await get_doctor(db_session, doctor_id)
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     return doctor
 
 @app.put('/doctors/{doctor_id}', response_model=DoctorResponse)
-async def update_doctor_ep(doctor_id: str, doctor_data: dict, db_session: Session = Depends(get_db)):
-    doctor = update_doctor(db_session, doctor_id, doctor_data)
+async def update_doctor_ep(doctor_id: str, doctor_data: dict, db_session: AsyncSession = Depends(get_async_db)):
+    queue_manager = AsyncQueueManager(db_session)
+    doctor = await queue_manager.update_doctor(doctor_id, doctor_data)
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
     return doctor
 
 @app.delete('/doctors/{doctor_id}')
-async def delete_doctor_ep(doctor_id: str, db_session: Session = Depends(get_db)):
-    if not delete_doctor(db_session, doctor_id):
+async def delete_doctor_ep(doctor_id: str, db_session: AsyncSession = Depends(get_async_db)):
+    queue_manager = AsyncQueueManager(db_session)
+    if not await queue_manager.delete_doctor(doctor_id):
         raise HTTPException(status_code=404, detail="Doctor not found")
     return {"message": "Doctor deleted successfully"}
 
 
 @app.post('/cases/{hospital_id}', response_model=CaseResponse)
-async def create_case_ep( hospital_id: str, patient: PatientProfile, db_session: Session = Depends(get_db)):
-    queue_manager = QueueManager(db_session)
-    case = queue_manager.add_case(patient, hospital_id)
+async def create_case_ep( hospital_id: str, patient: PatientProfile, db_session: AsyncSession = Depends(get_async_db)):
+    queue_manager = AsyncQueueManager(db_session)
+    case = await queue_manager.add_case(patient, hospital_id)
     if not case:
         raise HTTPException(status_code=404, detail="Case not Queued")
     return case
 
+@app.post('/cases/{hospital_id}/bulk')
+async def bulk_create_cases_ep(hospital_id: str, request: Request, db_session: AsyncSession = Depends(get_async_db)):
+    """Stream an NDJSON or JSON-array body of PatientProfiles, stream back one NDJSON result per row."""
+    sla_rules = await hospital_cache.get_sla_rules_async(db_session, hospital_id)
+    if sla_rules is None:
+        raise HTTPException(status_code=404, detail="Hospital not found")
+
+    async def results():
+        # Dependency sessions are closed before a streamed body is sent, use our own
+        async with AsyncSessionLocal() as db:
+            async for result in BulkIntake(db, get_async_redis_client(), hospital_id, sla_rules).run(request.stream()):
+                yield json.dumps(result) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @app.get('/cases/{case_id}', response_model=CaseResponse)
-async def get_case_ep(case_id: str, db_session: Session = Depends(get_db)):
-    case = get_case(db_session, case_id)
+async def get_case_ep(case_id: str, db_session: AsyncSession = Depends(get_async_db)):
+    case = await get_case(db_session, case_id)
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
     return case
 
 @app.put('/cases/{case_id}', response_model=CaseResponse)
-async def update_case_ep(case_id: str, case_data: dict, db_session: Session = Depends(get_db)):
-    case = update_case(db_session, case_id, case_data)
+async def update_case_ep(case_id: str, case_data: dict, db_session: AsyncSession = Depends(get_async_db)):
+    case = await update_case(db_session, case_id, case_data)
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
     return case
 
 @app.delete('/cases/{case_id}')
-async def delete_case_ep(case_id: str, db_session: Session = Depends(get_db)):
-    case = get_case(db_session, case_id)
+async def delete_case_ep(case_id: str, db_session: AsyncSession = Depends(get_async_db)):
+    case = await get_case(db_session, case_id)
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
     if case.assigned_doctor_id:
         raise HTTPException(status_code=400, detail="Case cannot be deleted as it is assigned to a doctor")
-    if not delete_case(db_session, case_id):
+    if not await delete_case(db_session, case_id):
         raise HTTPException(status_code=404, detail="Case not found")
     return {"message": "Case deleted successfully"}
 
 @app.post('/cases/{case_id}/outcome')
-async def record_case_outcome(case_id: str, outcome: CaseOutcome, db_session: Session = Depends(get_db)):
-    queue_manager = QueueManager(db_session)
-    queue_manager.record_case_outcome(outcome)
+async def record_case_outcome(case_id: str, outcome: CaseOutcome, db_session: AsyncSession = Depends(get_async_db)):
+    if not await get_case(db_session, case_id):
+        raise HTTPException(status_code=404, detail="Case not found")
+    queue_manager = AsyncQueueManager(db_session)
+    if not await queue_manager.record_case_outcome(case_id, outcome):
+        raise HTTPException(status_code=409, detail="Case outcome already recorded")
     return {"message": "Case outcome recorded successfully"}
 
 
 @app.post('/ml/load')
-async def load_ml_model(version: Optional[str] = None, db_session: Session = Depends(get_db)):
-    """Load model with distributed locking to ensure only one pod loads the model at a time."""
+async def load_ml_model(version: Optional[str] = None, db_session: AsyncSession = Depends(get_async_db)):
+    """Roll a model version, the last saved one by default, out to every pod.
+
+    The version is loaded here first so a broken artifact is never
+    announced. Every other process then loads it on its own when notified;
+    GET /ml/rollout follows the rollout.
+    """
     model_manager = ModelManager()
-    success = model_manager.load_model(version)
-    if not success:
-        if model_manager.is_model_loaded():
-            # Model is already loaded in another pod
-            return {
-                "success": True,
-                "message": "Model is being loaded by another pod",
-                "version": model_manager.get_model_version()
-            }
+    version = version or await run_in_threadpool(model_manager.latest_version)
+    if not version:
+        raise HTTPException(status_code=404, detail="No saved model version")
+    if not await run_in_threadpool(model_manager.load_model, version):
         raise HTTPException(status_code=500, detail="Failed to load model")
+    announcement = await run_in_threadpool(publish_model_version, get_redis_client(), version)
     return {
         "success": True,
-        "message": "Model loaded successfully",
-        "version": model_manager.get_model_version()
+        "message": "Model loaded, rolling out to all pods",
+        **announcement
     }
 
-@app.post('/ml/train')
-async def train_ml_model(db_session: Session = Depends(get_db)):
-    model_manager = ModelManager()
-    success = model_manager.train_ml_model()
-    if not success:
-        raise HTTPException(status_code=500, detail="Failed to train model")
-    return {"success": True, "message": "Model training started"}
+@app.get('/ml/rollout')
+async def get_ml_rollout():
+    return await run_in_threadpool(rollout_status, get_redis_client())
+
+@app.post('/ml/train', status_code=202)
+async def train_ml_model(mode: str = MODE_FULL):
+    """Queue a training run for the training worker and return its job right away.
+
+    mode=incremental only trains on outcomes recorded since the last version.
+    """
+    if mode not in TRAINING_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(TRAINING_MODES)}")
+    job, created = await submit_training_job(get_async_redis_client(), mode)
+    return {
+        **job,
+        "message": "Model training queued" if created else "Model training already in progress"
+    }
+
+@app.get('/ml/train/{job_id}')
+async def get_training_job_status(job_id: str):
+    job = await get_training_job(get_async_redis_client(), job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job
+
+@app.get('/metrics/db-pool')
+async def get_db_pool_stats():
+    await run_in_threadpool(publish_db_pool_stats)
+    return {"processes": await run_in_threadpool(collect_process_stats, DB_POOL_STATS_KEY)}
+
+@app.get('/metrics/hospital-cache')
+async def get_hospital_cache_stats():
+    await run_in_threadpool(publish_hospital_cache_stats)
+    return {"processes": await run_in_threadpool(collect_process_stats, HOSPITAL_CACHE_STATS_KEY)}
+
+@app.get('/metrics/ml-inference')
+async def get_ml_inference_stats():
+    await run_in_threadpool(publish_inference_stats)
+    return {"processes": await run_in_threadpool(collect_process_stats, ML_INFERENCE_STATS_KEY)}
+
+@app.get('/metrics/redis-pool')
+async def get_redis_pool_stats():
+    await run_in_threadpool(publish_pool_stats)
+    return {"processes": await run_in_threadpool(collect_pool_stats)}
+
+@app.get('/metrics/prometheus', response_class=PlainTextResponse)
+async def get_prometheus_metrics(db_session: AsyncSession = Depends(get_async_db)):
+    """Queue and SLA metrics of every hospital with a queue, in the Prometheus text format."""
+    snapshots = await AsyncQueueManager(db_session).get_all_hospital_metrics()
+    return PlainTextResponse(prometheus_text(snapshots), media_type="text/plain; version=0.0.4")
 
 # @app.get('/ml/versions')
 # async def list_model_versions(db_session: Session = Depends(get_db)):
@@ -147,13 +243,13 @@ async def train_ml_model(db_session: Session = Depends(get_db)):
 #     return {"versions": versions}
 
 
-# @app.get('/analytics/{hospital_id}')
-# async def get_hospital_analytics(hospital_id: str, db_session: Session = Depends(get_db)):
-#     queue_manager = QueueManager(db_session)
-#     analytics = queue_manager.get_hospital_analytics(hospital_id)
-#     if not analytics:
-#         raise HTTPException(status_code=404, detail="Hospital not found")
-#     return analytics
+@app.get('/analytics/{hospital_id}')
+async def get_hospital_analytics(hospital_id: str, db_session: AsyncSession = Depends(get_async_db)):
+    queue_manager = AsyncQueueManager(db_session)
+    analytics = await queue_manager.get_hospital_metrics(hospital_id)
+    if not analytics:
+        raise HTTPException(status_code=404, detail="Hospital not found")
+    return analytics
 
 # @app.get('/analytics/{hospital_id}/ml')
 # async def get_ml_analytics(hospital_id: str, db_session: Session = Depends(get_db)):
@@ -0,0 +1,138 @@
+import os
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from database import Case, CaseOutcome, Patient, UrgencyLevelEnum
+
+ML_TRAIN_CHUNK_SIZE = int(os.getenv("ML_TRAIN_CHUNK_SIZE", "50000"))
+
+FEATURE_NAMES = [
+    'age', 'medical_history_count', 'symptoms_count',
+    'is_emergency', 'is_urgent', 'is_routine',
+    'wait_time_hours', 'complexity_score'
+]
+# Predictions are made at intake, before any wait. Training encodes the same
+# value, the final wait of a completed case would leak its duration. The
+# column stays so saved models keep their input layout.
+INTAKE_WAIT_TIME_HOURS = 0.0
+URGENCY_FEATURES = [UrgencyLevelEnum.EMERGENCY.value, UrgencyLevelEnum.URGENT.value, UrgencyLevelEnum.ROUTINE.value]
+
+
+def _urgency_values(urgency_levels: Sequence) -> np.ndarray:
+    return np.asarray([getattr(level, "value", level) for level in urgency_levels], dtype=object)
+
+
+def encode_features(age, medical_history_count, symptoms_count, urgency_levels, wait_time_hours,
+                    complexity_score, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Feature matrix in FEATURE_NAMES order from per-column sequences, one row per case.
+
+    Shared by training and inference so both see the same encoding. Missing
+    numbers encode as 0. Rows are written into `out` when given.
+    """
+    rows = len(urgency_levels)
+    if out is None:
+        out = np.empty((rows, len(FEATURE_NAMES)), dtype=np.float64)
+    out[:, 0] = np.asarray(age, dtype=np.float64)
+    out[:, 1] = np.asarray(medical_history_count, dtype=np.float64)
+    out[:, 2] = np.asarray(symptoms_count, dtype=np.float64)
+    urgency = _urgency_values(urgency_levels)
+    for column, level in enumerate(URGENCY_FEATURES, start=3):
+        out[:, column] = urgency == level
+    out[:, 6] = np.asarray(wait_time_hours, dtype=np.float64)
+    out[:, 7] = np.asarray(complexity_score, dtype=np.float64)
+    return np.nan_to_num(out, copy=False)
+
+
+def _nullable(values) -> List[float]:
+    return [np.nan if value is None else value for value in values]
+
+
+def feature_vector(age, medical_history, symptoms, urgency_level, wait_time_hours: float,
+                   complexity_score: Optional[float] = None) -> List[float]:
+    """Model input for one case, in FEATURE_NAMES order."""
+    return encode_features(
+        _nullable([age]), [len(medical_history or [])], [len(symptoms or [])], [urgency_level],
+        [wait_time_hours], _nullable([complexity_score]),
+    )[0].tolist()
+
+
+def case_features(case) -> List[float]:
+    """Features of an existing case, encoded as at its intake like the training set."""
+    patient = case.patient
+    return feature_vector(patient.age, patient.medical_history, patient.symptoms, patient.urgency_level,
+                          INTAKE_WAIT_TIME_HOURS, case.complexity_score)
+
+
+def patient_features(patient) -> List[float]:
+    """Features of a case about to be created for `patient`."""
+    return feature_vector(patient.age, patient.medical_history, patient.symptoms, patient.urgency_level,
+                          INTAKE_WAIT_TIME_HOURS)
+
+
+def training_query(case_ids: Optional[Sequence[str]] = None):
+    """Completed cases with their patient and outcome in one join, oldest first.
+
+    JSON list lengths are computed by the database so the lists never leave it.
+    Restricted to `case_ids` when given.
+    """
+    query = (
+        select(
+            Patient.age,
+            func.coalesce(func.json_array_length(Patient.medical_history), 0),
+            func.coalesce(func.json_array_length(Patient.symptoms), 0),
+            Patient.urgency_level,
+            Case.complexity_score,
+            CaseOutcome.actual_duration,
+        )
+        .join(Patient, Patient.patient_id == Case.patient_id)
+        .join(CaseOutcome, CaseOutcome.case_id == Case.case_id)
+        .where(Case.status == "completed", CaseOutcome.actual_duration.isnot(None))
+        .order_by(Case.created_at)
+    )
+    if case_ids is not None:
+        query = query.where(Case.case_id.in_(case_ids))
+    return query
+
+
+def load_training_set(db: Session, chunk_size: int = ML_TRAIN_CHUNK_SIZE,
+                      progress: Optional[Callable[[int, int], None]] = None,
+                      case_ids: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Features and targets of every completed case, or of `case_ids`, in creation order.
+
+    The join is streamed through a server-side cursor in chunks of
+    `chunk_size` rows and each chunk is encoded straight into arrays
+    preallocated from a row count, so memory stays at the size of the
+    result plus one chunk. `progress(rows_loaded, rows_expected)` is called
+    after every chunk.
+    """
+    query = training_query(case_ids)
+    expected = db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    features = np.empty((expected, len(FEATURE_NAMES)), dtype=np.float64)
+    targets = np.empty(expected, dtype=np.float64)
+    filled = 0
+    result = db.execute(query.execution_options(yield_per=chunk_size))
+    for chunk in result.partitions():
+        end = filled + len(chunk)
+        if end > len(targets):
+            # Cases completed after the count, grow rather than drop them
+            features = np.resize(features, (end, len(FEATURE_NAMES)))
+            targets = np.resize(targets, end)
+        age, history, symptoms, urgency, complexity, duration = zip(*chunk)
+        encode_features(
+            _nullable(age), history, symptoms, urgency, np.full(len(chunk), INTAKE_WAIT_TIME_HOURS),
+            _nullable(complexity), out=features[filled:end],
+        )
+        targets[filled:end] = duration
+        filled = end
+        if progress:
+            progress(filled, max(expected, filled))
+    return features[:filled], targets[:filled]
+
+
+def time_ordered_split(features: np.ndarray, targets: np.ndarray, train_fraction: float = 0.7):
+    """Oldest train_fraction for training, the newest cases for validation."""
+    split = int(len(targets) * train_fraction)
+    return features[:split], targets[:split], features[split:], targets[split:]
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.redis_client import publish_process_stats
+
+logger = logging.getLogger(__name__)
+
+ML_INFERENCE_MAX_BATCH = int(os.getenv("ML_INFERENCE_MAX_BATCH", "64"))
+ML_INFERENCE_MAX_WAIT_MS = float(os.getenv("ML_INFERENCE_MAX_WAIT_MS", "5"))
+# inline runs the model on the batching thread, thread hands batches to a pool of ML_INFERENCE_WORKERS
+ML_INFERENCE_EXECUTOR = os.getenv("ML_INFERENCE_EXECUTOR", "inline")
+ML_INFERENCE_WORKERS = int(os.getenv("ML_INFERENCE_WORKERS", "2"))
+ML_INFERENCE_TIMEOUT = float(os.getenv("ML_INFERENCE_TIMEOUT", "1"))
+ML_INFERENCE_STATS_WINDOW = int(os.getenv("ML_INFERENCE_STATS_WINDOW", "10000"))
+ML_INFERENCE_STATS_KEY = "ml_inference_stats"
+# Predicted duration at which ml_priority_score saturates at 1.0
+ML_PRIORITY_DURATION_SCALE = float(os.getenv("ML_PRIORITY_DURATION_SCALE", "120"))
+
+
+def ml_priority(predicted_duration: Optional[float]) -> Optional[float]:
+    """Cases predicted to take longer must start earlier to meet their SLA."""
+    if predicted_duration is None:
+        return None
+    return min(max(predicted_duration, 0.0) / ML_PRIORITY_DURATION_SCALE, 1.0)
+
+
+class _Request:
+    __slots__ = ("features", "future", "submitted")
+
+    def __init__(self, features: Sequence[float]):
+        self.features = features
+        self.future: Future = Future()
+        self.submitted = time.perf_counter()
+
+
+class InferenceBatcher:
+    """Micro-batches model predictions from concurrent callers.
+
+    submit() queues one feature vector and returns a Future. A single
+    batching thread takes the first waiting request, collects more until
+    max_batch_size are waiting or max_wait has passed since the first, then
+    calls model.predict once for the whole batch, inline or on a thread
+    pool, and resolves every Future with its row. When no trained model is
+    available the Futures resolve to None instead of failing the caller.
+
+    Latency (submit to result) and batch sizes of the last
+    ML_INFERENCE_STATS_WINDOW requests are kept for stats().
+    """
+
+    def __init__(self, model_provider: Callable[[], Optional[object]], max_batch_size: int = ML_INFERENCE_MAX_BATCH,
+                 max_wait: float = ML_INFERENCE_MAX_WAIT_MS / 1000, executor: str = ML_INFERENCE_EXECUTOR,
+                 workers: int = ML_INFERENCE_WORKERS):
+        self.model_provider = model_provider
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ml-inference") if executor == "thread" else None
+        self._requests: "queue.Queue[_Request]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=ML_INFERENCE_STATS_WINDOW)
+        self._batch_sizes = deque(maxlen=ML_INFERENCE_STATS_WINDOW)
+        self._model_seconds = deque(maxlen=ML_INFERENCE_STATS_WINDOW)
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, daemon=True, name="ml-inference-batcher")
+        self._thread.start()
+
+    def submit(self, features: Sequence[float]) -> Future:
+        request = _Request(features)
+        self._requests.put(request)
+        return request.future
+
+    def predict(self, features: Sequence[float], timeout: float = ML_INFERENCE_TIMEOUT) -> Optional[float]:
+        return self.submit(features).result(timeout)
+
+    def predict_many(self, rows: Sequence[Sequence[float]], timeout: float = ML_INFERENCE_TIMEOUT) -> List[Optional[float]]:
+        futures = [self.submit(row) for row in rows]
+        return [future.result(timeout) for future in futures]
+
+    def _collect(self) -> List[_Request]:
+        batch = [self._requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                batch = self._collect()
+                if self._pool is not None:
+                    self._pool.submit(self._predict, batch)
+                else:
+                    self._predict(batch)
+            except Exception as e:
+                # Every later prediction in this process depends on this thread
+                logger.error(f"Inference batcher error: {str(e)}")
+
+    def _predict(self, batch: List[_Request]):
+        # Callers that timed out have cancelled their futures, skip them
+        batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            model = self.model_provider()
+            if model is None:
+                predictions = [None] * len(batch)
+            else:
+                predictions = model.predict(np.asarray([request.features for request in batch], dtype=np.float64)).tolist()
+        except Exception as e:
+            logger.error(f"Inference error on a batch of {len(batch)}: {str(e)}")
+            with self._stats_lock:
+                self.errors += 1
+            predictions = [None] * len(batch)
+        done = time.perf_counter()
+        for request, prediction in zip(batch, predictions):
+            request.future.set_result(prediction)
+        with self._stats_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self._batch_sizes.append(len(batch))
+            self._model_seconds.append(done - start)
+            self._latencies.extend(done - request.submitted for request in batch)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            latencies = np.asarray(self._latencies) * 1000
+            sizes = np.asarray(self._batch_sizes)
+            model_ms = np.asarray(self._model_seconds) * 1000
+            stats = {"requests": self.requests, "batches": self.batches, "errors": self.errors}
+        if latencies.size:
+            stats.update(
+                latency_p50_ms=float(np.percentile(latencies, 50)),
+                latency_p99_ms=float(np.percentile(latencies, 99)),
+                batch_size_avg=float(sizes.mean()),
+                batch_size_max=int(sizes.max()),
+                model_p50_ms=float(np.percentile(model_ms, 50)),
+            )
+        return stats
+
+
+_batcher: Optional[InferenceBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def _trained_model():
+    from ml.model_manager import ModelManager
+    manager = ModelManager()
+    return manager.get_model() if manager.ml_model_trained else None
+
+
+def get_inference_batcher() -> InferenceBatcher:
+    """Per-process batcher over the ModelManager's current model, started on first use."""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = InferenceBatcher(_trained_model)
+    return _batcher
+
+
+def _reset_after_fork():
+    global _batcher, _batcher_lock
+    # The batching thread does not survive fork
+    _batcher = None
+    _batcher_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def predict_durations(rows: Sequence[Sequence[float]]) -> List[Tuple[Optional[float], Optional[float]]]:
+    """(predicted_duration, ml_priority_score) per feature row, (None, None) without a model."""
+    if not rows or _trained_model() is None:
+        return [(None, None)] * len(rows)
+    try:
+        predictions = get_inference_batcher().predict_many(rows)
+    except Exception as e:
+        logger.error(f"Inference failed: {str(e)}")
+        predictions = [None] * len(rows)
+    return [(prediction, ml_priority(prediction)) for prediction in predictions]
+
+
+async def predict_durations_async(rows: Sequence[Sequence[float]]) -> List[Tuple[Optional[float], Optional[float]]]:
+    """predict_durations() for the event loop, waits on the batch without blocking it."""
+    if not rows or _trained_model() is None:
+        return [(None, None)] * len(rows)
+    batcher = get_inference_batcher()
+    try:
+        predictions = await asyncio.wait_for(
+            asyncio.gather(*(asyncio.wrap_future(batcher.submit(row)) for row in rows)), ML_INFERENCE_TIMEOUT
+        )
+    except Exception as e:
+        logger.error(f"Inference failed: {str(e)}")
+        predictions = [None] * len(rows)
+    return [(prediction, ml_priority(prediction)) for prediction in predictions]
+
+
+def publish_inference_stats(role: str = "web"):
+    if _batcher is not None:
+        publish_process_stats(ML_INFERENCE_STATS_KEY, _batcher.stats(), role)
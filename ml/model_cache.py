@@ -0,0 +1,116 @@
+import logging
+import os
+import tempfile
+from typing import Optional
+
+from filelock import FileLock
+
+from ml.model_store import ModelStore, file_sha256
+
+logger = logging.getLogger(__name__)
+
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "model_cache"))
+MODEL_CACHE_MAX_BYTES = int(os.getenv("MODEL_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+MODEL_CACHE_LOCK_TIMEOUT = int(os.getenv("MODEL_CACHE_LOCK_TIMEOUT", "300"))
+# Re-hash cached files before handing them out, catches truncated or corrupted copies
+MODEL_CACHE_VERIFY = os.getenv("MODEL_CACHE_VERIFY", "true").lower() == "true"
+ARTIFACT_SUFFIX = ".joblib"
+
+
+class ModelCache:
+    """Content-addressed local disk cache of model artifacts.
+
+    Files are named by the sha256 of their content, so an artifact already
+    on disk is never downloaded again. Downloads land in a temp file, are
+    checked against the store's checksum and renamed into place, so a cached
+    file is always complete. Every hit refreshes the file's mtime and once
+    the cache grows past max_bytes the least recently used files are
+    removed. Processes that still have an evicted file mapped keep reading
+    it, the pages stay until they are unmapped.
+
+    A file lock in the cache directory serializes downloads between the
+    processes on a host.
+    """
+
+    def __init__(self, directory: str = MODEL_CACHE_DIR, max_bytes: int = MODEL_CACHE_MAX_BYTES,
+                 verify: bool = MODEL_CACHE_VERIFY):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.verify = verify
+        os.makedirs(directory, exist_ok=True)
+        self._lock = FileLock(os.path.join(directory, ".lock"), timeout=MODEL_CACHE_LOCK_TIMEOUT)
+
+    def path(self, checksum: str) -> str:
+        return os.path.join(self.directory, f"{checksum}{ARTIFACT_SUFFIX}")
+
+    def _cached(self, checksum: Optional[str]) -> Optional[str]:
+        if not checksum:
+            return None
+        path = self.path(checksum)
+        if not os.path.exists(path):
+            return None
+        if self.verify and file_sha256(path) != checksum:
+            logger.warning(f"Cached model {checksum} failed its checksum, fetching it again")
+            os.remove(path)
+            return None
+        os.utime(path)
+        return path
+
+    def fetch(self, store: ModelStore, key: str) -> str:
+        """Local path of the artifact at `key`, downloading it on a miss."""
+        expected = store.checksum(key)
+        path = self._cached(expected)
+        if path:
+            return path
+        with self._lock:
+            # Another process may have fetched it while we waited
+            path = self._cached(expected)
+            if path:
+                return path
+            fd, part = tempfile.mkstemp(dir=self.directory, suffix=".part")
+            os.close(fd)
+            try:
+                store.download(key, part)
+                checksum = file_sha256(part)
+                if expected and checksum != expected:
+                    raise ValueError(f"Checksum mismatch for {key}: expected {expected}, got {checksum}")
+                path = self.path(checksum)
+                os.replace(part, path)
+            finally:
+                if os.path.exists(part):
+                    os.remove(part)
+            logger.info(f"Cached model {key} as {checksum}")
+            self._evict(keep=path)
+        return path
+
+    def add(self, source: str) -> str:
+        """Move a freshly written artifact into the cache, returns its checksum."""
+        checksum = file_sha256(source)
+        with self._lock:
+            os.replace(source, self.path(checksum))
+            self._evict(keep=self.path(checksum))
+        return checksum
+
+    def new_file(self) -> str:
+        """Temp path inside the cache directory, so add() is a rename."""
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        os.close(fd)
+        return path
+
+    def _evict(self, keep: str):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ARTIFACT_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total -= size
+            logger.info(f"Evicted cached model {os.path.basename(path)}")
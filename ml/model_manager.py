@@ -1,84 +1,111 @@
 import os
-import boto3
+import copy
 import logging
+import threading
 from contextlib import contextmanager
 from filelock import FileLock
 from sklearn.ensemble import RandomForestRegressor
 from database import *
 from enum import Enum
 from sklearn.metrics import mean_squared_error, r2_score
-from typing import Dict, Optional
+from typing import Callable, Dict, NamedTuple, Optional
 from datetime import datetime
 import joblib
-from botocore.config import Config
-from botocore.exceptions import NoCredentialsError, ClientError
-import redis
-from redis import Redis
-from redis.connection import ConnectionPool
-import tempfile
+from services.redis_client import get_redis_client
+from ml.features import FEATURE_NAMES, load_training_set, time_ordered_split
+from ml.model_cache import ModelCache
+from ml.model_rollout import current_model_version
+from ml.model_store import get_model_store
+from ml.outcome_stream import advance_cursor, latest_outcome_id, read_new_outcomes
+from ml.training_jobs import (
+    LAST_FULL_TRAINING_KEY, MODE_FULL, MODE_INCREMENTAL, PHASE_LOADING, PHASE_SAVING, PHASE_TRAINING,
+    PHASE_VALIDATING, TRAINING_JOB_TIMEOUT,
+)
 
 logger = logging.getLogger(__name__)
 
+ML_TRAIN_N_JOBS = int(os.getenv('ML_TRAIN_N_JOBS', '-1'))
+ML_TRAIN_MIN_ROWS = 50
+# Trees added per incremental cycle, and the window of most recent trees a model keeps
+INCREMENTAL_TREES = int(os.getenv('INCREMENTAL_TREES', '10'))
+INCREMENTAL_MAX_TREES = int(os.getenv('INCREMENTAL_MAX_TREES', '300'))
+INCREMENTAL_MIN_ROWS = int(os.getenv('INCREMENTAL_MIN_ROWS', '50'))
+INCREMENTAL_MAX_ROWS = int(os.getenv('INCREMENTAL_MAX_ROWS', '100000'))
+
 class UrgencyLevel(Enum):
     EMERGENCY = 1
     URGENT = 2
     ROUTINE = 3
 
+class ServingModel(NamedTuple):
+    model: object
+    version: Optional[str]
+
 class ModelManager:
     _instance = None
-    _model_lock = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(ModelManager, cls).__new__(cls)
-            cls._instance.ml_model = None
+            cls._instance._serving = ServingModel(None, None)
             cls._instance.ml_model_trained = False
             cls._instance.ml_metrics = {}
             cls._instance.s3_bucket = os.getenv('S3_BUCKET_NAME', 'medical-case-queue-models')
             cls._instance.model_key_prefix = 'ml_models/'
-            cls._instance.redis_pool = ConnectionPool(host='redis', port=6379, db=0)
-            cls._instance.redis_client = Redis(connection_pool=cls._instance.redis_pool)
-            cls._instance._initialize_model_lock()
+            cls._instance._load_lock = threading.Lock()
         return cls._instance
-
-    def _initialize_model_lock(self):
-        if not self._model_lock:
-            self._model_lock = self.redis_client.lock('model_loading_lock', timeout=300)
-    
-    @contextmanager
-    def _distributed_lock(self):
-        try:
-            if self._model_lock.acquire(blocking=True):
-                yield True
-            else:
-                yield False
-        finally:
-            self._model_lock.release()
     
+    @property
+    def ml_model(self):
+        return self._serving.model
+
+    @ml_model.setter
+    def ml_model(self, model):
+        self._serving = ServingModel(model, self._serving.version)
+
+    def _swap(self, model, version: Optional[str]):
+        """Replace the served model and its version in one assignment.
+
+        Scoring reads the model once per batch, so a batch runs entirely on
+        either the old model or the new one and is never paused by a load.
+        """
+        self._serving = ServingModel(model, version)
+        self.ml_model_trained = True
+
+    def _model_key(self, version: str) -> str:
+        return f"{self.model_key_prefix}ml_model_v{version}.joblib"
+
+    def _latest_key(self) -> str:
+        return f"{self.model_key_prefix}LATEST"
+
+    def latest_version(self) -> Optional[str]:
+        """Version last saved to the model store."""
+        return self.store.read_text(self._latest_key())
+
     def load_model(self, version: Optional[str] = None) -> bool:
-        with self._distributed_lock() as acquired:
-            if not acquired:
-                return False  
+        """Load `version`, or the last saved one, through the local model cache.
+
+        Only loads in this process are serialized; pods and workers load
+        independently and share downloads through the pod's model cache.
+        The artifact is memory-mapped read-only, so the workers of a pod
+        share the model's arrays through the page cache instead of each
+        holding a copy.
+        """
+        with self._load_lock:
             try:
-                if self.ml_model and (not version or version == self.get_model_version()):
+                version = version or self.latest_version() or 'latest'
+                if self.ml_model_trained and version == self.get_model_version():
                     return True
 
-                model_key = f"{self.model_key_prefix}ml_model_v{version if version else 'latest'}.joblib"
-                try:
-                    s3 = boto3.client('s3')
-                    with tempfile.NamedTemporaryFile() as temp_file:
-                        s3.download_file(self.s3_bucket, model_key, temp_file.name)
-                        self.ml_model = joblib.load(temp_file.name)
-                        self.ml_model_trained = True
-                        return True
-                except Exception as e:
-                    logger.error(f"Failed to load model: {str(e)}")
-                    return False
-                    
+                path = self.model_cache.fetch(self.store, self._model_key(version))
+                self._swap(joblib.load(path, mmap_mode='r'), version)
+                logger.info(f"Loaded model version {version} from {path}")
+                return True
+
             except Exception as e:
-                logger.error(f"Model loading error: {str(e)}")
+                logger.error(f"Failed to load model: {str(e)}")
                 return False
-    
+
     def get_model(self):
         return self.ml_model
 
@@ -86,83 +113,165 @@ class ModelManager:
         if not self.ml_model_trained:
             return False
 
-        model_key = f"{self.model_key_prefix}ml_model_v{version if version else 'latest'}.joblib"
+        version = version or self.get_model_version() or 'latest'
+        temp_model_path = self.model_cache.new_file()
 
         try:
-            temp_model_path = '/tmp/ml_model.joblib'
-
+            # Uncompressed, compressed artifacts can't be memory-mapped on load
             joblib.dump(self.ml_model, temp_model_path)
+            checksum = self.model_cache.add(temp_model_path)
 
-            s3 = boto3.client('s3')
-            s3.upload_file(temp_model_path, self.s3_bucket, model_key)
-
-            os.remove(temp_model_path)
+            self.store.upload(self.model_cache.path(checksum), self._model_key(version), checksum)
+            self.store.write_text(self._latest_key(), version)
 
             return True
 
         except Exception as e:
             logger.error(f"Error saving model: {str(e)}")
+            if os.path.exists(temp_model_path):
+                os.remove(temp_model_path)
             return False
 
-    def train_ml_model(self) -> Dict:
-        """Train the ML model with distributed locking"""
-        with self._distributed_lock() as acquired:
-            if not acquired:
-                
-                return self.ml_metrics
-
-            completed_cases = self.db.query(Case).join(CaseOutcome).filter(Case.status == "completed").all()
-
-            if len(completed_cases) < 50:
-                return self.ml_metrics
-
-            features = []
-            targets = []
-            feature_names = [
-                'age', 'medical_history_count', 'symptoms_count',
-                'is_emergency', 'is_urgent', 'is_routine',
-                'wait_time_hours', 'complexity_score'
-            ]
-
-            for case in completed_cases:
-                
-                patient = self.db.query(Patient).filter(Patient.id == case.patient_id).first()
-                features.append([
-                    patient.age,
-                    len(patient.medical_history),
-                    len(patient.symptoms),
-                    1 if patient.urgency_level == UrgencyLevel.EMERGENCY else 0,
-                    1 if patient.urgency_level == UrgencyLevel.URGENT else 0,
-                    1 if patient.urgency_level == UrgencyLevel.ROUTINE else 0,
-                    (case.last_updated - case.created_at).total_seconds() / 3600,
-                    case.complexity_score or 0
-                ])
-                outcome = self.db.query(CaseOutcome).filter(CaseOutcome.case_id == case.id).first()
-                targets.append(outcome.actual_duration)
-
-            split_idx = int(len(features) * 0.7)
-            train_features = features[:split_idx]
-            train_targets = targets[:split_idx]
-            val_features = features[split_idx:]
-            val_targets = targets[split_idx:]
-
-            self.ml_model.fit(train_features, train_targets)
-            self.ml_model_trained = True
-
-            val_predictions = self.ml_model.predict(val_features)
-            self.ml_metrics = {
-                'mse': mean_squared_error(val_targets, val_predictions),
-                'r2': r2_score(val_targets, val_predictions),
-                'feature_importance': dict(zip(feature_names, self.ml_model.feature_importances_)),
-                'last_trained': datetime.now().isoformat(),
-                'training_size': len(features)
-            }
-
-            version = datetime.now().strftime("%Y%m%d%H%M%S")
-            self.save_model(version)
-            self.ml_metrics['version'] = version
-
-            return self.ml_metrics
+    @contextmanager
+    def _training_lock(self):
+        lock = get_redis_client().lock('model_training_lock', timeout=TRAINING_JOB_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            raise RuntimeError('Another training run holds the model training lock')
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def _load_rows(self, report: Callable[..., None], case_ids=None):
+        report(PHASE_LOADING, 0, None)
+        db = SessionLocal()
+        try:
+            return load_training_set(
+                db, progress=lambda loaded, total: report(PHASE_LOADING, loaded, total), case_ids=case_ids
+            )
+        finally:
+            db.close()
+
+    def _validate(self, model, val_features, val_targets, training_size: int, mode: str) -> Dict:
+        val_predictions = model.predict(val_features)
+        return {
+            'mse': mean_squared_error(val_targets, val_predictions),
+            'r2': r2_score(val_targets, val_predictions),
+            'feature_importance': dict(zip(FEATURE_NAMES, model.feature_importances_.tolist())),
+            'last_trained': datetime.now().isoformat(),
+            'training_size': training_size,
+            'mode': mode,
+            'trees': len(model.estimators_),
+            'version': datetime.now().strftime("%Y%m%d%H%M%S")
+        }
+
+    def _publish(self, model, metrics: Dict):
+        self._swap(model, metrics['version'])
+        self.ml_metrics = metrics
+        if not self.save_model(metrics['version']):
+            raise RuntimeError(f"Failed to save model version {metrics['version']}")
+
+    def train_ml_model(self, progress: Optional[Callable[..., None]] = None) -> Dict:
+        """Train a new model on every completed case and swap it in once saved.
+
+        Meant for the training worker. `progress(phase, rows_processed, rows_total)`
+        is called as training moves through its phases. Training uses its own
+        lock, so pods keep loading and serving the current model meanwhile.
+        Outcomes streamed so far count as trained on afterwards.
+        """
+        report = progress or (lambda *args, **kwargs: None)
+        redis_client = get_redis_client()
+        with self._training_lock():
+            # Taken before loading, outcomes recorded during the load are trained on again next cycle
+            stream_position = latest_outcome_id(redis_client)
+            features, targets = self._load_rows(report)
+
+            if len(targets) < ML_TRAIN_MIN_ROWS:
+                raise ValueError(f'Not enough completed cases to train: {len(targets)}')
+
+            train_features, train_targets, val_features, val_targets = time_ordered_split(features, targets)
+
+            report(PHASE_TRAINING, len(targets), len(targets))
+            model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=ML_TRAIN_N_JOBS)
+            model.fit(train_features, train_targets)
+
+            report(PHASE_VALIDATING, len(targets), len(targets))
+            metrics = self._validate(model, val_features, val_targets, len(targets), MODE_FULL)
+
+            report(PHASE_SAVING, len(targets), len(targets))
+            self._publish(model, metrics)
+            advance_cursor(redis_client, stream_position)
+            redis_client.set(LAST_FULL_TRAINING_KEY, metrics['version'])
+            return metrics
+
+    def train_incremental(self, progress: Optional[Callable[..., None]] = None) -> Dict:
+        """Extend the fleet's current model with outcomes recorded since it was trained.
+
+        Case ids come from the outcome stream fed by record_case_outcome, at
+        most INCREMENTAL_MAX_ROWS per cycle. The new version keeps the
+        current trees and warm-starts INCREMENTAL_TREES more fitted on the
+        new rows only, dropping the oldest trees past INCREMENTAL_MAX_TREES,
+        so a cycle costs in proportion to the new outcomes. With fewer than
+        INCREMENTAL_MIN_ROWS usable rows the cycle is skipped and the rows
+        wait for the next one, unless a full window of outcomes still fell
+        short; that window is passed over and left to the next full rebuild.
+        A version validating worse than its base is not saved ('accepted'
+        is False) and its outcomes stay past the cursor, retried with the
+        next cycle's larger window until one is accepted or a full rebuild
+        takes them in. Without a saved model this is a full training.
+        """
+        report = progress or (lambda *args, **kwargs: None)
+        redis_client = get_redis_client()
+        announced = current_model_version(redis_client)
+        base_version = announced["version"] if announced else self.latest_version()
+        if base_version is None:
+            return self.train_ml_model(progress)
+        with self._training_lock():
+            if base_version != self.get_model_version() and not self.load_model(base_version):
+                raise RuntimeError(f'Failed to load model version {base_version}')
+            base = self.ml_model
+
+            case_ids, last_id = read_new_outcomes(redis_client, INCREMENTAL_MAX_ROWS)
+            features, targets = self._load_rows(report, case_ids) if case_ids else ([], [])
+            if len(targets) < INCREMENTAL_MIN_ROWS:
+                if len(case_ids) >= INCREMENTAL_MAX_ROWS:
+                    # Waiting would re-read this same window every cycle
+                    advance_cursor(redis_client, last_id)
+                return {
+                    'version': base_version,
+                    'mode': MODE_INCREMENTAL,
+                    'skipped': True,
+                    'training_size': len(targets),
+                    'outcomes_pending': len(case_ids),
+                }
+
+            train_features, train_targets, val_features, val_targets = time_ordered_split(features, targets)
+
+            report(PHASE_TRAINING, len(targets), len(targets))
+            # A copy, the served model is never modified. Its fitted trees are shared, not refitted.
+            model = copy.copy(base)
+            model.estimators_ = list(base.estimators_)
+            model.set_params(warm_start=True, n_estimators=len(model.estimators_) + INCREMENTAL_TREES,
+                             n_jobs=ML_TRAIN_N_JOBS)
+            model.fit(train_features, train_targets)
+            if len(model.estimators_) > INCREMENTAL_MAX_TREES:
+                model.estimators_ = model.estimators_[-INCREMENTAL_MAX_TREES:]
+                model.set_params(n_estimators=INCREMENTAL_MAX_TREES)
+
+            report(PHASE_VALIDATING, len(targets), len(targets))
+            metrics = self._validate(model, val_features, val_targets, len(targets), MODE_INCREMENTAL)
+            metrics['base_version'] = base_version
+            metrics['base_mse'] = mean_squared_error(val_targets, base.predict(val_features))
+            metrics['accepted'] = metrics['mse'] <= metrics['base_mse']
+
+            if not metrics['accepted']:
+                metrics['outcomes_pending'] = len(case_ids)
+                return metrics
+
+            report(PHASE_SAVING, len(targets), len(targets))
+            self._publish(model, metrics)
+            advance_cursor(redis_client, last_id)
+            return metrics
 
     def validate_model(self):
         """Validate the loaded model"""
@@ -173,22 +282,21 @@ class ModelManager:
 
     def get_model_version(self) -> Optional[str]:
         """Get the currently loaded model version."""
-        return self.ml_metrics.get('version')
+        return self._serving.version
 
     def is_model_loaded(self) -> bool:
         """Check if model is loaded."""
         return self.ml_model is not None
 
     def __init__(self):
+        # __new__ hands back the singleton, don't replace its model on every ModelManager()
+        if getattr(self, '_initialized', False):
+            return
         try:
-            self.s3_config = Config(
-                retries={
-                    'max_attempts': 3,
-                    'mode': 'standard'
-                }
-            )
-            self.s3_client = boto3.client('s3', config=self.s3_config)
-            self.ml_model = RandomForestRegressor(n_estimators=100, random_state=42)
+            self.store = get_model_store(self.s3_bucket)
+            self.model_cache = ModelCache()
+            self.ml_model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=ML_TRAIN_N_JOBS)
+            self._initialized = True
             logger.info('ModelManager initialized successfully')
         except Exception as e:
             logger.error(f'Error initializing ModelManager: {str(e)}')
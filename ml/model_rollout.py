@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import redis
+
+from services.redis_client import collect_process_stats, publish_process_stats
+
+logger = logging.getLogger(__name__)
+
+MODEL_VERSION_KEY = "ml_model_current_version"
+MODEL_VERSION_CHANNEL = "ml_model_versions"
+MODEL_VERSION_STATS_KEY = "ml_model_version_stats"
+# Backstop for announcements missed while disconnected
+MODEL_VERSION_POLL_INTERVAL = float(os.getenv("MODEL_VERSION_POLL_INTERVAL", "60"))
+
+
+def publish_model_version(redis_client: redis.Redis, version: str) -> Dict:
+    """Make `version` the fleet's current model and notify every process."""
+    announcement = {"version": version, "published_at": time.time()}
+    payload = json.dumps(announcement)
+    pipe = redis_client.pipeline()
+    pipe.set(MODEL_VERSION_KEY, payload)
+    pipe.publish(MODEL_VERSION_CHANNEL, payload)
+    pipe.execute()
+    return announcement
+
+
+def current_model_version(redis_client: redis.Redis) -> Optional[Dict]:
+    announcement = redis_client.get(MODEL_VERSION_KEY)
+    return json.loads(announcement) if announcement else None
+
+
+class ModelVersionWatcher:
+    """Keeps this process on the fleet's current model version.
+
+    Every process loads the announced version on its own, through the
+    pod-local model cache, so a rollout takes about one download however
+    many pods there are. The only coordination is MODEL_VERSION_KEY and
+    the announcement on MODEL_VERSION_CHANNEL; the key is re-read on
+    (re)subscribe and every MODEL_VERSION_POLL_INTERVAL in case a message
+    was missed.
+    """
+
+    def __init__(self):
+        self.role = "web"
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self.published_at: Optional[float] = None
+        self.loaded_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.lag_seconds: Optional[float] = None
+        self.load_failures = 0
+
+    def _manager(self):
+        from ml.model_manager import ModelManager
+        return ModelManager()
+
+    def _record(self, announcement: Dict, load_seconds: float):
+        with self._lock:
+            self.published_at = announcement["published_at"]
+            self.loaded_at = time.time()
+            self.load_seconds = load_seconds
+            # A process started after the announcement is only late from its start
+            self.lag_seconds = self.loaded_at - max(self.published_at, self.started_at)
+        publish_model_version_stats(self.role)
+
+    def apply(self, announcement: Optional[Dict]):
+        if not announcement or announcement["published_at"] == self.published_at:
+            return
+        manager = self._manager()
+        version = announcement["version"]
+        if manager.ml_model_trained and manager.get_model_version() == version:
+            # Already serving it, e.g. the process that published it
+            self._record(announcement, 0.0)
+            return
+        start = time.perf_counter()
+        if manager.load_model(version):
+            self._record(announcement, time.perf_counter() - start)
+            logger.info(f"Model version {version} loaded in {self.load_seconds:.2f}s")
+        else:
+            with self._lock:
+                self.load_failures += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "version": self._manager().get_model_version(),
+                "published_at": self.published_at,
+                "loaded_at": self.loaded_at,
+                "load_seconds": self.load_seconds,
+                "lag_seconds": self.lag_seconds,
+                "load_failures": self.load_failures,
+            }
+
+    def start_listener(self, redis_client: redis.Redis, role: str = "web") -> threading.Thread:
+        self.role = role
+        self.started_at = time.time()
+        thread = threading.Thread(target=self._listen, args=(redis_client,), daemon=True, name="model-version-listener")
+        thread.start()
+        return thread
+
+    def _listen(self, redis_client: redis.Redis):
+        while True:
+            try:
+                pubsub = redis_client.pubsub()
+                pubsub.subscribe(MODEL_VERSION_CHANNEL)
+                while True:
+                    message = pubsub.get_message(timeout=MODEL_VERSION_POLL_INTERVAL)
+                    if message is None or message["type"] == "subscribe":
+                        self.apply(current_model_version(redis_client))
+                    elif message["type"] == "message":
+                        self.apply(json.loads(message["data"]))
+            except redis.RedisError as e:
+                logger.error(f"Model version listener error: {str(e)}")
+                time.sleep(1)
+            except Exception as e:
+                logger.error(f"Model version listener error: {str(e)}")
+                time.sleep(1)
+
+
+model_version_watcher = ModelVersionWatcher()
+
+
+def publish_model_version_stats(role: str = "web"):
+    publish_process_stats(MODEL_VERSION_STATS_KEY, model_version_watcher.stats(), role)
+
+
+def rollout_status(redis_client: redis.Redis) -> Dict:
+    """How far the current version has spread over the live processes.
+
+    A process' lag runs from the announcement, or its own start if later,
+    to it serving the version. convergence_seconds is the largest lag, set
+    once every live process reports the version. Times come from each
+    pod's clock.
+    """
+    announcement = current_model_version(redis_client)
+    processes = collect_process_stats(MODEL_VERSION_STATS_KEY)
+    if not announcement:
+        return {"version": None, "processes": processes}
+    version = announcement["version"]
+    updated = [entry for entry in processes.values()
+               if entry.get("version") == version and entry.get("published_at") == announcement["published_at"]]
+    status = {
+        **announcement,
+        "processes_total": len(processes),
+        "processes_updated": len(updated),
+        "converged": bool(processes) and len(updated) == len(processes),
+        "convergence_seconds": None,
+        "processes": processes,
+    }
+    if updated:
+        lags = np.asarray([entry["lag_seconds"] for entry in updated])
+        load_seconds = np.asarray([entry["load_seconds"] for entry in updated])
+        status.update(
+            lag_p50_seconds=float(np.percentile(lags, 50)),
+            lag_max_seconds=float(lags.max()),
+            load_p50_seconds=float(np.percentile(load_seconds, 50)),
+        )
+        if status["converged"]:
+            status["convergence_seconds"] = float(lags.max())
+    return status
@@ -0,0 +1,135 @@
+import hashlib
+import logging
+import os
+import shutil
+from abc import ABC, abstractmethod
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# s3 in production, local points MODEL_STORE_DIR at a directory standing in for the bucket
+MODEL_STORE = os.getenv("MODEL_STORE", "s3")
+MODEL_STORE_DIR = os.getenv("MODEL_STORE_DIR", "/var/lib/medical-queue/models")
+CHECKSUM_METADATA_KEY = "sha256"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelStore(ABC):
+    """Where model artifacts live between pods.
+
+    Artifacts are addressed by key. checksum() is the sha256 recorded when
+    the artifact was uploaded, or None for artifacts written before
+    checksums were recorded; callers then hash the download themselves.
+    """
+
+    @abstractmethod
+    def download(self, key: str, path: str):
+        ...
+
+    @abstractmethod
+    def upload(self, path: str, key: str, checksum: str):
+        ...
+
+    @abstractmethod
+    def checksum(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def read_text(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def write_text(self, key: str, text: str):
+        ...
+
+
+class S3ModelStore(ModelStore):
+    """The boto3 client is created per process, a client made before a fork is not reused."""
+
+    def __init__(self, bucket: str, client=None):
+        self.bucket = bucket
+        self._client = client
+        self._pid = os.getpid() if client is not None else None
+
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            import boto3
+            from botocore.config import Config
+            self._client = boto3.client("s3", config=Config(retries={"max_attempts": 3, "mode": "standard"}))
+            self._pid = os.getpid()
+        return self._client
+
+    def download(self, key: str, path: str):
+        self.client.download_file(self.bucket, key, path)
+
+    def upload(self, path: str, key: str, checksum: str):
+        self.client.upload_file(path, self.bucket, key, ExtraArgs={"Metadata": {CHECKSUM_METADATA_KEY: checksum}})
+
+    def checksum(self, key: str) -> Optional[str]:
+        head = self.client.head_object(Bucket=self.bucket, Key=key)
+        return head.get("Metadata", {}).get(CHECKSUM_METADATA_KEY)
+
+    def read_text(self, key: str) -> Optional[str]:
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read().decode().strip()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return None
+            raise
+
+    def write_text(self, key: str, text: str):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=text.encode())
+
+
+class LocalDirectoryStore(ModelStore):
+    """Keys are paths under root, checksums sit next to the artifact in <key>.sha256."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def download(self, key: str, path: str):
+        shutil.copyfile(self._path(key), path)
+
+    def upload(self, path: str, key: str, checksum: str):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, f"{target}.tmp")
+        os.replace(f"{target}.tmp", target)
+        self.write_text(f"{key}.sha256", checksum)
+
+    def checksum(self, key: str) -> Optional[str]:
+        if not os.path.exists(self._path(key)):
+            raise FileNotFoundError(f"No model artifact at {key}")
+        return self.read_text(f"{key}.sha256")
+
+    def read_text(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key)) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def write_text(self, key: str, text: str):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(f"{target}.tmp", "w") as f:
+            f.write(text)
+        os.replace(f"{target}.tmp", target)
+
+
+def get_model_store(bucket: str) -> ModelStore:
+    if MODEL_STORE == "local":
+        return LocalDirectoryStore(MODEL_STORE_DIR)
+    return S3ModelStore(bucket)
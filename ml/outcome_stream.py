@@ -0,0 +1,55 @@
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import redis
+import redis.asyncio
+
+logger = logging.getLogger(__name__)
+
+OUTCOME_STREAM_KEY = "ml_case_outcomes"
+# Last stream entry already folded into a saved model version
+OUTCOME_CURSOR_KEY = "ml_case_outcomes_cursor"
+# Approximate cap, outcomes past it are only picked up by the next full rebuild
+OUTCOME_STREAM_MAXLEN = int(os.getenv("OUTCOME_STREAM_MAXLEN", "1000000"))
+
+
+def publish_case_outcome(redis_client: redis.Redis, case_id: str):
+    try:
+        redis_client.xadd(OUTCOME_STREAM_KEY, {"case_id": case_id}, maxlen=OUTCOME_STREAM_MAXLEN, approximate=True)
+    except redis.RedisError as e:
+        logger.error(f"Redis error publishing case outcome {case_id}: {str(e)}")
+
+
+async def publish_case_outcome_async(redis_client: redis.asyncio.Redis, case_id: str):
+    try:
+        await redis_client.xadd(OUTCOME_STREAM_KEY, {"case_id": case_id}, maxlen=OUTCOME_STREAM_MAXLEN, approximate=True)
+    except redis.RedisError as e:
+        logger.error(f"Redis error publishing case outcome {case_id}: {str(e)}")
+
+
+def latest_outcome_id(redis_client: redis.Redis) -> Optional[str]:
+    """Id of the newest outcome on the stream, None while it is empty."""
+    newest = redis_client.xrevrange(OUTCOME_STREAM_KEY, count=1)
+    return newest[0][0].decode() if newest else None
+
+
+def read_new_outcomes(redis_client: redis.Redis, limit: int) -> Tuple[List[str], Optional[str]]:
+    """Case ids of up to `limit` outcomes past the cursor, and the id of the last one read."""
+    cursor = redis_client.get(OUTCOME_CURSOR_KEY)
+    start = f"({cursor.decode()}" if cursor else "-"
+    entries = redis_client.xrange(OUTCOME_STREAM_KEY, min=start, count=limit)
+    if not entries:
+        return [], None
+    return [fields[b"case_id"].decode() for _, fields in entries], entries[-1][0].decode()
+
+
+def advance_cursor(redis_client: redis.Redis, last_id: Optional[str]):
+    """Mark outcomes up to `last_id` as trained on and drop them from the stream."""
+    if last_id is None:
+        return
+    pipe = redis_client.pipeline()
+    pipe.set(OUTCOME_CURSOR_KEY, last_id)
+    pipe.xtrim(OUTCOME_STREAM_KEY, minid=last_id, approximate=False)
+    pipe.xdel(OUTCOME_STREAM_KEY, last_id)
+    pipe.execute()
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+import redis
+import redis.asyncio
+
+logger = logging.getLogger(__name__)
+
+TRAINING_QUEUE_KEY = "ml_training_jobs"
+TRAINING_ACTIVE_KEY = "ml_training_active"
+TRAINING_JOB_KEY_PREFIX = "ml_training_job:"
+# Version of the last full training, full rebuilds are due FULL_RETRAIN_INTERVAL after it
+LAST_FULL_TRAINING_KEY = "ml_last_full_training"
+TRAINING_JOB_TTL = int(os.getenv("TRAINING_JOB_TTL", str(7 * 24 * 3600)))
+# A worker that dies mid-job frees the active slot after this long
+TRAINING_JOB_TIMEOUT = int(os.getenv("TRAINING_JOB_TIMEOUT", "3600"))
+FULL_RETRAIN_INTERVAL = int(os.getenv("FULL_RETRAIN_INTERVAL", str(24 * 3600)))
+
+PHASE_QUEUED = "queued"
+PHASE_LOADING = "loading"
+PHASE_TRAINING = "training"
+PHASE_VALIDATING = "validating"
+PHASE_SAVING = "saving"
+PHASE_DONE = "done"
+
+# full retrains on every completed case, incremental only on outcomes recorded since the last version
+MODE_FULL = "full"
+MODE_INCREMENTAL = "incremental"
+TRAINING_MODES = (MODE_FULL, MODE_INCREMENTAL)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+
+def job_key(job_id: str) -> str:
+    return f"{TRAINING_JOB_KEY_PREFIX}{job_id}"
+
+
+def _new_job(job_id: str, mode: str = MODE_FULL) -> Dict:
+    return {
+        "job_id": job_id,
+        "mode": mode,
+        "status": STATUS_QUEUED,
+        "phase": PHASE_QUEUED,
+        "rows_processed": 0,
+        "rows_total": None,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "metrics": None,
+        "error": None,
+    }
+
+
+def _queue_job(pipe, job: Dict):
+    pipe.set(job_key(job["job_id"]), json.dumps(job), ex=TRAINING_JOB_TTL)
+    pipe.lpush(TRAINING_QUEUE_KEY, job["job_id"])
+
+
+async def submit_training_job(redis_client: redis.asyncio.Redis, mode: str = MODE_FULL) -> Tuple[Dict, bool]:
+    """Queue a training job for the training worker. Returns (job, created).
+
+    Only one job is queued or running at a time; while one is, its job is
+    returned instead of queueing another.
+    """
+    job_id = uuid.uuid4().hex
+    if not await redis_client.set(TRAINING_ACTIVE_KEY, job_id, nx=True, ex=TRAINING_JOB_TIMEOUT):
+        active = await redis_client.get(TRAINING_ACTIVE_KEY)
+        job = await get_training_job(redis_client, active.decode()) if active else None
+        if job:
+            return job, False
+        # The active job expired between the two calls, try once more
+        return await submit_training_job(redis_client, mode)
+    job = _new_job(job_id, mode)
+    pipe = redis_client.pipeline()
+    _queue_job(pipe, job)
+    await pipe.execute()
+    return job, True
+
+
+def next_training_mode(redis_client: redis.Redis) -> str:
+    """Full once FULL_RETRAIN_INTERVAL has passed since the last full training, incremental otherwise."""
+    last_full = redis_client.get(LAST_FULL_TRAINING_KEY)
+    if last_full is None:
+        return MODE_FULL
+    age = time.time() - time.mktime(time.strptime(last_full.decode(), "%Y%m%d%H%M%S"))
+    return MODE_FULL if age >= FULL_RETRAIN_INTERVAL else MODE_INCREMENTAL
+
+
+def submit_training_job_sync(redis_client: redis.Redis, mode: str = MODE_FULL) -> Optional[Dict]:
+    """submit_training_job() for the scheduler. Returns the job, None if one was already active."""
+    job_id = uuid.uuid4().hex
+    if not redis_client.set(TRAINING_ACTIVE_KEY, job_id, nx=True, ex=TRAINING_JOB_TIMEOUT):
+        return None
+    job = _new_job(job_id, mode)
+    pipe = redis_client.pipeline()
+    _queue_job(pipe, job)
+    pipe.execute()
+    return job
+
+
+async def get_training_job(redis_client: redis.asyncio.Redis, job_id: str) -> Optional[Dict]:
+    job = await redis_client.get(job_key(job_id))
+    return json.loads(job) if job else None
+
+
+class TrainingJobReporter:
+    """Worker-side view of one job; every update is written back to Redis."""
+
+    def __init__(self, redis_client: redis.Redis, job_id: str):
+        self.redis_client = redis_client
+        self.job_id = job_id
+        job = redis_client.get(job_key(job_id))
+        self.job = json.loads(job) if job else _new_job(job_id)
+
+    def update(self, **fields):
+        self.job.update(fields)
+        try:
+            self.redis_client.set(job_key(self.job_id), json.dumps(self.job, default=str), ex=TRAINING_JOB_TTL)
+        except redis.RedisError as e:
+            logger.error(f"Redis error updating training job {self.job_id}: {str(e)}")
+
+    def progress(self, phase: str, rows_processed: Optional[int] = None, rows_total: Optional[int] = None):
+        fields = {"phase": phase}
+        if rows_processed is not None:
+            fields["rows_processed"] = rows_processed
+        if rows_total is not None:
+            fields["rows_total"] = rows_total
+        self.update(**fields)
+
+    def start(self):
+        self.update(status=STATUS_RUNNING, started_at=time.time())
+
+    def succeed(self, metrics: Dict):
+        self.update(status=STATUS_SUCCEEDED, phase=PHASE_DONE, metrics=metrics, finished_at=time.time())
+
+    def fail(self, error: str):
+        self.update(status=STATUS_FAILED, error=error, finished_at=time.time())
+
+    def release(self):
+        """Free the active slot if it still belongs to this job."""
+        try:
+            active = self.redis_client.get(TRAINING_ACTIVE_KEY)
+            if active and active.decode() == self.job_id:
+                self.redis_client.delete(TRAINING_ACTIVE_KEY)
+        except redis.RedisError as e:
+            logger.error(f"Redis error releasing training job {self.job_id}: {str(e)}")
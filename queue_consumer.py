@@ -1,80 +1,228 @@
 import redis
-from sqlalchemy.orm import Session
-from database import SessionLocal, Case
+from sqlalchemy.orm import Session, joinedload
+from typing import List
+from database import SessionLocal, Case, init_db, publish_db_pool_stats
+from ml.inference import publish_inference_stats
+from ml.model_rollout import model_version_watcher, publish_model_version_stats
 from services.queue_manager import QueueManager
-from crud.doctors import update_doctor
+from services.queue_keys import QUEUE_KEY_PREFIX, QUEUE_REGISTRY_KEY, QUEUE_EVENTS_KEY
+from services.consumer_group import ConsumerGroup
+from services.doctor_index import DoctorIndex
+from services.hospital_cache import hospital_cache
+from services.queue_leases import QueueLeases
+from services.redis_batch import RedisBatcher
+from services.redis_client import get_redis_client, publish_pool_stats
 import logging
 import time
 import os
-from redis.lock import Lock
+import signal
+import sys
 from datetime import datetime
 import traceback
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = os.getenv("REDIS_PORT", "6379")
-REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+CONSUMER_MODE = os.getenv("CONSUMER_MODE", "event")
+CONSUMER_RESCAN_INTERVAL = int(os.getenv("CONSUMER_RESCAN_INTERVAL", "30"))
+CONSUMER_EVENT_BATCH = int(os.getenv("CONSUMER_EVENT_BATCH", "100"))
+CONSUMER_BATCH_SIZE = int(os.getenv("CONSUMER_BATCH_SIZE", "1"))
 
 class CaseQueueConsumer:
     def __init__(self):
-        self.redis_pool = redis.ConnectionPool(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-        self.redis_client = redis.Redis(connection_pool=self.redis_pool)
+        self.redis_client = get_redis_client()
         self.db = SessionLocal()
-        self.queue_manager = QueueManager(self.db)
-        self.lock_timeout = 10  
-        self.lock_blocking_timeout = 1  
-    def process_case(self, case_id: str, hospital_id: str):
-        lock_key = f"case_lock:{case_id}"
-        lock = Lock(self.redis_client, lock_key, timeout=self.lock_timeout)
-        try:  
-            if lock.acquire(blocking_timeout=self.lock_blocking_timeout):
-                try:
-                    case = self.db.query(Case).filter(Case.case_id == case_id).first()
-                    if not case:
-                        logger.error(f"Case {case_id} not found in database")
-                        return
-                    if case.status != "pending":
-                        logger.info(f"Case {case_id} already processed")
-                        return
-                    
-                    doctor = self.queue_manager.find_best_doctor(case)
-                    if doctor:
-                        
-                        case.status = "assigned"
-                        case.assigned_doctor_id = doctor.doctor_id
-                        case.last_updated = datetime.now()
-                        doctor.availability = False
-                        doctor.current_workload += 1                        
-                        self.redis_client.zrem(f"hospital_queue:{hospital_id}", case_id)
-                        self.db.commit()
-                        logger.info(f"Case {case_id} assigned to doctor {doctor.doctor_id}")
-                    else:
-                        logger.warning(f"No available doctors for case {case_id}")
-                finally:
-                    lock.release()
-            else:
-                logger.info(f"Could not acquire lock for case {case_id}, skipping...")
+        self.doctor_index = DoctorIndex()
+        self.doctor_index.start_listener(self.redis_client)
+        hospital_cache.start_listener(self.redis_client)
+        model_version_watcher.start_listener(self.redis_client, role="consumer")
+        self.batcher = RedisBatcher(self.redis_client)
+        self.queue_manager = QueueManager(self.db, doctor_index=self.doctor_index, batcher=self.batcher)
+        self.leases = QueueLeases(self.redis_client, batcher=self.batcher)
+        self.batch_size = CONSUMER_BATCH_SIZE
+        self.group = None
+        self.rebalance_pending = False
+    def process_case(self, case_id: str, hospital_id: str) -> bool:
+        """Assign a reserved case. Returns True when the case has left the queue.
+
+        The case is acked after the commit, or released back to the queue when
+        no doctor is free or processing fails.
+        """
+        started = time.perf_counter()
+        try:
+            cases, missing = self.queue_manager.lock_cases([case_id])
+            case = cases.get(case_id)
+            if not case and not missing:
+                logger.info(f"Case {case_id} is being assigned by another worker")
+                self.db.rollback()
+                return True
+            if not case or case.status != "pending":
+                if case:
+                    logger.info(f"Case {case_id} already processed")
+                else:
+                    logger.error(f"Case {case_id} not found in database")
+                self.db.rollback()
+                self.leases.ack(hospital_id, [case_id])
+                return True
+
+            doctor = self.queue_manager.find_best_doctor(case)
+            if doctor:
+                self.queue_manager.predict_cases([case])
+            if doctor and self.queue_manager.assign_case_to_doctor(case, doctor):
+                record = self.queue_manager.assignment_record(case, doctor)
+                self.db.commit()
+                self.leases.ack(hospital_id, [case_id])
+                self.queue_manager.publish_doctor_changes([doctor])
+                self.queue_manager.record_assignments([record], started)
+                logger.info(f"Case {case_id} assigned to doctor {doctor.doctor_id}")
+                return True
+
+            logger.warning(f"No available doctors for case {case_id}")
+            # Ends the transaction, and with it the row lock
+            self.db.rollback()
+            self.leases.release(hospital_id, [case_id])
         except Exception as e:
             logger.error(f"Error processing case {case_id}: {str(e)}")
             logger.error(f"Traceback -{traceback.format_exc()}")
-            self.db.rollback()
-            if lock.locked():
-                lock.release()
+            self.queue_manager.discard_pending_assignments(hospital_id)
+            self.leases.release(hospital_id, [case_id])
+        return False
 
-    def run(self):
+    def process_batch(self, case_ids: List[str], hospital_id: str) -> int:
+        """Assign a batch of reserved cases against one snapshot of the hospital's doctors.
+
+        All assignments are committed in a single transaction. Returns the
+        number of cases that left the queue; the rest are released back to it.
+        """
+        started = time.perf_counter()
+        try:
+            cases_by_id, missing = self.queue_manager.lock_cases(case_ids, joinedload(Case.patient))
+            doctors = self.queue_manager.get_available_doctors(hospital_id)
+
+            done = []
+            held = []
+            pending = []
+            for case_id in case_ids:
+                case = cases_by_id.get(case_id)
+                if not case and case_id not in missing:
+                    # Being assigned by another worker, left leased until it commits
+                    held.append(case_id)
+                elif not case or case.status != "pending":
+                    logger.info(f"Case {case_id} missing or already processed")
+                    done.append(case_id)
+                else:
+                    pending.append(case)
+
+            self.queue_manager.predict_cases(pending)
+            assigned = []
+            records = []
+            unassigned = []
+            for case, doctor in zip(pending, self.queue_manager.select_doctors_for_batch(pending, doctors)):
+                if not doctor or not self.queue_manager.assign_case_to_doctor(case, doctor):
+                    logger.warning(f"No available doctors for case {case.case_id}")
+                    unassigned.append(case.case_id)
+                    continue
+                assigned.append(doctor)
+                records.append(self.queue_manager.assignment_record(case, doctor))
+                done.append(case.case_id)
+
+            self.db.commit()
+            self.leases.ack(hospital_id, done)
+            self.leases.release(hospital_id, unassigned)
+            self.queue_manager.publish_doctor_changes(assigned)
+            self.queue_manager.record_assignments(records, started)
+            logger.info(f"Assigned batch of {len(done)}/{len(case_ids)} cases for hospital {hospital_id}")
+            return len(done) + len(held)
+        except Exception as e:
+            logger.error(f"Error processing batch for hospital {hospital_id}: {str(e)}")
+            logger.error(f"Traceback -{traceback.format_exc()}")
+            self.queue_manager.discard_pending_assignments(hospital_id)
+            self.leases.release(hospital_id, case_ids)
+            return 0
+
+    def drain_queue(self, hospital_id: str):
+        """Assign cases from the head of a hospital queue until it is empty or blocked.
+
+        Acks and doctor events of one case ride along with the reserve of the
+        next, and whatever is left is flushed before returning.
+        """
+        try:
+            self._drain_queue(hospital_id)
+        finally:
+            self.batcher.flush()
+
+    def _drain_queue(self, hospital_id: str):
+        while True:
+            if self.group and self.group.heartbeat_due() and self.group.heartbeat():
+                self.rebalance_pending = True
+                if not self.group.owns(hospital_id):
+                    logger.info(f"Hospital {hospital_id} moved to {self.group.owner(hospital_id)}, stop draining")
+                    return
+            case_ids = self.leases.reserve(hospital_id, self.batch_size)
+            if not case_ids:
+                return
+            if self.batch_size > 1:
+                if self.process_batch(case_ids, hospital_id) < len(case_ids):
+                    return
+            elif not self.process_case(case_ids[0], hospital_id):
+                return
+
+    def bootstrap_registry(self):
+        """Register queues created before the registry existed. SCAN does not block Redis like KEYS."""
+        with self.batcher.batch() as pipe:
+            for key in self.redis_client.scan_iter(match=f"{QUEUE_KEY_PREFIX}*", count=500):
+                pipe.sadd(QUEUE_REGISTRY_KEY, key.decode()[len(QUEUE_KEY_PREFIX):])
+
+    def drain_registered_queues(self):
+        for hospital_id in self.redis_client.smembers(QUEUE_REGISTRY_KEY):
+            self.drain_queue(hospital_id.decode())
+
+    def next_events(self) -> set:
+        """Block until a queue is notified, then coalesce any wakeups already waiting."""
+        event = self.redis_client.blpop([QUEUE_EVENTS_KEY], timeout=CONSUMER_RESCAN_INTERVAL)
+        if event is None:
+            return set()
+        hospital_ids = {event[1].decode()}
+        pending = self.redis_client.lpop(QUEUE_EVENTS_KEY, CONSUMER_EVENT_BATCH)
+        if pending:
+            hospital_ids.update(hospital_id.decode() for hospital_id in pending)
+        return hospital_ids
+
+    def run_event_driven(self):
+        self.bootstrap_registry()
+        self.drain_registered_queues()
+        while True:
+            try:
+                hospital_ids = self.next_events()
+                if not hospital_ids:
+                    # Periodic safety net for cases waiting on doctors freed without a notification
+                    self.drain_registered_queues()
+                    publish_pool_stats("consumer")
+                    publish_db_pool_stats("consumer")
+                    publish_inference_stats("consumer")
+                    publish_model_version_stats("consumer")
+                    continue
+                for hospital_id in hospital_ids:
+                    self.drain_queue(hospital_id)
+            except redis.RedisError as e:
+                logger.error(f"Redis error: {str(e)}")
+                time.sleep(5)
+            except Exception as e:
+                logger.error(f"Unexpected error: {str(e)}")
+                time.sleep(1)
+
+    def run_polling(self):
+        self.bootstrap_registry()
         while True:
             try:
                 
-                keys = self.redis_client.keys("hospital_queue:*")
-                for key in keys:
-                    hospital_id = key.decode().split(":")[1]
+                for hospital_id in self.redis_client.smembers(QUEUE_REGISTRY_KEY):
+                    hospital_id = hospital_id.decode()
                     
-                    case_id = self.redis_client.zrange(key, 0, 0)[0]
-                    if case_id:
-                        case_id = case_id.decode()
-                        self.process_case(case_id, hospital_id)
+                    case_ids = self.leases.reserve(hospital_id, 1)
+                    if case_ids:
+                        self.process_case(case_ids[0], hospital_id)
+                self.batcher.flush()
                 
                 time.sleep(1)
             except redis.RedisError as e:
@@ -84,7 +232,56 @@ class CaseQueueConsumer:
                 logger.error(f"Unexpected error: {str(e)}")
                 time.sleep(1)
 
+    def drain_owned_queues(self):
+        hospital_ids = [hospital_id.decode() for hospital_id in self.redis_client.smembers(QUEUE_REGISTRY_KEY)]
+        for hospital_id in self.group.owned(hospital_ids):
+            self.drain_queue(hospital_id)
+
+    def run_group(self):
+        """Consumer pool mode: each worker only drains the hospitals it owns in the group."""
+        self.group = ConsumerGroup(self.redis_client)
+        self.leases.worker_id = self.group.worker_id
+        logger.info(f"Joining consumer group as {self.group.worker_id}")
+        self.bootstrap_registry()
+        self.group.heartbeat()
+        self.drain_owned_queues()
+        last_rescan = time.time()
+        try:
+            while True:
+                try:
+                    hospital_ids, rebalanced = self.group.poll(QUEUE_EVENTS_KEY, CONSUMER_RESCAN_INTERVAL, CONSUMER_EVENT_BATCH)
+                    if rebalanced or self.rebalance_pending or time.time() - last_rescan >= CONSUMER_RESCAN_INTERVAL:
+                        if rebalanced or self.rebalance_pending:
+                            logger.info(f"Consumer group rebalanced, members: {self.group.members}")
+                        self.rebalance_pending = False
+                        last_rescan = time.time()
+                        self.drain_owned_queues()
+                        publish_pool_stats("consumer")
+                        publish_db_pool_stats("consumer")
+                        publish_inference_stats("consumer")
+                        publish_model_version_stats("consumer")
+                    for hospital_id in hospital_ids:
+                        self.drain_queue(hospital_id)
+                except redis.RedisError as e:
+                    logger.error(f"Redis error: {str(e)}")
+                    time.sleep(5)
+                except Exception as e:
+                    logger.error(f"Unexpected error: {str(e)}")
+                    time.sleep(1)
+        finally:
+            self.group.leave(QUEUE_EVENTS_KEY)
+
+    def run(self):
+        if CONSUMER_MODE == "poll":
+            self.run_polling()
+        elif CONSUMER_MODE == "group":
+            self.run_group()
+        else:
+            self.run_event_driven()
+
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    init_db()
     consumer = CaseQueueConsumer()
-    logger.info("Starting case queue consumer...")
-    consumer.run()
\ No newline at end of file
+    logger.info(f"Starting case queue consumer in {CONSUMER_MODE} mode...")
+    consumer.run()
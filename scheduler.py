@@ -1,6 +1,20 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
-from database import SessionLocal, Doctor
+from database import SessionLocal, Doctor, publish_db_pool_stats
+from ml.inference import publish_inference_stats
+from ml.model_rollout import publish_model_version_stats
+from ml.training_jobs import next_training_mode, submit_training_job_sync
+from services.doctor_index import publish_workload_reset
+from services.hospital_cache import publish_hospital_cache_stats
+from services.priority_engine import AGING_REFRESH_INTERVAL, QueueAging
+from services.queue_keys import QUEUE_REGISTRY_KEY, QUEUE_EVENTS_KEY
+from services.queue_metrics import daily_reset_commands, record_commands
+from services.queue_outbox import OUTBOX_RELAY_INTERVAL, relay_outbox
+from services.redis_client import get_redis_client, publish_pool_stats
+import os
+
+REDIS_POOL_STATS_INTERVAL = int(os.getenv("REDIS_POOL_STATS_INTERVAL", "30"))
+INCREMENTAL_TRAIN_INTERVAL = int(os.getenv("INCREMENTAL_TRAIN_INTERVAL", "900"))
 
 def reset_current_workload():
     db: Session = SessionLocal()
@@ -8,15 +22,63 @@ def reset_current_workload():
         db.query(Doctor).update({Doctor.current_workload: 0})
         db.commit()
         print("Current workload reset to 0 for all doctors")
+        redis_client = get_redis_client()
+        publish_workload_reset(redis_client)
+        # Freed capacity can unblock every queue
+        hospital_ids = redis_client.smembers(QUEUE_REGISTRY_KEY)
+        if hospital_ids:
+            redis_client.lpush(QUEUE_EVENTS_KEY, *hospital_ids)
+            record_commands(redis_client, lambda pipe: [
+                daily_reset_commands(pipe, hospital_id.decode()) for hospital_id in hospital_ids
+            ])
     except Exception as e:
         db.rollback()
         print(f"Error resetting workload: {e}")
     finally:
         db.close()
 
+def relay_queue_outbox():
+    db: Session = SessionLocal()
+    try:
+        # Drain the backlog: rows already pushed by their request, and anything accepted while Redis was down
+        while relay_outbox(db, get_redis_client()):
+            pass
+    except Exception as e:
+        db.rollback()
+        print(f"Error relaying queue outbox: {e}")
+    finally:
+        db.close()
+
+def refresh_queue_aging():
+    try:
+        bumped = QueueAging(get_redis_client()).refresh_all()
+        if bumped:
+            print(f"Aged {bumped} queued cases")
+    except Exception as e:
+        print(f"Error refreshing queue aging: {e}")
+
+def queue_model_training():
+    # Every web worker runs this, the training worker's single active slot keeps it to one job
+    try:
+        redis_client = get_redis_client()
+        mode = next_training_mode(redis_client)
+        job = submit_training_job_sync(redis_client, mode)
+        if job:
+            print(f"Queued {mode} training job {job['job_id']}")
+    except Exception as e:
+        print(f"Error queueing model training: {e}")
+
 def start_scheduler():
     scheduler = BackgroundScheduler()
     scheduler.add_job(reset_current_workload, 'cron', hour=0)
+    scheduler.add_job(publish_pool_stats, 'interval', seconds=REDIS_POOL_STATS_INTERVAL)
+    scheduler.add_job(publish_db_pool_stats, 'interval', seconds=REDIS_POOL_STATS_INTERVAL)
+    scheduler.add_job(publish_hospital_cache_stats, 'interval', seconds=REDIS_POOL_STATS_INTERVAL)
+    scheduler.add_job(publish_inference_stats, 'interval', seconds=REDIS_POOL_STATS_INTERVAL)
+    scheduler.add_job(publish_model_version_stats, 'interval', seconds=REDIS_POOL_STATS_INTERVAL)
+    scheduler.add_job(relay_queue_outbox, 'interval', seconds=OUTBOX_RELAY_INTERVAL, max_instances=1)
+    scheduler.add_job(refresh_queue_aging, 'interval', seconds=AGING_REFRESH_INTERVAL, max_instances=1)
+    scheduler.add_job(queue_model_training, 'interval', seconds=INCREMENTAL_TRAIN_INTERVAL, max_instances=1)
     scheduler.start()
     print("Scheduler started...")
 
@@ -0,0 +1,96 @@
+import logging
+import os
+import time
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from services.doctor_scoring import DoctorScoringEngine
+
+logger = logging.getLogger(__name__)
+
+ASSIGNMENT_STRATEGY = os.getenv("ASSIGNMENT_STRATEGY", "greedy")
+ASSIGNMENT_TIME_BUDGET_MS = float(os.getenv("ASSIGNMENT_TIME_BUDGET_MS", "250"))
+ASSIGNMENT_WINDOW = int(os.getenv("ASSIGNMENT_WINDOW", "512"))
+ASSIGNMENT_SLOTS_PER_DOCTOR = int(os.getenv("ASSIGNMENT_SLOTS_PER_DOCTOR", "1"))
+# SLA slack (seconds) below which a case starts gaining weight, and how much weight it can gain
+URGENCY_HORIZON_SECONDS = float(os.getenv("URGENCY_HORIZON_SECONDS", "3600"))
+URGENCY_WEIGHT = float(os.getenv("URGENCY_WEIGHT", "1.0"))
+
+
+def urgency_weights(sla_deadlines: Sequence[Optional[datetime]], now: Optional[datetime] = None) -> np.ndarray:
+    """1.0 for cases with at least URGENCY_HORIZON_SECONDS of SLA slack, rising to
+    1 + 2 * URGENCY_WEIGHT for cases a full horizon past their deadline."""
+    now = now or datetime.now()
+    slack = np.array(
+        [(deadline - now).total_seconds() if deadline else URGENCY_HORIZON_SECONDS for deadline in sla_deadlines],
+        dtype=np.float64,
+    )
+    return 1 + URGENCY_WEIGHT * np.clip(1 - slack / URGENCY_HORIZON_SECONDS, 0, 2)
+
+
+def _expand_slots(engine: DoctorScoringEngine, slots_per_doctor: int):
+    """Column per free doctor slot. Slot k of a doctor is scored as if it already had k more cases."""
+    capacity = np.minimum(slots_per_doctor, engine.max_cases - engine.workload).clip(min=0).astype(int)
+    slot_doctor = np.repeat(np.arange(len(engine)), capacity)
+    slot_rank = np.concatenate([np.arange(count) for count in capacity]) if len(capacity) else np.array([], dtype=int)
+    slot_load = 1 - (engine.workload[slot_doctor] + slot_rank) / engine.max_cases[slot_doctor]
+    return slot_doctor, slot_load
+
+
+def assign_optimal(
+    engine: DoctorScoringEngine,
+    symptom_lists: Sequence[Sequence[str]],
+    sla_deadlines: Sequence[Optional[datetime]],
+    slots_per_doctor: int = ASSIGNMENT_SLOTS_PER_DOCTOR,
+    time_budget_ms: float = ASSIGNMENT_TIME_BUDGET_MS,
+    window: int = ASSIGNMENT_WINDOW,
+) -> List[Optional[int]]:
+    """Assignment maximising the total urgency-weighted doctor score.
+
+    Cases are taken in queue order in windows of `window` cases. Each window
+    is solved exactly with the Hungarian algorithm against the slots still
+    free. This bounds every solve to window x slots. Once the time budget
+    would be exceeded, the remaining cases fall back to the greedy rule.
+    Returns the doctor index per case, or None for unassigned cases.
+    """
+    started = time.perf_counter()
+    deadline = started + time_budget_ms / 1000
+    result: List[Optional[int]] = [None] * len(symptom_lists)
+    if not len(engine) or not symptom_lists:
+        return result
+
+    slot_doctor, slot_load = _expand_slots(engine, slots_per_doctor)
+    free = np.ones(len(slot_doctor), dtype=bool)
+    weights = urgency_weights(sla_deadlines)
+    boosted = engine.boosted_batch(symptom_lists)
+
+    start = 0
+    last_solve = 0.0
+    while start < len(symptom_lists) and free.any():
+        if time.perf_counter() + last_solve > deadline:
+            logger.info(f"Assignment time budget reached after {start} cases, finishing greedily")
+            break
+        rows = slice(start, start + window)
+        columns = np.flatnonzero(free)
+        utility = boosted[rows][:, slot_doctor[columns]] * slot_load[columns] * weights[rows, None]
+        solve_started = time.perf_counter()
+        case_idx, slot_idx = linear_sum_assignment(utility, maximize=True)
+        last_solve = time.perf_counter() - solve_started
+        for row, column in zip(case_idx, slot_idx):
+            slot = columns[column]
+            result[start + row] = int(slot_doctor[slot])
+            free[slot] = False
+        start += window
+
+    # Greedy remainder: the best free slot per case, in queue order
+    for row in range(start, len(symptom_lists)):
+        if not free.any():
+            break
+        utility = np.where(free, boosted[row, slot_doctor] * slot_load, -np.inf)
+        slot = int(np.argmax(utility))
+        result[row] = int(slot_doctor[slot])
+        free[slot] = False
+    return result
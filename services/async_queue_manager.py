@@ -0,0 +1,187 @@
+import logging
+import uuid
+from typing import Dict, List, Optional, Set
+
+import redis
+import redis.asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud.aio.case_outcomes import create_case_outcome
+from crud.aio.doctors import create_doctor, delete_doctor, get_doctor, update_doctor
+from crud.aio.hospitals import create_hospital, delete_hospital, get_hospital, update_hospital
+from database import Case, CaseOutcome, Doctor, Hospital
+from ml.features import patient_features
+from ml.inference import predict_durations_async
+from ml.outcome_stream import publish_case_outcome_async
+from models.models import CaseOutcome as CaseOutcomeModel
+from models.models import DoctorProfile, HospitalPolicy, HospitalPolicyUpdate, PatientProfile
+from services.doctor_index import publish_doctor_delete_async, publish_doctor_upsert_async
+from services.hospital_cache import hospital_cache, publish_hospital_invalidation_async
+from services.queue_outbox import build_intake, publish_outbox_async
+from services.queue_metrics import (capacity_commands, hospital_metrics_async, outcome_commands,
+                                    record_commands_async, seed_capacity_commands)
+from services.queue_keys import QUEUE_EVENTS_KEY, QUEUE_EVENTS_MAX_LEN, QUEUE_REGISTRY_KEY, queue_key
+from services.queue_priorities import QueueReprioritizer, changed_urgency_levels
+from services.redis_client import get_async_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncQueueManager:
+    """QueueManager operations used by the API, on an AsyncSession and redis.asyncio.
+
+    Writes the same rows, queue entries, wakeups and doctor index events as
+    QueueManager, so the consumer cannot tell which one enqueued a case.
+    Assignment stays in the consumer and the sync QueueManager.
+    """
+
+    def __init__(self, db_session: AsyncSession, redis_client: Optional[redis.asyncio.Redis] = None):
+        self.db = db_session
+        self.redis_client = redis_client or get_async_redis_client()
+
+    async def add_hospital(self, policy: HospitalPolicy) -> Hospital:
+        return await create_hospital(self.db, Hospital(**policy.model_dump()))
+
+    async def get_hospital(self, hospital_id: str) -> Optional[Dict]:
+        return await hospital_cache.get_policy_async(self.db, hospital_id)
+
+    async def update_hospital(self, hospital_id: str, policy: HospitalPolicyUpdate) -> Optional[Hospital]:
+        hospital_data = {
+            "name": policy.name,
+            "sla_rules": policy.sla_rules,
+            "max_cases_per_specialist": policy.max_cases_per_specialist,
+            "max_cases_per_general": policy.max_cases_per_general,
+            "working_hours": policy.working_hours
+        }
+        current = await get_hospital(self.db, hospital_id)
+        old_sla_rules = dict(current.sla_rules or {}) if current else None
+        hospital = await update_hospital(self.db, hospital_id, hospital_data)
+        await publish_hospital_invalidation_async(self.redis_client, hospital_id)
+        if hospital and policy.sla_rules is not None:
+            await self.update_queue_priorities(hospital_id, changed_urgency_levels(old_sla_rules, hospital.sla_rules))
+        return hospital
+
+    async def delete_hospital(self, hospital_id: str) -> bool:
+        deleted = await delete_hospital(self.db, hospital_id)
+        await publish_hospital_invalidation_async(self.redis_client, hospital_id)
+        if deleted:
+            try:
+                await self.redis_client.srem(QUEUE_REGISTRY_KEY, hospital_id)
+            except redis.RedisError as e:
+                logger.error(f"Redis error: {str(e)}")
+        return deleted
+
+    async def register_doctor(self, doctor: DoctorProfile) -> Doctor:
+        db_doctor = await create_doctor(self.db, Doctor(**doctor.model_dump()))
+        await publish_doctor_upsert_async(self.redis_client, db_doctor)
+        await self.record_doctor_capacity(db_doctor.hospital_id, db_doctor.doctor_id, db_doctor.max_daily_cases)
+        if db_doctor.availability:
+            await self.notify_queue(db_doctor.hospital_id)
+        return db_doctor
+
+    async def update_doctor(self, doctor_id: str, doctor_data: dict) -> Optional[Doctor]:
+        doctor = await update_doctor(self.db, doctor_id, doctor_data)
+        if doctor:
+            await publish_doctor_upsert_async(self.redis_client, doctor)
+            await self.record_doctor_capacity(doctor.hospital_id, doctor.doctor_id, doctor.max_daily_cases)
+            if doctor.availability:
+                await self.notify_queue(doctor.hospital_id)
+        return doctor
+
+    async def delete_doctor(self, doctor_id: str) -> bool:
+        doctor = await get_doctor(self.db, doctor_id)
+        hospital_id = doctor.hospital_id if doctor else None
+        deleted = await delete_doctor(self.db, doctor_id)
+        if deleted:
+            await publish_doctor_delete_async(self.redis_client, doctor_id)
+            await self.record_doctor_capacity(hospital_id, doctor_id, 0)
+        return deleted
+
+    async def record_doctor_capacity(self, hospital_id: str, doctor_id: str, max_daily_cases: Optional[int]):
+        await record_commands_async(
+            self.redis_client, lambda pipe: capacity_commands(pipe, hospital_id, doctor_id, max_daily_cases)
+        )
+
+    async def add_case(self, patient: PatientProfile, hospital_id: str) -> Optional[Case]:
+        """Insert patient, case and queue outbox entry in one transaction, then enqueue.
+
+        If Redis is unreachable the case is still accepted; the outbox relay
+        enqueues it later.
+        """
+        sla_rules = await hospital_cache.get_sla_rules_async(self.db, hospital_id)
+        if sla_rules is None:
+            return None
+
+        prediction, = await predict_durations_async([patient_features(patient)])
+        db_patient, db_case, entry = build_intake(patient, hospital_id, sla_rules, prediction)
+        self.db.add_all([db_patient, db_case, entry])
+        await self.db.commit()
+        await publish_outbox_async(self.redis_client, [entry], {db_case.case_id: patient.urgency_level.value})
+        return db_case
+
+    def _queue_notification(self, pipe, hospital_id: str):
+        pipe.sadd(QUEUE_REGISTRY_KEY, hospital_id)
+        pipe.lpush(QUEUE_EVENTS_KEY, hospital_id)
+        pipe.ltrim(QUEUE_EVENTS_KEY, 0, QUEUE_EVENTS_MAX_LEN - 1)
+
+    async def notify_queue(self, hospital_id: str):
+        try:
+            pipe = self.redis_client.pipeline()
+            self._queue_notification(pipe, hospital_id)
+            await pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Redis error: {str(e)}")
+
+    async def record_case_outcome(self, case_id: str, outcome: CaseOutcomeModel) -> Optional[CaseOutcome]:
+        """None if the case already has an outcome."""
+        db_outcome = CaseOutcome(id=str(uuid.uuid4()), **{**outcome.model_dump(), "case_id": case_id})
+        db_outcome = await create_case_outcome(self.db, db_outcome)
+        if db_outcome is None:
+            return None
+        await publish_case_outcome_async(self.redis_client, case_id)
+        case = await self.db.get(Case, case_id)
+        if case:
+            await record_commands_async(
+                self.redis_client, lambda pipe: outcome_commands(pipe, case.hospital_id, outcome.met_sla)
+            )
+        return db_outcome
+
+    async def get_hospital_metrics(self, hospital_id: str) -> Optional[Dict]:
+        """Live queue and SLA metrics of a hospital, see services.queue_metrics."""
+        if await hospital_cache.get_policy_async(self.db, hospital_id) is None:
+            return None
+        metrics = await hospital_metrics_async(self.redis_client, hospital_id)
+        if metrics["capacity_seeded"]:
+            return metrics
+        # Doctors registered before the capacity counter existed, counted once per hospital
+        capacities = (await self.db.execute(
+            select(Doctor.doctor_id, Doctor.max_daily_cases).where(Doctor.hospital_id == hospital_id)
+        )).all()
+        await record_commands_async(self.redis_client, lambda pipe: seed_capacity_commands(pipe, hospital_id, capacities))
+        return await hospital_metrics_async(self.redis_client, hospital_id)
+
+    async def get_all_hospital_metrics(self) -> List[Dict]:
+        hospital_ids = sorted(hospital_id.decode() for hospital_id in await self.redis_client.smembers(QUEUE_REGISTRY_KEY))
+        return [await hospital_metrics_async(self.redis_client, hospital_id) for hospital_id in hospital_ids]
+
+    async def update_queue_priorities(self, hospital_id: str, urgency_levels: Optional[Set[str]] = None):
+        """Rescore the hospital queue, only the given urgency levels if known. See QueueReprioritizer."""
+        lock = self.redis_client.lock(f"queue_update_lock:{hospital_id}", timeout=10)
+        if not await lock.acquire(blocking_timeout=1):
+            logger.warning(f"Could not acquire lock for queue update on hospital {hospital_id}")
+            return
+
+        try:
+            sla_rules = await hospital_cache.get_sla_rules_async(self.db, hospital_id)
+            if sla_rules is None:
+                raise ValueError(f"Hospital {hospital_id} not found")
+            rescored = await QueueReprioritizer(self.redis_client).run_async(self.db, hospital_id, sla_rules, urgency_levels)
+            await self.db.commit()
+            await self.notify_queue(hospital_id)
+            logger.info(f"Re-prioritized {rescored} cases for hospital {hospital_id}")
+        except Exception as e:
+            logger.error(f"Error updating queue priorities for hospital {hospital_id}: {str(e)}")
+            raise
+        finally:
+            await lock.release()
@@ -0,0 +1,173 @@
+import codecs
+import json
+import logging
+import os
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import redis.asyncio
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Case, Patient, QueueOutbox
+from ml.features import patient_features
+from ml.inference import predict_durations_async
+from models.models import PatientProfile
+from services.queue_outbox import intake_rows, publish_outbox_async
+
+logger = logging.getLogger(__name__)
+
+BULK_INTAKE_BATCH_SIZE = int(os.getenv("BULK_INTAKE_BATCH_SIZE", "500"))
+# A single row larger than this aborts the upload instead of buffering without bound
+BULK_INTAKE_MAX_ROW_BYTES = int(os.getenv("BULK_INTAKE_MAX_ROW_BYTES", str(1024 * 1024)))
+
+_decoder = json.JSONDecoder()
+
+
+class BulkIntakeError(Exception):
+    """The body cannot be parsed any further."""
+
+
+async def iter_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """Yield (row number, object, error) from an NDJSON or JSON-array body as it streams in.
+
+    The format is picked from the first non-whitespace byte. Only the
+    current row is buffered. A bad NDJSON line is reported and skipped; a
+    bad JSON-array element ends the stream because the parser cannot find
+    the next element.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    is_array = None
+    row = 0
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        if is_array is None:
+            buffer = buffer.lstrip()
+            if not buffer:
+                continue
+            is_array = buffer.startswith("[")
+            if is_array:
+                buffer = buffer[1:]
+
+        if is_array:
+            while True:
+                buffer = buffer.lstrip().lstrip(",").lstrip()
+                if not buffer or buffer.startswith("]"):
+                    break
+                try:
+                    obj, end = _decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    if len(buffer) > BULK_INTAKE_MAX_ROW_BYTES:
+                        raise BulkIntakeError(f"Row {row} exceeds {BULK_INTAKE_MAX_ROW_BYTES} bytes or is malformed")
+                    break
+                buffer = buffer[end:]
+                yield row, obj, None
+                row += 1
+        else:
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                if line.strip():
+                    yield _parse_line(row, line)
+                    row += 1
+            if len(buffer) > BULK_INTAKE_MAX_ROW_BYTES:
+                raise BulkIntakeError(f"Row {row} exceeds {BULK_INTAKE_MAX_ROW_BYTES} bytes")
+
+    if is_array:
+        if buffer.strip() not in ("]", ""):
+            raise BulkIntakeError(f"Malformed JSON array at row {row}")
+    elif buffer.strip():
+        yield _parse_line(row, buffer)
+
+
+def _parse_line(row: int, line: str) -> Tuple[int, Optional[Dict], Optional[str]]:
+    try:
+        return row, json.loads(line), None
+    except json.JSONDecodeError as e:
+        return row, None, f"Invalid JSON: {str(e)}"
+
+
+class BulkIntake:
+    """Streams patients into cases in batches.
+
+    Each batch of BULK_INTAKE_BATCH_SIZE valid rows is inserted with one
+    executemany per table and committed once, then enqueued through the
+    queue outbox in a single pipeline. If a batch hits a constraint
+    violation it is retried row by row so the error lands on the right row.
+    Results are yielded per row as each batch completes.
+    """
+
+    def __init__(self, db: AsyncSession, redis_client: redis.asyncio.Redis, hospital_id: str, sla_rules: Dict,
+                 batch_size: int = BULK_INTAKE_BATCH_SIZE):
+        self.db = db
+        self.redis_client = redis_client
+        self.hospital_id = hospital_id
+        self.sla_rules = sla_rules
+        self.batch_size = batch_size
+        self.accepted = 0
+        self.rejected = 0
+
+    async def run(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict]:
+        batch: List[Tuple[int, PatientProfile]] = []
+        try:
+            async for row, obj, error in iter_rows(chunks):
+                if error is None:
+                    try:
+                        batch.append((row, PatientProfile.model_validate(obj)))
+                    except ValidationError as e:
+                        error = json.dumps(e.errors(include_url=False), default=str)
+                if error is not None:
+                    self.rejected += 1
+                    yield {"row": row, "status": "rejected", "error": error}
+                if len(batch) >= self.batch_size:
+                    for result in await self._flush(batch):
+                        yield result
+                    batch = []
+        except BulkIntakeError as e:
+            yield {"status": "aborted", "error": str(e)}
+        if batch:
+            for result in await self._flush(batch):
+                yield result
+        yield {"summary": {"accepted": self.accepted, "rejected": self.rejected}}
+
+    async def _flush(self, batch: List[Tuple[int, PatientProfile]]) -> List[Dict]:
+        predictions = await predict_durations_async([patient_features(patient) for _, patient in batch])
+        rows = [
+            (row, intake_rows(patient, self.hospital_id, self.sla_rules, prediction))
+            for (row, patient), prediction in zip(batch, predictions)
+        ]
+        try:
+            await self._insert([intake for _, intake in rows])
+            return await self._accepted(rows)
+        except IntegrityError:
+            await self.db.rollback()
+
+        results = []
+        inserted = []
+        for row, intake in rows:
+            try:
+                await self._insert([intake])
+                inserted.append((row, intake))
+            except IntegrityError as e:
+                await self.db.rollback()
+                self.rejected += 1
+                results.append({"row": row, "status": "rejected", "error": str(e.orig)})
+        results.extend(await self._accepted(inserted))
+        return sorted(results, key=lambda result: result["row"])
+
+    async def _insert(self, intakes: List[Tuple[Dict, Dict, Dict]]):
+        await self.db.execute(insert(Patient), [patient for patient, _, _ in intakes])
+        await self.db.execute(insert(Case), [case for _, case, _ in intakes])
+        await self.db.execute(insert(QueueOutbox), [outbox for _, _, outbox in intakes])
+        await self.db.commit()
+
+    async def _accepted(self, rows) -> List[Dict]:
+        if not rows:
+            return []
+        await publish_outbox_async(
+            self.redis_client, [QueueOutbox(**outbox) for _, (_, _, outbox) in rows],
+            {case["case_id"]: patient["urgency_level"].value for _, (patient, case, _) in rows},
+        )
+        self.accepted += len(rows)
+        return [{"row": row, "status": "queued", "case_id": case["case_id"]} for row, (_, case, _) in rows]
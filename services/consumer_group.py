@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Iterable, List, Optional, Set, Tuple
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+GROUP_MEMBERS_KEY = "consumer_group:members"
+CONSUMER_INBOX_PREFIX = "consumer_inbox:"
+CONSUMER_HEARTBEAT_INTERVAL = float(os.getenv("CONSUMER_HEARTBEAT_INTERVAL", "5"))
+CONSUMER_HEARTBEAT_TTL = float(os.getenv("CONSUMER_HEARTBEAT_TTL", "15"))
+
+
+def _weight(worker_id: str, hospital_id: str) -> int:
+    digest = hashlib.blake2b(f"{worker_id}:{hospital_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def rendezvous_owner(hospital_id: str, members: List[str]) -> Optional[str]:
+    """Highest-random-weight owner of a hospital. Only ~1/N hospitals move when a member joins or leaves."""
+    if not members:
+        return None
+    return max(members, key=lambda worker_id: _weight(worker_id, hospital_id))
+
+
+class ConsumerGroup:
+    """Membership and hospital ownership for a pool of queue consumers.
+
+    Workers heartbeat into a sorted set scored by last-seen time. Every worker
+    derives the same hospital -> worker mapping from the live member list by
+    rendezvous hashing, so no coordinator is needed and a dead worker's
+    hospitals move to the survivors once its heartbeat expires. Wakeups for a
+    hospital owned by another worker are forwarded to that worker's inbox.
+    """
+
+    def __init__(self, redis_client: redis.Redis, worker_id: Optional[str] = None):
+        self.redis_client = redis_client
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.members: List[str] = []
+        self.last_heartbeat = 0.0
+
+    @property
+    def inbox_key(self) -> str:
+        return f"{CONSUMER_INBOX_PREFIX}{self.worker_id}"
+
+    def heartbeat(self) -> bool:
+        """Refresh this worker's membership. Returns True when the live member set changed."""
+        now = time.time()
+        cutoff = now - CONSUMER_HEARTBEAT_TTL
+        pipe = self.redis_client.pipeline()
+        pipe.zadd(GROUP_MEMBERS_KEY, {self.worker_id: now})
+        pipe.zrangebyscore(GROUP_MEMBERS_KEY, "-inf", cutoff)
+        pipe.zremrangebyscore(GROUP_MEMBERS_KEY, "-inf", cutoff)
+        pipe.zrange(GROUP_MEMBERS_KEY, 0, -1)
+        _, expired, _, members = pipe.execute()
+        self.last_heartbeat = now
+
+        if expired:
+            self.redis_client.delete(*(f"{CONSUMER_INBOX_PREFIX}{member.decode()}" for member in expired))
+            logger.info(f"Expired consumers: {[member.decode() for member in expired]}")
+
+        members = sorted(member.decode() for member in members)
+        changed = members != self.members
+        self.members = members
+        return changed
+
+    def heartbeat_due(self) -> bool:
+        return time.time() - self.last_heartbeat >= CONSUMER_HEARTBEAT_INTERVAL
+
+    def owner(self, hospital_id: str) -> Optional[str]:
+        return rendezvous_owner(hospital_id, self.members)
+
+    def owns(self, hospital_id: str) -> bool:
+        return self.owner(hospital_id) == self.worker_id
+
+    def owned(self, hospital_ids: Iterable[str]) -> List[str]:
+        return [hospital_id for hospital_id in hospital_ids if self.owns(hospital_id)]
+
+    def forward(self, hospital_id: str):
+        owner = self.owner(hospital_id)
+        self.redis_client.lpush(f"{CONSUMER_INBOX_PREFIX}{owner}", hospital_id)
+
+    def poll(self, events_key: str, timeout: float, batch: int = 100) -> Tuple[Set[str], bool]:
+        """Heartbeat when due and wait for wakeups of hospitals this worker owns.
+
+        Returns the hospital ids to drain and whether ownership was rebalanced.
+        Wakeups from the inbox are always handled locally, even if this
+        worker's member view disagrees, so forwarded events cannot ping-pong.
+        """
+        rebalanced = self.heartbeat() if self.heartbeat_due() else False
+        timeout = max(1, int(min(timeout, CONSUMER_HEARTBEAT_INTERVAL)))
+        event = self.redis_client.blpop([self.inbox_key, events_key], timeout=timeout)
+        if event is None:
+            return set(), rebalanced
+
+        key, hospital_id = event[0].decode(), event[1].decode()
+        inbox = {hospital_id} if key == self.inbox_key else set()
+        shared = {hospital_id} if key != self.inbox_key else set()
+        for source, target in ((self.inbox_key, inbox), (events_key, shared)):
+            pending = self.redis_client.lpop(source, batch)
+            if pending:
+                target.update(item.decode() for item in pending)
+
+        for hospital_id in shared - inbox:
+            if not self.owns(hospital_id):
+                self.forward(hospital_id)
+                shared.discard(hospital_id)
+        return inbox | shared, rebalanced
+
+    def leave(self, events_key: str):
+        """Drop out of the group and hand pending inbox wakeups back to the shared list."""
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.zrem(GROUP_MEMBERS_KEY, self.worker_id)
+            pipe.lrange(self.inbox_key, 0, -1)
+            pipe.delete(self.inbox_key)
+            _, pending, _ = pipe.execute()
+            if pending:
+                self.redis_client.rpush(events_key, *pending)
+        except redis.RedisError as e:
+            logger.error(f"Redis error while leaving consumer group: {str(e)}")
@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import redis
+import redis.asyncio
+from sqlalchemy.orm import Session
+
+from database import Doctor
+
+logger = logging.getLogger(__name__)
+
+DOCTOR_EVENTS_CHANNEL = "doctor_index_events"
+DOCTOR_INDEX_REFRESH_SECONDS = float(os.getenv("DOCTOR_INDEX_REFRESH_SECONDS", "300"))
+# Lets a process skip its own events, which it has already applied locally
+_ORIGIN = uuid.uuid4().hex
+
+
+class DoctorRecord:
+    """Compact in-memory copy of the doctor columns used for matching.
+
+    Attribute names mirror the Doctor model so scoring code works on either.
+    """
+    __slots__ = (
+        "doctor_id", "hospital_id", "availability", "current_workload", "max_daily_cases",
+        "experience_years", "patient_rating", "success_rate", "specialization_tags",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+        self.specialization_tags = list(self.specialization_tags or [])
+        self.current_workload = self.current_workload or 0
+
+    @classmethod
+    def from_doctor(cls, doctor: Doctor) -> "DoctorRecord":
+        return cls(**{name: getattr(doctor, name) for name in cls.__slots__})
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def is_available(self) -> bool:
+        return bool(self.availability) and self.current_workload < (self.max_daily_cases or 0)
+
+
+class DoctorIndex:
+    """Per-hospital index of doctors for candidate selection without a DB round trip.
+
+    Hospitals are loaded from the DB on first use and refreshed every
+    DOCTOR_INDEX_REFRESH_SECONDS. Between refreshes the index is kept current
+    incrementally: assignments made by this process update it directly, and
+    changes made elsewhere (doctor update/delete, nightly workload reset,
+    assignments by other consumers) arrive as events on DOCTOR_EVENTS_CHANNEL.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._doctors: Dict[str, Dict[str, DoctorRecord]] = {}
+        self._loaded_at: Dict[str, float] = {}
+
+    def load_hospital(self, db: Session, hospital_id: str):
+        doctors = db.query(Doctor).filter(Doctor.hospital_id == hospital_id).all()
+        with self._lock:
+            self._doctors[hospital_id] = {}
+            for doctor in doctors:
+                self._add(DoctorRecord.from_doctor(doctor))
+            self._loaded_at[hospital_id] = time.monotonic()
+
+    def ensure_loaded(self, db: Session, hospital_id: str):
+        loaded_at = self._loaded_at.get(hospital_id)
+        if loaded_at is None or time.monotonic() - loaded_at > DOCTOR_INDEX_REFRESH_SECONDS:
+            self.load_hospital(db, hospital_id)
+
+    def invalidate(self, hospital_id: Optional[str] = None):
+        """Force a reload from the DB on next use, e.g. after a rolled back assignment."""
+        with self._lock:
+            if hospital_id is None:
+                self._loaded_at.clear()
+            else:
+                self._loaded_at.pop(hospital_id, None)
+
+    def candidates(self, hospital_id: str) -> List[DoctorRecord]:
+        with self._lock:
+            return [record for record in self._doctors.get(hospital_id, {}).values() if record.is_available()]
+
+    def get(self, hospital_id: str, doctor_id: str) -> Optional[DoctorRecord]:
+        return self._doctors.get(hospital_id, {}).get(doctor_id)
+
+    def upsert(self, record: DoctorRecord):
+        with self._lock:
+            self._remove(record.doctor_id)
+            if record.hospital_id in self._doctors:
+                self._add(record)
+
+    def remove(self, doctor_id: str):
+        with self._lock:
+            self._remove(doctor_id)
+
+    def record_assignment(self, hospital_id: str, doctor_id: str) -> Optional[DoctorRecord]:
+        with self._lock:
+            record = self.get(hospital_id, doctor_id)
+            if record:
+                record.availability = False
+                record.current_workload += 1
+            return record
+
+    def reset_workloads(self):
+        with self._lock:
+            for doctors in self._doctors.values():
+                for record in doctors.values():
+                    record.current_workload = 0
+
+    def _add(self, record: DoctorRecord):
+        self._doctors.setdefault(record.hospital_id, {})[record.doctor_id] = record
+
+    def _remove(self, doctor_id: str):
+        for doctors in self._doctors.values():
+            if doctors.pop(doctor_id, None):
+                return
+
+    def apply_event(self, event: Dict):
+        if event.get("origin") == _ORIGIN:
+            return
+        kind = event.get("event")
+        if kind == "upsert":
+            self.upsert(DoctorRecord(**event["doctor"]))
+        elif kind == "delete":
+            self.remove(event["doctor_id"])
+        elif kind == "reset":
+            self.reset_workloads()
+        else:
+            logger.warning(f"Unknown doctor index event: {kind}")
+
+    def start_listener(self, redis_client: redis.Redis) -> threading.Thread:
+        thread = threading.Thread(target=self._listen, args=(redis_client,), daemon=True, name="doctor-index-listener")
+        thread.start()
+        return thread
+
+    def _listen(self, redis_client: redis.Redis):
+        while True:
+            try:
+                pubsub = redis_client.pubsub()
+                pubsub.subscribe(DOCTOR_EVENTS_CHANNEL)
+                for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        # Events published while we were not subscribed are lost, reload everything
+                        self.invalidate()
+                    elif message["type"] == "message":
+                        self.apply_event(json.loads(message["data"]))
+            except redis.RedisError as e:
+                logger.error(f"Doctor index listener error: {str(e)}")
+                time.sleep(1)
+            except Exception as e:
+                logger.error(f"Doctor index listener error: {str(e)}")
+                self.invalidate()
+
+
+def publish_doctor_upsert(redis_client: redis.Redis, doctor):
+    record = doctor if isinstance(doctor, DoctorRecord) else DoctorRecord.from_doctor(doctor)
+    _publish(redis_client, {"event": "upsert", "doctor": record.to_dict()})
+
+
+def publish_doctor_delete(redis_client: redis.Redis, doctor_id: str):
+    _publish(redis_client, {"event": "delete", "doctor_id": doctor_id})
+
+
+def publish_workload_reset(redis_client: redis.Redis):
+    _publish(redis_client, {"event": "reset"})
+
+
+def _publish(redis_client: redis.Redis, event: Dict):
+    try:
+        redis_client.publish(DOCTOR_EVENTS_CHANNEL, json.dumps({**event, "origin": _ORIGIN}))
+    except redis.RedisError as e:
+        logger.error(f"Redis error publishing doctor event: {str(e)}")
+
+
+async def publish_doctor_upsert_async(redis_client: redis.asyncio.Redis, doctor):
+    record = doctor if isinstance(doctor, DoctorRecord) else DoctorRecord.from_doctor(doctor)
+    await _publish_async(redis_client, {"event": "upsert", "doctor": record.to_dict()})
+
+
+async def publish_doctor_delete_async(redis_client: redis.asyncio.Redis, doctor_id: str):
+    await _publish_async(redis_client, {"event": "delete", "doctor_id": doctor_id})
+
+
+async def _publish_async(redis_client: redis.asyncio.Redis, event: Dict):
+    try:
+        await redis_client.publish(DOCTOR_EVENTS_CHANNEL, json.dumps({**event, "origin": _ORIGIN}))
+    except redis.RedisError as e:
+        logger.error(f"Redis error publishing doctor event: {str(e)}")
@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import redis
+import redis.asyncio
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import Hospital
+from services.redis_client import publish_process_stats
+
+logger = logging.getLogger(__name__)
+
+HOSPITAL_CACHE_TTL_SECONDS = float(os.getenv("HOSPITAL_CACHE_TTL_SECONDS", "60"))
+HOSPITAL_EVENTS_CHANNEL = "hospital_policy_events"
+HOSPITAL_CACHE_STATS_KEY = "hospital_cache_stats"
+POLICY_FIELDS = ("hospital_id", "name", "sla_rules", "max_cases_per_specialist", "max_cases_per_general", "working_hours")
+
+
+class HospitalPolicyCache:
+    """Read-through per-process cache of hospital policies.
+
+    Entries expire after HOSPITAL_CACHE_TTL_SECONDS. update_hospital and
+    delete_hospital publish an invalidation on HOSPITAL_EVENTS_CHANNEL and
+    every process listening drops the entry straight away. A load that
+    races with an invalidation is not stored, so a stale row read just
+    before an update cannot outlive it.
+    """
+
+    def __init__(self, ttl: float = HOSPITAL_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, Dict]] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def _cached(self, hospital_id: str) -> Optional[Dict]:
+        entry = self._entries.get(hospital_id)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _store(self, hospital_id: str, hospital: Optional[Hospital], generation: int) -> Optional[Dict]:
+        if hospital is None:
+            return None
+        policy = {field: getattr(hospital, field) for field in POLICY_FIELDS}
+        with self._lock:
+            if generation == self._generation:
+                self._entries[hospital_id] = (time.monotonic() + self.ttl, policy)
+        return policy
+
+    def _record(self, start: float, hit: bool):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.lookup_seconds += elapsed
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.miss_seconds += elapsed
+
+    def get_policy(self, db: Session, hospital_id: str) -> Optional[Dict]:
+        """Policy columns of the hospital as a dict, None if it does not exist."""
+        start = time.perf_counter()
+        policy = self._cached(hospital_id)
+        if policy is None:
+            generation = self._generation
+            hospital = db.scalar(select(Hospital).where(Hospital.hospital_id == hospital_id))
+            policy = self._store(hospital_id, hospital, generation)
+            self._record(start, hit=False)
+        else:
+            self._record(start, hit=True)
+        return policy
+
+    async def get_policy_async(self, db: AsyncSession, hospital_id: str) -> Optional[Dict]:
+        start = time.perf_counter()
+        policy = self._cached(hospital_id)
+        if policy is None:
+            generation = self._generation
+            hospital = await db.scalar(select(Hospital).where(Hospital.hospital_id == hospital_id))
+            policy = self._store(hospital_id, hospital, generation)
+            self._record(start, hit=False)
+        else:
+            self._record(start, hit=True)
+        return policy
+
+    def get_sla_rules(self, db: Session, hospital_id: str) -> Optional[Dict]:
+        """SLA rules of the hospital, None if it does not exist."""
+        policy = self.get_policy(db, hospital_id)
+        return policy["sla_rules"] if policy else None
+
+    async def get_sla_rules_async(self, db: AsyncSession, hospital_id: str) -> Optional[Dict]:
+        policy = await self.get_policy_async(db, hospital_id)
+        return policy["sla_rules"] if policy else None
+
+    def invalidate(self, hospital_id: Optional[str] = None):
+        with self._lock:
+            self._generation += 1
+            if hospital_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(hospital_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "avg_lookup_ms": self.lookup_seconds / lookups * 1000 if lookups else 0.0,
+                "avg_miss_ms": self.miss_seconds / self.misses * 1000 if self.misses else 0.0,
+            }
+
+    def start_listener(self, redis_client: redis.Redis) -> threading.Thread:
+        thread = threading.Thread(target=self._listen, args=(redis_client,), daemon=True, name="hospital-cache-listener")
+        thread.start()
+        return thread
+
+    def _listen(self, redis_client: redis.Redis):
+        while True:
+            try:
+                pubsub = redis_client.pubsub()
+                pubsub.subscribe(HOSPITAL_EVENTS_CHANNEL)
+                for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        # Invalidations published while we were not subscribed are lost
+                        self.invalidate()
+                    elif message["type"] == "message":
+                        self.invalidate(json.loads(message["data"])["hospital_id"])
+            except redis.RedisError as e:
+                logger.error(f"Hospital cache listener error: {str(e)}")
+                time.sleep(1)
+            except Exception as e:
+                logger.error(f"Hospital cache listener error: {str(e)}")
+                self.invalidate()
+
+
+hospital_cache = HospitalPolicyCache()
+
+
+def publish_hospital_invalidation(redis_client: redis.Redis, hospital_id: str):
+    hospital_cache.invalidate(hospital_id)
+    try:
+        redis_client.publish(HOSPITAL_EVENTS_CHANNEL, json.dumps({"hospital_id": hospital_id}))
+    except redis.RedisError as e:
+        logger.error(f"Redis error publishing hospital invalidation: {str(e)}")
+
+
+async def publish_hospital_invalidation_async(redis_client: redis.asyncio.Redis, hospital_id: str):
+    hospital_cache.invalidate(hospital_id)
+    try:
+        await redis_client.publish(HOSPITAL_EVENTS_CHANNEL, json.dumps({"hospital_id": hospital_id}))
+    except redis.RedisError as e:
+        logger.error(f"Redis error publishing hospital invalidation: {str(e)}")
+
+
+def publish_hospital_cache_stats(role: str = "web"):
+    publish_process_stats(HOSPITAL_CACHE_STATS_KEY, hospital_cache.stats(), role)
@@ -0,0 +1,161 @@
+import os
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import redis
+
+from database import UrgencyLevelEnum
+from services.queue_keys import QUEUE_REGISTRY_KEY, aging_key, aging_meta_key, queue_key
+from services.queue_leases import inflight_key
+
+PRIORITY_WEIGHT_URGENCY = float(os.getenv("PRIORITY_WEIGHT_URGENCY", "0.5"))
+PRIORITY_WEIGHT_TRIAGE = float(os.getenv("PRIORITY_WEIGHT_TRIAGE", "0.3"))
+PRIORITY_WEIGHT_ML = float(os.getenv("PRIORITY_WEIGHT_ML", "0.2"))
+TRIAGE_SCORE_MAX = float(os.getenv("TRIAGE_SCORE_MAX", "10"))
+# How far ahead of its SLA deadline a case with priority_score 1.0 is queued
+PRIORITY_HORIZON_SECONDS = float(os.getenv("PRIORITY_HORIZON_SECONDS", "1800"))
+# wait_seconds:credit_seconds, a case that has waited wait_seconds moves credit_seconds further ahead
+AGING_BUCKETS = os.getenv("AGING_BUCKETS", "1800:300,3600:600,7200:900,14400:1800")
+AGING_REFRESH_INTERVAL = int(os.getenv("AGING_REFRESH_INTERVAL", "60"))
+AGING_REFRESH_BATCH = int(os.getenv("AGING_REFRESH_BATCH", "1000"))
+
+URGENCY_WEIGHTS = {
+    UrgencyLevelEnum.EMERGENCY.value: 1.0,
+    UrgencyLevelEnum.URGENT.value: 0.5,
+    UrgencyLevelEnum.ROUTINE.value: 0.0,
+}
+
+# KEYS: queue, aging, aging meta, inflight. ARGV: now, limit, then wait/credit
+# pairs in ascending wait order. Only cases whose next bucket is due are
+# touched: their queue score drops by the credit of every bucket crossed and
+# their next crossing is rescheduled. Leased cases are retried later, cases
+# that left the queue are forgotten.
+AGING_SCRIPT = """
+local queue, aging, meta, inflight = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local now = tonumber(ARGV[1])
+local buckets = (#ARGV - 2) / 2
+local due = redis.call('ZRANGEBYSCORE', aging, '-inf', now, 'LIMIT', 0, tonumber(ARGV[2]))
+local bumped = 0
+for _, case_id in ipairs(due) do
+    local entry = redis.call('HGET', meta, case_id)
+    local queued = redis.call('ZSCORE', queue, case_id)
+    if not queued and entry and redis.call('ZSCORE', inflight, case_id) then
+        redis.call('ZADD', aging, now + 1, case_id)
+    elseif not queued or not entry then
+        redis.call('ZREM', aging, case_id)
+        redis.call('HDEL', meta, case_id)
+    else
+        local enqueued, applied = string.match(entry, '^([^|]+)|(%d+)$')
+        enqueued, applied = tonumber(enqueued), tonumber(applied)
+        local credit = 0
+        while applied < buckets and enqueued + tonumber(ARGV[3 + applied * 2]) <= now do
+            credit = credit + tonumber(ARGV[4 + applied * 2])
+            applied = applied + 1
+        end
+        if credit > 0 then
+            redis.call('ZINCRBY', queue, -credit, case_id)
+            bumped = bumped + 1
+        end
+        if applied < buckets then
+            redis.call('ZADD', aging, enqueued + tonumber(ARGV[3 + applied * 2]), case_id)
+            redis.call('HSET', meta, case_id, enqueued .. '|' .. applied)
+        else
+            redis.call('ZREM', aging, case_id)
+            redis.call('HDEL', meta, case_id)
+        end
+    end
+end
+return {#due, bumped}
+"""
+
+
+def parse_aging_buckets(spec: str) -> List[Tuple[float, float]]:
+    buckets = []
+    for bucket in filter(None, (part.strip() for part in spec.split(","))):
+        wait, credit = bucket.split(":")
+        buckets.append((float(wait), float(credit)))
+    return sorted(buckets)
+
+
+aging_buckets = parse_aging_buckets(AGING_BUCKETS)
+
+
+def _clamp(value: float) -> float:
+    return min(max(value, 0.0), 1.0)
+
+
+def priority_score(urgency_level, triage_score: Optional[float] = None,
+                   ml_priority_score: Optional[float] = None) -> float:
+    """Static priority of a case between 0 and 1 from urgency, triage and the ML prediction.
+
+    Missing triage or ML scores contribute nothing rather than a guess.
+    """
+    level = getattr(urgency_level, "value", urgency_level)
+    score = PRIORITY_WEIGHT_URGENCY * URGENCY_WEIGHTS.get(level, 0.0)
+    if triage_score is not None:
+        score += PRIORITY_WEIGHT_TRIAGE * _clamp(triage_score / TRIAGE_SCORE_MAX)
+    if ml_priority_score is not None:
+        score += PRIORITY_WEIGHT_ML * _clamp(ml_priority_score)
+    return score
+
+
+def aging_progress(waited_seconds: float) -> Tuple[float, int]:
+    """(credit in seconds, buckets crossed) for a case that has waited this long."""
+    credit, applied = 0.0, 0
+    for wait, bucket_credit in aging_buckets:
+        if waited_seconds < wait:
+            break
+        credit += bucket_credit
+        applied += 1
+    return credit, applied
+
+
+def queue_score(sla_deadline: datetime, priority: float, aging_credit: float = 0.0) -> float:
+    """ZSET score, lowest is served first.
+
+    Starts from the SLA deadline, which already carries urgency and SLA slack,
+    pulled ahead by the static priority and by the aging credit earned so far.
+    """
+    return sla_deadline.timestamp() - priority * PRIORITY_HORIZON_SECONDS - aging_credit
+
+
+def aging_commands(pipe, hospital_id: str, case_id: str, enqueued_at: float, applied: int = 0):
+    """Schedule the next aging bucket of a queued case on `pipe`."""
+    if applied >= len(aging_buckets):
+        pipe.zrem(aging_key(hospital_id), case_id)
+        pipe.hdel(aging_meta_key(hospital_id), case_id)
+        return
+    pipe.zadd(aging_key(hospital_id), {case_id: enqueued_at + aging_buckets[applied][0]})
+    pipe.hset(aging_meta_key(hospital_id), case_id, f"{enqueued_at}|{applied}")
+
+
+class QueueAging:
+    """Periodic aging of queued cases, done entirely in Redis.
+
+    Every queued case has its next bucket crossing time in
+    hospital_queue_aging:{id}. A refresh reads only the due entries of that
+    ZSET, so its cost follows the number of cases crossing a bucket, not the
+    queue length, and it never reads the database.
+    """
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis_client = redis_client
+        self._refresh = redis_client.register_script(AGING_SCRIPT)
+        self._bucket_args = [value for bucket in aging_buckets for value in bucket]
+
+    def refresh(self, hospital_id: str, now: Optional[float] = None, limit: int = AGING_REFRESH_BATCH) -> int:
+        """Apply due aging credit to a hospital queue. Returns the number of cases moved up."""
+        if not aging_buckets:
+            return 0
+        now = now or time.time()
+        keys = [queue_key(hospital_id), aging_key(hospital_id), aging_meta_key(hospital_id), inflight_key(hospital_id)]
+        bumped = 0
+        while True:
+            processed, moved = self._refresh(keys=keys, args=[now, limit, *self._bucket_args])
+            bumped += moved
+            if processed < limit:
+                return bumped
+
+    def refresh_all(self) -> int:
+        return sum(self.refresh(hospital_id.decode()) for hospital_id in self.redis_client.smembers(QUEUE_REGISTRY_KEY))
@@ -0,0 +1,18 @@
+QUEUE_KEY_PREFIX = "hospital_queue:"
+QUEUE_REGISTRY_KEY = "hospital_queues"
+QUEUE_EVENTS_KEY = "hospital_queue_events"
+QUEUE_EVENTS_MAX_LEN = 10000
+QUEUE_AGING_KEY_PREFIX = "hospital_queue_aging:"
+QUEUE_AGING_META_KEY_PREFIX = "hospital_queue_aging_meta:"
+
+
+def queue_key(hospital_id: str) -> str:
+    return f"{QUEUE_KEY_PREFIX}{hospital_id}"
+
+
+def aging_key(hospital_id: str) -> str:
+    return f"{QUEUE_AGING_KEY_PREFIX}{hospital_id}"
+
+
+def aging_meta_key(hospital_id: str) -> str:
+    return f"{QUEUE_AGING_META_KEY_PREFIX}{hospital_id}"
@@ -0,0 +1,142 @@
+import os
+import socket
+from typing import List, Optional
+
+import redis
+
+from services.queue_keys import aging_key, aging_meta_key, queue_key
+from services.queue_metrics import dequeue_commands
+from services.redis_batch import RedisBatcher
+
+# Comfortably longer than DB_STATEMENT_TIMEOUT_MS, a slow assignment must not outlive its lease
+QUEUE_LEASE_SECONDS = float(os.getenv("QUEUE_LEASE_SECONDS", "120"))
+INFLIGHT_KEY_PREFIX = "hospital_inflight:"
+INFLIGHT_META_KEY_PREFIX = "hospital_inflight_meta:"
+RECLAIM_LIMIT = 100
+
+# KEYS: queue, inflight, meta. ARGV: lease seconds, worker id, count, reclaim limit.
+# Expired leases go back to the queue with their original score, then up to
+# `count` cases are popped from the head and leased to the worker.
+RESERVE_SCRIPT = """
+local queue, inflight, meta = KEYS[1], KEYS[2], KEYS[3]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local expired = redis.call('ZRANGEBYSCORE', inflight, '-inf', now, 'LIMIT', 0, tonumber(ARGV[4]))
+for _, case_id in ipairs(expired) do
+    local entry = redis.call('HGET', meta, case_id)
+    if entry then
+        redis.call('ZADD', queue, 'NX', string.match(entry, '^([^|]+)'), case_id)
+    end
+    redis.call('ZREM', inflight, case_id)
+    redis.call('HDEL', meta, case_id)
+end
+local popped = redis.call('ZPOPMIN', queue, tonumber(ARGV[3]))
+local deadline = now + tonumber(ARGV[1])
+local reserved = {}
+for i = 1, #popped, 2 do
+    redis.call('ZADD', inflight, deadline, popped[i])
+    redis.call('HSET', meta, popped[i], popped[i + 1] .. '|' .. ARGV[2])
+    reserved[#reserved + 1] = popped[i]
+end
+return reserved
+"""
+
+# KEYS: queue, inflight, meta. ARGV: case ids. Puts leased cases back at their original score.
+RELEASE_SCRIPT = """
+local queue, inflight, meta = KEYS[1], KEYS[2], KEYS[3]
+local released = 0
+for _, case_id in ipairs(ARGV) do
+    local entry = redis.call('HGET', meta, case_id)
+    if entry then
+        redis.call('ZADD', queue, 'NX', string.match(entry, '^([^|]+)'), case_id)
+        released = released + 1
+    end
+    redis.call('ZREM', inflight, case_id)
+    redis.call('HDEL', meta, case_id)
+end
+return released
+"""
+
+
+def inflight_key(hospital_id: str) -> str:
+    return f"{INFLIGHT_KEY_PREFIX}{hospital_id}"
+
+
+def inflight_meta_key(hospital_id: str) -> str:
+    return f"{INFLIGHT_META_KEY_PREFIX}{hospital_id}"
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class QueueLeases:
+    """Atomic dequeue-and-reserve of hospital queue entries.
+
+    reserve() moves cases from the head of hospital_queue:{id} into the
+    hospital's in-flight set with a lease deadline in one EVALSHA round trip.
+    The worker then acks the cases it finished or releases the ones it could
+    not place. A worker that dies leaves leases that expire and are reclaimed
+    into the queue by the next reserve() on that hospital, so a crash between
+    the DB commit and the ack cannot lose or strand a case.
+
+    With a RedisBatcher, acks are deferred and go out in the same round trip
+    as the next reserve() or release(). An ack lost to a crash only means the
+    lease expires and the case, no longer pending, is acked again.
+    """
+
+    def __init__(self, redis_client: redis.Redis, worker_id: Optional[str] = None,
+                 lease_seconds: float = QUEUE_LEASE_SECONDS, batcher: Optional[RedisBatcher] = None):
+        self.redis_client = redis_client
+        self.batcher = batcher
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self._reserve = redis_client.register_script(RESERVE_SCRIPT)
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+
+    def _keys(self, hospital_id: str) -> List[str]:
+        return [queue_key(hospital_id), inflight_key(hospital_id), inflight_meta_key(hospital_id)]
+
+    def _run(self, script, keys: List[str], args: List):
+        if self.batcher is None:
+            return script(keys=keys, args=args)
+        # EVALSHA straight on the batch pipeline: a Script object would add a SCRIPT EXISTS round trip
+        result = self.batcher.flush(lambda pipe: pipe.evalsha(script.sha, len(keys), *keys, *args))[0]
+        if isinstance(result, redis.exceptions.NoScriptError):
+            return script(keys=keys, args=args)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def reserve(self, hospital_id: str, count: int = 1) -> List[str]:
+        reserved = self._run(
+            self._reserve,
+            keys=self._keys(hospital_id),
+            args=[self.lease_seconds, self.worker_id, count, RECLAIM_LIMIT],
+        )
+        return [case_id.decode() for case_id in reserved]
+
+    def _ack_commands(self, pipe, hospital_id: str, case_ids: List[str]):
+        pipe.zrem(inflight_key(hospital_id), *case_ids)
+        pipe.hdel(inflight_meta_key(hospital_id), *case_ids)
+        pipe.zrem(aging_key(hospital_id), *case_ids)
+        pipe.hdel(aging_meta_key(hospital_id), *case_ids)
+        dequeue_commands(pipe, hospital_id, case_ids)
+
+    def ack(self, hospital_id: str, case_ids: List[str]):
+        if not case_ids:
+            return
+        if self.batcher is not None:
+            self.batcher.defer(lambda pipe: self._ack_commands(pipe, hospital_id, case_ids))
+            return
+        pipe = self.redis_client.pipeline()
+        self._ack_commands(pipe, hospital_id, case_ids)
+        pipe.execute()
+
+    def release(self, hospital_id: str, case_ids: List[str]) -> int:
+        if not case_ids:
+            return 0
+        return self._run(self._release, keys=self._keys(hospital_id), args=list(case_ids))
+
+    def inflight(self, hospital_id: str) -> List[str]:
+        return [case_id.decode() for case_id in self.redis_client.zrange(inflight_key(hospital_id), 0, -1)]
@@ -1,34 +1,47 @@
 import redis
 import os
-from datetime import timedelta
-from redis.connection import ConnectionPool
 from redis.lock import Lock
-from sqlalchemy.orm import Session
-from typing import Optional, Dict, List
+from sqlalchemy import update
+from sqlalchemy.orm import Session, joinedload
+from typing import Optional, Dict, List, Set, Tuple
 from database import Hospital, Patient, Case, CaseOutcome, Doctor
 from models.models import HospitalPolicy, PatientProfile, HospitalPolicyUpdate, DoctorProfile
+from ml.features import case_features, patient_features
+from ml.inference import get_inference_batcher, predict_durations
 from ml.model_manager import ModelManager
+from ml.outcome_stream import publish_case_outcome
+from services.assignment import ASSIGNMENT_STRATEGY, assign_optimal
+from services.doctor_scoring import DoctorScoringEngine, VECTORIZE_MIN_DOCTORS, score_doctor
+from services.doctor_index import DoctorIndex, publish_doctor_upsert, publish_doctor_delete
+from services.queue_leases import QueueLeases
+from services.queue_metrics import assignment_commands, capacity_commands, outcome_commands, record_commands
+from services.queue_priorities import QueueReprioritizer, changed_urgency_levels
+from services.redis_batch import RedisBatcher
+from services.redis_client import get_redis_client
+from services.hospital_cache import hospital_cache, publish_hospital_invalidation
+from services.queue_outbox import build_intake, publish_outbox
+from services.queue_keys import QUEUE_KEY_PREFIX, QUEUE_REGISTRY_KEY, QUEUE_EVENTS_KEY, QUEUE_EVENTS_MAX_LEN, queue_key
 import logging
 from crud.hospitals import *
 from crud.cases import *
 from crud.doctors import *
 from crud.patients import *
 from crud.case_outcomes import *
+import time
 import uuid
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
-REDIS_PORT = os.getenv("REDIS_PORT", "6379")
-REDIS_DB = int(os.getenv("REDIS_DB", "0"))
-
 class QueueManager:
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: Session, doctor_index: Optional[DoctorIndex] = None,
+                 batcher: Optional[RedisBatcher] = None):
         self.db = db_session
-        self.redis_pool = ConnectionPool(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-        self.redis_client = redis.Redis(connection_pool=self.redis_pool)
+        self.doctor_index = doctor_index
+        self.redis_client = get_redis_client()
         self.model_manager = ModelManager()
+        self.batcher = batcher or RedisBatcher(self.redis_client)
+        self.leases = QueueLeases(self.redis_client, batcher=self.batcher)
 
     def add_hospital(self, policy: HospitalPolicy):
         hospital = Hospital(**policy.model_dump())
@@ -36,101 +49,218 @@ class QueueManager:
         
 
     def get_hospital(self, hospital_id: str):
-        return get_hospital(self.db, hospital_id)
+        return hospital_cache.get_policy(self.db, hospital_id)
 
     def add_case(self, patient: PatientProfile, hospital_id: str):
-        db_patient = Patient(
-            patient_id=patient.patient_id,
-            age=patient.age,
-            gender=patient.gender,
-            medical_history=patient.medical_history,
-            symptoms=patient.symptoms,
-            urgency_level=patient.urgency_level,
-            preferred_doctor=patient.preferred_doctor,
-            arrival_time=patient.arrival_time
-        )
-        create_patient(self.db, db_patient)
-
-        sla_minutes = self.db.query(Hospital).filter(Hospital.hospital_id == hospital_id).first().sla_rules.get(patient.urgency_level.value, 120)
-        sla_deadline =datetime.now() + timedelta(minutes=sla_minutes)
-        db_case = Case(
-            case_id=f"case_{datetime.now().timestamp()}_{uuid.uuid4()}",
-            hospital_id=hospital_id,
-            patient_id=patient.patient_id,
-            status="pending",
-            priority_score=0.0,
-            created_at=datetime.now(),
-            sla_deadline=sla_deadline
-        )
-        case = create_case(self.db, db_case)
+        """Insert patient, case and queue outbox entry in one transaction, then enqueue."""
+        sla_rules = hospital_cache.get_sla_rules(self.db, hospital_id)
+        if sla_rules is None:
+            return None
+
+        prediction, = predict_durations([patient_features(patient)])
+        db_patient, db_case, entry = build_intake(patient, hospital_id, sla_rules, prediction)
+        self.db.add_all([db_patient, db_case, entry])
+        self.db.commit()
+        publish_outbox(self.redis_client, [entry], {db_case.case_id: patient.urgency_level.value})
+        return db_case
 
+    def _queue_notification(self, pipe, hospital_id: str):
+        """Register the hospital queue and wake up consumers blocked on the events list."""
+        pipe.sadd(QUEUE_REGISTRY_KEY, hospital_id)
+        pipe.lpush(QUEUE_EVENTS_KEY, hospital_id)
+        pipe.ltrim(QUEUE_EVENTS_KEY, 0, QUEUE_EVENTS_MAX_LEN - 1)
+
+    def notify_queue(self, hospital_id: str):
         try:
-            score = sla_deadline.timestamp()
-            self.redis_client.zadd(f"hospital_queue:{hospital_id}", {db_case.case_id: score})
-            return case
+            pipe = self.redis_client.pipeline()
+            self._queue_notification(pipe, hospital_id)
+            pipe.execute()
         except redis.RedisError as e:
             logger.error(f"Redis error: {str(e)}")
-            return None
 
     def update_doctor_availability(self, hospital_id: str, doctor_id: str, available: bool):
-        doctor = self.db.query(Doctor).filter(Doctor.id == doctor_id, Doctor.hospital_id == hospital_id).first()
+        doctor = self.db.query(Doctor).filter(Doctor.doctor_id == doctor_id, Doctor.hospital_id == hospital_id).first()
         if doctor:
             doctor.availability = available
             self.db.commit()
+            publish_doctor_upsert(self.redis_client, doctor)
+            if available:
+                self.notify_queue(hospital_id)
 
     def assign_next_case(self, hospital_id: str) -> Optional[Case]:
         try:
-            case_id = self.redis_client.zrange(f"hospital_queue:{hospital_id}", 0, 0)[0]
+            return self._assign_next_case(hospital_id)
+        finally:
+            self.batcher.flush()
+
+    def _assign_next_case(self, hospital_id: str) -> Optional[Case]:
+        started = time.perf_counter()
+        try:
+            reserved = self.leases.reserve(hospital_id, 1)
         except redis.RedisError as e:
             logger.error(f"Redis error: {str(e)}")
             return None
 
-        if not case_id:
+        if not reserved:
             return None
 
-        case_id = case_id.decode('utf-8')
-        case = self.db.query(Case).filter(Case.id == case_id).first()
-        doctor = self.find_best_doctor(case)
-        if doctor:
-            case.assigned_doctor_id = doctor.id
-            case.status = "assigned"
-            case.last_updated = datetime.now()
-            doctor.current_workload += 1
-            self.db.commit()
-            try:
-                self.redis_client.zrem(f"hospital_queue:{hospital_id}", case_id)
-            except redis.RedisError as e:
-                logger.error(f"Redis error: {str(e)}")
-            return case
+        case_id = reserved[0]
+        try:
+            cases, missing = self.lock_cases([case_id])
+            case = cases.get(case_id)
+            if not case and not missing:
+                # Held by a worker whose lease expired, acked on a later reserve once it commits
+                self.db.rollback()
+                return None
+            if not case or case.status != "pending":
+                self.db.rollback()
+                self.leases.ack(hospital_id, [case_id])
+                return None
+            doctor = self.find_best_doctor(case)
+            if doctor and self.assign_case_to_doctor(case, doctor):
+                record = self.assignment_record(case, doctor)
+                self.db.commit()
+                self.leases.ack(hospital_id, [case_id])
+                self.publish_doctor_changes([doctor])
+                self.record_assignments([record], started)
+                return case
+        except Exception:
+            self.discard_pending_assignments(hospital_id)
+            self.leases.release(hospital_id, [case_id])
+            raise
+        self.db.rollback()
+        self.leases.release(hospital_id, [case_id])
         return None
 
-    def find_best_doctor(self, case: Case) -> Optional[Doctor]:
-        available_doctors = self.db.query(Doctor).filter(
-            Doctor.hospital_id == case.hospital_id,
+    def lock_cases(self, case_ids: List[str], *options) -> Tuple[Dict[str, Case], List[str]]:
+        """Lock the cases' rows for the current transaction, skipping rows another worker holds.
+
+        Returns the locked cases by id, with their status as committed, and
+        the ids that do not exist. An id in neither is still being assigned
+        by a worker whose lease expired; it stays leased here and is acked
+        on a later reserve, once that worker has committed.
+        """
+        cases = self.db.query(Case).options(*options).filter(Case.case_id.in_(case_ids)) \
+            .with_for_update(of=Case, skip_locked=True).populate_existing().all()
+        cases_by_id = {case.case_id: case for case in cases}
+        absent = [case_id for case_id in case_ids if case_id not in cases_by_id]
+        if absent:
+            existing = {case_id for case_id, in self.db.query(Case.case_id).filter(Case.case_id.in_(absent))}
+            absent = [case_id for case_id in absent if case_id not in existing]
+        return cases_by_id, absent
+
+    def get_available_doctors(self, hospital_id: str) -> List[Doctor]:
+        if self.doctor_index:
+            self.doctor_index.ensure_loaded(self.db, hospital_id)
+            return self.doctor_index.candidates(hospital_id)
+
+        return self.db.query(Doctor).filter(
+            Doctor.hospital_id == hospital_id,
             Doctor.availability == True,
             Doctor.current_workload < Doctor.max_daily_cases
         ).all()
 
-        if not available_doctors:
+    def select_best_doctor(self, doctors: List[Doctor], case: Case) -> Optional[Doctor]:
+        if not doctors:
             return None
 
-        best_doctor = max(available_doctors, key=lambda doc: self.calculate_doctor_score(doc, case))
-        return best_doctor
-    
+        if len(doctors) >= VECTORIZE_MIN_DOCTORS:
+            return DoctorScoringEngine(doctors).best(case.patient.symptoms)
+        return max(doctors, key=lambda doc: self.calculate_doctor_score(doc, case))
+
+    def select_doctors_for_batch(self, cases: List[Case], doctors: List[Doctor]) -> List[Optional[Doctor]]:
+        """Match a batch of cases against one doctor snapshot, scored in one vectorized pass.
+
+        ASSIGNMENT_STRATEGY=greedy gives each case, in queue order, its best remaining
+        doctor. ASSIGNMENT_STRATEGY=optimal solves the batch as a weighted assignment
+        problem so top doctors are not all spent on the head of the queue.
+        """
+        if not cases or not doctors:
+            return [None] * len(cases)
+        engine = DoctorScoringEngine(doctors)
+        symptoms = [case.patient.symptoms for case in cases]
+        if ASSIGNMENT_STRATEGY == "optimal":
+            choices = assign_optimal(engine, symptoms, [case.sla_deadline for case in cases])
+        else:
+            choices = engine.assign_greedy(symptoms)
+        return [doctors[choice] if choice is not None else None for choice in choices]
+
+    def find_best_doctor(self, case: Case) -> Optional[Doctor]:
+        return self.select_best_doctor(self.get_available_doctors(case.hospital_id), case)
+
+    def assign_case_to_doctor(self, case: Case, doctor) -> bool:
+        """Stage the assignment in the current transaction. `doctor` is a Doctor or an index record.
+
+        Returns False, staging nothing, when the doctor is no longer free in
+        the DB, e.g. filled by another consumer while this index was stale.
+        """
+        claimed = self.db.execute(
+            update(Doctor)
+            .where(
+                Doctor.doctor_id == doctor.doctor_id,
+                Doctor.availability == True,
+                Doctor.current_workload < Doctor.max_daily_cases,
+            )
+            .values(availability=False, current_workload=Doctor.current_workload + 1)
+        ).rowcount
+        if not claimed:
+            logger.info(f"Doctor {doctor.doctor_id} is no longer available")
+            if self.doctor_index:
+                # Reloaded from the next upsert event or refresh
+                self.doctor_index.remove(doctor.doctor_id)
+            return False
+        case.status = "assigned"
+        case.assigned_doctor_id = doctor.doctor_id
+        case.last_updated = datetime.now()
+        if self.doctor_index:
+            self.doctor_index.record_assignment(case.hospital_id, doctor.doctor_id)
+        return True
+
+    def discard_pending_assignments(self, hospital_id: str):
+        """Roll back staged assignments and drop index state they touched."""
+        self.db.rollback()
+        if self.doctor_index:
+            self.doctor_index.invalidate(hospital_id)
+
+    def publish_doctor_changes(self, doctors: List):
+        if not self.doctor_index:
+            return
+        for doctor in doctors:
+            record = self.doctor_index.get(doctor.hospital_id, doctor.doctor_id)
+            if record:
+                self.batcher.defer(lambda pipe, record=record: publish_doctor_upsert(pipe, record))
+
+    def assignment_record(self, case: Case, doctor) -> Tuple:
+        """What the queue metrics need of an assignment, read before commit expires the case."""
+        return case.hospital_id, doctor.doctor_id, case.created_at, case.sla_deadline
+
+    def record_assignments(self, records: List[Tuple], started: float):
+        """Count committed assignments in the queue metrics, with the wait and latency since `started`."""
+        if not records:
+            return
+        latency = time.perf_counter() - started
+        now = datetime.now()
+
+        def commands(pipe):
+            for hospital_id, doctor_id, created_at, sla_deadline in records:
+                assignment_commands(pipe, hospital_id, doctor_id, created_at, sla_deadline, latency, now)
+
+        if self.batcher is not None:
+            self.batcher.defer(commands)
+        else:
+            record_commands(self.redis_client, commands)
 
     def calculate_doctor_score(self, doctor: Doctor, case: Case) -> float:
-        score = (0.5 * (doctor.experience_years / 20) + 0.3 * doctor.patient_rating)
-        if doctor.success_rate:
-            score += 0.2 * doctor.success_rate
-        if any(tag in case.patient.symptoms for tag in doctor.specialization_tags):
-            score *= 1.2
-        #TODO Extract feature and call model to get ml score
-        workload_ratio = doctor.current_workload / doctor.max_daily_cases
-        score *= (1 - workload_ratio)
-        return score
+        # No ML term: the duration model is trained on case features only and knows nothing of doctors
+        return score_doctor(doctor, case.patient.symptoms)
 
     def record_case_outcome(self, outcome: CaseOutcome):
+        case_id, met_sla = outcome.case_id, outcome.met_sla
         create_case_outcome(self.db, outcome)
+        publish_case_outcome(self.redis_client, case_id)
+        case = self.db.get(Case, case_id)
+        if case:
+            record_commands(self.redis_client, lambda pipe: outcome_commands(pipe, case.hospital_id, met_sla))
 
     def update_hospital(self, hospital_id: str, policy: HospitalPolicyUpdate):
         hospital_data = {
@@ -140,48 +270,72 @@ class QueueManager:
             "max_cases_per_general": policy.max_cases_per_general,
             "working_hours": policy.working_hours
         }
+        current = get_hospital(self.db, hospital_id)
+        old_sla_rules = dict(current.sla_rules or {}) if current else None
         hospital = update_hospital(self.db, hospital_id, hospital_data)
-        if policy.sla_rules is not None:
-            self.update_queue_priorities(hospital_id)
+        publish_hospital_invalidation(self.redis_client, hospital_id)
+        if hospital and policy.sla_rules is not None:
+            self.update_queue_priorities(hospital_id, changed_urgency_levels(old_sla_rules, hospital.sla_rules))
     
     def delete_hospital(self, hospital_id):
-        return delete_hospital(self.db, hospital_id)
+        deleted = delete_hospital(self.db, hospital_id)
+        publish_hospital_invalidation(self.redis_client, hospital_id)
+        if deleted:
+            try:
+                self.redis_client.srem(QUEUE_REGISTRY_KEY, hospital_id)
+            except redis.RedisError as e:
+                logger.error(f"Redis error: {str(e)}")
+        return deleted
 
     def register_doctor(self, doctor: DoctorProfile) -> Doctor:
 
         doctor_data = Doctor(**doctor.model_dump())
-        return create_doctor(self.db, doctor_data)
+        db_doctor = create_doctor(self.db, doctor_data)
+        publish_doctor_upsert(self.redis_client, db_doctor)
+        self.record_doctor_capacity(db_doctor.hospital_id, db_doctor.doctor_id, db_doctor.max_daily_cases)
+        if db_doctor.availability:
+            self.notify_queue(db_doctor.hospital_id)
+        return db_doctor
+
+    def update_doctor(self, doctor_id: str, doctor_data: dict) -> Optional[Doctor]:
+        doctor = update_doctor(self.db, doctor_id, doctor_data)
+        if doctor:
+            publish_doctor_upsert(self.redis_client, doctor)
+            self.record_doctor_capacity(doctor.hospital_id, doctor.doctor_id, doctor.max_daily_cases)
+            if doctor.availability:
+                self.notify_queue(doctor.hospital_id)
+        return doctor
+
+    def delete_doctor(self, doctor_id: str) -> bool:
+        doctor = get_doctor(self.db, doctor_id)
+        hospital_id = doctor.hospital_id if doctor else None
+        deleted = delete_doctor(self.db, doctor_id)
+        if deleted:
+            publish_doctor_delete(self.redis_client, doctor_id)
+            self.record_doctor_capacity(hospital_id, doctor_id, 0)
+        return deleted
+
+    def record_doctor_capacity(self, hospital_id: str, doctor_id: str, max_daily_cases: Optional[int]):
+        record_commands(self.redis_client, lambda pipe: capacity_commands(pipe, hospital_id, doctor_id, max_daily_cases))
 
 
-    def update_queue_priorities(self, hospital_id: str):    
+    def update_queue_priorities(self, hospital_id: str, urgency_levels: Optional[Set[str]] = None):
+        """Rescore the hospital queue, only the given urgency levels if known. See QueueReprioritizer."""
         lock_key = f"queue_update_lock:{hospital_id}"
         lock = Lock(self.redis_client, lock_key, timeout=10)
         
         try:
             if lock.acquire(blocking_timeout=1):
                 try:
-                    with self.db.begin():
-                        cases = self.db.query(Case).filter(
-                            Case.hospital_id == hospital_id,
-                            Case.status == "pending"
-                        ).all()
-                        
-                        hospital = self.db.query(Hospital).filter(
-                            Hospital.hospital_id == hospital_id
-                        ).first()
-                        if not hospital:
-                            raise ValueError(f"Hospital {hospital_id} not found")
-                        
-                        queue_key = f"hospital_queue:{hospital_id}"
-                        self.redis_client.delete(queue_key)
+                    sla_rules = hospital_cache.get_sla_rules(self.db, hospital_id)
+                    if sla_rules is None:
+                        raise ValueError(f"Hospital {hospital_id} not found")
+
+                    rescored = QueueReprioritizer(self.redis_client).run(self.db, hospital_id, sla_rules, urgency_levels)
+                    self.db.commit()
+                    self.notify_queue(hospital_id)
                     
-                        for case in cases:
-                            sla_minutes = hospital.sla_rules.get(case.patient.urgency_level, 120)
-                            sla_deadline = case.created_at + timedelta(minutes=sla_minutes)
-                            score = sla_deadline.timestamp()
-                            self.redis_client.zadd(queue_key, {case.case_id: score})
-                        
-                        logger.info(f"Re-prioritized queue for hospital {hospital_id}")
+                    logger.info(f"Re-prioritized {rescored} cases for hospital {hospital_id}")
                 finally:
                     lock.release()
             else:
@@ -197,11 +351,18 @@ class QueueManager:
         try:
             if not self.model_manager.validate_model():
                 raise Exception('Model is not loaded or trained')
-            return self.model_manager.get_model().predict(features)
+            return get_inference_batcher().predict(features)
         except Exception as e:
             logger.error(f'Prediction error: {str(e)}')
             raise
 
     def extract_feature(self, case_id):
-        #TODO Extract feature of patient and Doctor
-        pass
\ No newline at end of file
+        case = self.db.query(Case).options(joinedload(Case.patient)).filter(Case.case_id == case_id).first()
+        return case_features(case) if case else None
+
+    def predict_cases(self, cases: List[Case]):
+        """Fill predicted_duration and ml_priority_score of cases that have none, in one micro-batch."""
+        cases = [case for case in cases if case.predicted_duration is None]
+        for case, (duration, ml_priority_score) in zip(cases, predict_durations([case_features(case) for case in cases])):
+            case.predicted_duration = duration
+            case.ml_priority_score = ml_priority_score
@@ -0,0 +1,298 @@
+import logging
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import redis
+import redis.asyncio
+
+from services.queue_keys import queue_key
+
+logger = logging.getLogger(__name__)
+
+QUEUE_METRICS_KEY_PREFIX = "queue_metrics:"
+# Upper bounds in seconds, the last bucket is +Inf
+WAIT_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 14400, 28800, 86400)
+ASSIGNMENT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+HISTOGRAMS = {"wait_seconds": WAIT_BUCKETS, "assignment_latency_seconds": ASSIGNMENT_LATENCY_BUCKETS}
+QUANTILES = (0.5, 0.9, 0.99)
+URGENCY_LEVELS = ("emergency", "urgent", "routine")
+COUNTERS = ("intake_total", "assigned_total", "assigned_after_sla", "outcomes_total", "sla_met", "sla_breached")
+
+# KEYS: queued cases, counters. ARGV: case id, urgency.
+# Idempotent, so an outbox entry relayed twice is counted once.
+ENQUEUE_SCRIPT = """
+if redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2]) == 1 then
+    redis.call('HINCRBY', KEYS[2], 'depth:' .. ARGV[2], 1)
+    redis.call('HINCRBY', KEYS[2], 'intake_total', 1)
+end
+"""
+
+# KEYS: queued cases, counters. ARGV: case ids that left the queue for good.
+DEQUEUE_SCRIPT = """
+for _, case_id in ipairs(ARGV) do
+    local urgency = redis.call('HGET', KEYS[1], case_id)
+    if urgency then
+        redis.call('HDEL', KEYS[1], case_id)
+        redis.call('HINCRBY', KEYS[2], 'depth:' .. urgency, -1)
+    end
+end
+"""
+
+# KEYS: doctor capacities, counters. ARGV: doctor id, max daily cases (0 removes the doctor).
+CAPACITY_SCRIPT = """
+local old = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local new = tonumber(ARGV[2])
+if new > 0 then
+    redis.call('HSET', KEYS[1], ARGV[1], new)
+else
+    redis.call('HDEL', KEYS[1], ARGV[1])
+end
+redis.call('HINCRBY', KEYS[2], 'doctor_capacity', new - old)
+"""
+
+# KEYS: doctor capacities, counters. ARGV: doctor id, capacity pairs.
+# Adds doctors registered before these metrics existed, once.
+SEED_CAPACITY_SCRIPT = """
+if redis.call('HSETNX', KEYS[2], 'capacity_seeded', 1) == 0 then
+    return 0
+end
+for i = 1, #ARGV, 2 do
+    if redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1]) == 1 then
+        redis.call('HINCRBY', KEYS[2], 'doctor_capacity', ARGV[i + 1])
+    end
+end
+return 1
+"""
+
+
+def metrics_key(hospital_id: str) -> str:
+    return f"{QUEUE_METRICS_KEY_PREFIX}{hospital_id}"
+
+
+def queued_key(hospital_id: str) -> str:
+    return f"{QUEUE_METRICS_KEY_PREFIX}{hospital_id}:queued"
+
+
+def histogram_key(hospital_id: str, name: str) -> str:
+    return f"{QUEUE_METRICS_KEY_PREFIX}{hospital_id}:{name}"
+
+
+def capacity_key(hospital_id: str) -> str:
+    return f"{QUEUE_METRICS_KEY_PREFIX}{hospital_id}:capacity"
+
+
+def active_doctors_key(hospital_id: str) -> str:
+    return f"{QUEUE_METRICS_KEY_PREFIX}{hospital_id}:active_doctors"
+
+
+def _bucket(value: float, bounds: Sequence[float]) -> str:
+    index = bisect_left(bounds, value)
+    return str(bounds[index]) if index < len(bounds) else "+Inf"
+
+
+def observe_commands(pipe, hospital_id: str, name: str, value: float):
+    key = histogram_key(hospital_id, name)
+    pipe.hincrby(key, _bucket(value, HISTOGRAMS[name]), 1)
+    pipe.hincrbyfloat(key, "sum", value)
+    pipe.hincrby(key, "count", 1)
+
+
+def intake_commands(pipe, hospital_id: str, case_id: str, urgency_level: str):
+    # EVAL rather than EVALSHA, these ride along in pipelines that cannot retry a NOSCRIPT
+    pipe.eval(ENQUEUE_SCRIPT, 2, queued_key(hospital_id), metrics_key(hospital_id), case_id, urgency_level)
+
+
+def dequeue_commands(pipe, hospital_id: str, case_ids: List[str]):
+    pipe.eval(DEQUEUE_SCRIPT, 2, queued_key(hospital_id), metrics_key(hospital_id), *case_ids)
+
+
+def assignment_commands(pipe, hospital_id: str, doctor_id: str, created_at: Optional[datetime],
+                        sla_deadline: Optional[datetime], latency: float, now: Optional[datetime] = None):
+    now = now or datetime.now()
+    key = metrics_key(hospital_id)
+    pipe.hincrby(key, "assigned_total", 1)
+    pipe.hincrby(key, "doctor_assignments", 1)
+    if sla_deadline and now > sla_deadline:
+        pipe.hincrby(key, "assigned_after_sla", 1)
+    pipe.pfadd(active_doctors_key(hospital_id), doctor_id)
+    if created_at:
+        observe_commands(pipe, hospital_id, "wait_seconds", max((now - created_at).total_seconds(), 0.0))
+    observe_commands(pipe, hospital_id, "assignment_latency_seconds", latency)
+
+
+def outcome_commands(pipe, hospital_id: str, met_sla: Optional[bool]):
+    key = metrics_key(hospital_id)
+    pipe.hincrby(key, "outcomes_total", 1)
+    if met_sla is not None:
+        pipe.hincrby(key, "sla_met" if met_sla else "sla_breached", 1)
+
+
+def capacity_commands(pipe, hospital_id: str, doctor_id: str, max_daily_cases: Optional[int]):
+    pipe.eval(CAPACITY_SCRIPT, 2, capacity_key(hospital_id), metrics_key(hospital_id), doctor_id, max_daily_cases or 0)
+
+
+def seed_capacity_commands(pipe, hospital_id: str, capacities: Iterable[Tuple[str, int]]):
+    args = [value for doctor_id, capacity in capacities for value in (doctor_id, capacity or 0)]
+    pipe.eval(SEED_CAPACITY_SCRIPT, 2, capacity_key(hospital_id), metrics_key(hospital_id), *args)
+
+
+def daily_reset_commands(pipe, hospital_id: str):
+    """Start a new day of doctor utilization, alongside the workload reset."""
+    pipe.hset(metrics_key(hospital_id), "doctor_assignments", 0)
+    pipe.delete(active_doctors_key(hospital_id))
+
+
+def record_commands(redis_client: redis.Redis, build):
+    """Run the commands `build(pipe)` issues in one round trip, logging rather than raising."""
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        build(pipe)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.error(f"Redis error recording queue metrics: {str(e)}")
+
+
+async def record_commands_async(redis_client: redis.asyncio.Redis, build):
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        build(pipe)
+        await pipe.execute()
+    except redis.RedisError as e:
+        logger.error(f"Redis error recording queue metrics: {str(e)}")
+
+
+def _read_commands(pipe, hospital_id: str):
+    # queue_leases records dequeues through this module
+    from services.queue_leases import inflight_key
+    pipe.hgetall(metrics_key(hospital_id))
+    for name in HISTOGRAMS:
+        pipe.hgetall(histogram_key(hospital_id, name))
+    pipe.pfcount(active_doctors_key(hospital_id))
+    pipe.zcard(queue_key(hospital_id))
+    pipe.zcard(inflight_key(hospital_id))
+
+
+def _decode(raw: Dict) -> Dict[str, float]:
+    return {key.decode(): float(value) for key, value in raw.items()}
+
+
+def _histogram(raw: Dict, bounds: Sequence[float]) -> Dict:
+    values = _decode(raw)
+    count = int(values.get("count", 0))
+    buckets = []
+    cumulative = 0
+    for bound in [*bounds, "+Inf"]:
+        cumulative += int(values.get(str(bound), 0))
+        buckets.append((bound, cumulative))
+    histogram = {"count": count, "sum": values.get("sum", 0.0), "buckets": buckets}
+    for q in QUANTILES:
+        histogram[f"p{int(q * 100)}"] = _quantile(q, buckets, count)
+    return histogram
+
+
+def _quantile(q: float, buckets: List[Tuple], count: int) -> Optional[float]:
+    """Linear interpolation inside the bucket holding the quantile, as Prometheus' histogram_quantile does."""
+    if not count:
+        return None
+    rank = q * count
+    lower, below = 0.0, 0
+    for bound, cumulative in buckets:
+        if cumulative >= rank:
+            if bound == "+Inf":
+                return float(lower)
+            in_bucket = cumulative - below
+            return lower + (bound - lower) * ((rank - below) / in_bucket if in_bucket else 0.0)
+        lower, below = bound, cumulative
+    return float(lower)
+
+
+def _snapshot(hospital_id: str, replies: List) -> Dict:
+    counters = _decode(replies[0])
+    histograms = {name: _histogram(raw, HISTOGRAMS[name]) for name, raw in zip(HISTOGRAMS, replies[1:])}
+    active_doctors, queued, inflight = replies[1 + len(HISTOGRAMS):]
+    capacity = int(counters.get("doctor_capacity", 0))
+    assignments = int(counters.get("doctor_assignments", 0))
+    return {
+        "hospital_id": hospital_id,
+        "queue": {
+            "queued": queued,
+            "inflight": inflight,
+            # Cases enqueued before these metrics existed are only in `queued`
+            "by_urgency": {level: max(int(counters.get(f"depth:{level}", 0)), 0) for level in URGENCY_LEVELS},
+        },
+        **{name: int(counters.get(name, 0)) for name in COUNTERS},
+        "wait_seconds": histograms["wait_seconds"],
+        "assignment_latency_seconds": histograms["assignment_latency_seconds"],
+        "doctors": {
+            "assignments_today": assignments,
+            "capacity": capacity,
+            "utilization": assignments / capacity if capacity else None,
+            "active_today": active_doctors,
+        },
+        "capacity_seeded": "capacity_seeded" in counters,
+    }
+
+
+def hospital_metrics(redis_client: redis.Redis, hospital_id: str) -> Dict:
+    """Live metrics of one hospital, a fixed number of Redis reads whatever the history."""
+    pipe = redis_client.pipeline(transaction=False)
+    _read_commands(pipe, hospital_id)
+    return _snapshot(hospital_id, pipe.execute())
+
+
+async def hospital_metrics_async(redis_client: redis.asyncio.Redis, hospital_id: str) -> Dict:
+    pipe = redis_client.pipeline(transaction=False)
+    _read_commands(pipe, hospital_id)
+    return _snapshot(hospital_id, await pipe.execute())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(snapshots: Iterable[Dict]) -> str:
+    """Prometheus text exposition of hospital_metrics() snapshots."""
+    snapshots = list(snapshots)
+    lines = []
+
+    def family(name: str, kind: str, help_text: str, samples):
+        lines.append(f"# HELP medical_queue_{name} {help_text}")
+        lines.append(f"# TYPE medical_queue_{name} {kind}")
+        for suffix, labels, value in samples:
+            label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+            lines.append(f"medical_queue_{name}{suffix}{{{label_text}}} {value}")
+
+    def per_hospital(get):
+        return [("", {"hospital": s["hospital_id"]}, get(s)) for s in snapshots]
+
+    family("queue_depth", "gauge", "Cases waiting in the queue.", per_hospital(lambda s: s["queue"]["queued"]))
+    family("queue_inflight", "gauge", "Cases leased by a consumer.", per_hospital(lambda s: s["queue"]["inflight"]))
+    family("queue_depth_by_urgency", "gauge", "Cases waiting in the queue per urgency level.", [
+        ("", {"hospital": s["hospital_id"], "urgency": level}, depth)
+        for s in snapshots for level, depth in s["queue"]["by_urgency"].items()
+    ])
+    family("cases_intake_total", "counter", "Cases enqueued.", per_hospital(lambda s: s["intake_total"]))
+    family("cases_assigned_total", "counter", "Cases assigned to a doctor.", per_hospital(lambda s: s["assigned_total"]))
+    family("cases_assigned_after_sla_total", "counter", "Cases assigned after their SLA deadline.",
+           per_hospital(lambda s: s["assigned_after_sla"]))
+    family("case_outcomes_total", "counter", "Case outcomes recorded.", per_hospital(lambda s: s["outcomes_total"]))
+    family("sla_met_total", "counter", "Outcomes that met their SLA.", per_hospital(lambda s: s["sla_met"]))
+    family("sla_breached_total", "counter", "Outcomes that breached their SLA.", per_hospital(lambda s: s["sla_breached"]))
+    for name, help_text in (("wait_seconds", "Time from intake to assignment."),
+                            ("assignment_latency_seconds", "Time from dequeue to committed assignment.")):
+        samples = []
+        for s in snapshots:
+            histogram = s[name]
+            for bound, cumulative in histogram["buckets"]:
+                samples.append(("_bucket", {"hospital": s["hospital_id"], "le": bound}, cumulative))
+            samples.append(("_sum", {"hospital": s["hospital_id"]}, histogram["sum"]))
+            samples.append(("_count", {"hospital": s["hospital_id"]}, histogram["count"]))
+        family(f"case_{name}", "histogram", help_text, samples)
+    family("doctor_assignments_today", "gauge", "Assignments since the daily workload reset.",
+           per_hospital(lambda s: s["doctors"]["assignments_today"]))
+    family("doctor_capacity", "gauge", "Sum of max daily cases over the hospital's doctors.",
+           per_hospital(lambda s: s["doctors"]["capacity"]))
+    family("doctors_active_today", "gauge", "Distinct doctors assigned a case today, estimated.",
+           per_hospital(lambda s: s["doctors"]["active_today"]))
+    return "\n".join(lines) + "\n"
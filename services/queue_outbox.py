@@ -0,0 +1,171 @@
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis
+import redis.asyncio
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from database import Case, Patient, QueueOutbox
+from models.models import PatientProfile
+from services.queue_keys import QUEUE_EVENTS_KEY, QUEUE_EVENTS_MAX_LEN, QUEUE_REGISTRY_KEY, queue_key
+from services.priority_engine import aging_commands, priority_score, queue_score
+from services.queue_leases import inflight_key
+from services.queue_metrics import intake_commands
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_RELAY_INTERVAL = int(os.getenv("OUTBOX_RELAY_INTERVAL", "5"))
+OUTBOX_RELAY_BATCH = int(os.getenv("OUTBOX_RELAY_BATCH", "500"))
+# Rows younger than this are left to the request that wrote them
+OUTBOX_RELAY_GRACE_SECONDS = float(os.getenv("OUTBOX_RELAY_GRACE_SECONDS", "5"))
+
+
+def intake_rows(patient: PatientProfile, hospital_id: str, sla_rules: dict,
+                prediction: Tuple[Optional[float], Optional[float]] = (None, None)) -> Tuple[Dict, Dict, Dict]:
+    """Column values of the patient, case and outbox rows for one case intake.
+
+    Every column is set client-side so nothing has to be read back after commit.
+    `prediction` is the (predicted_duration, ml_priority_score) of the case, if any.
+    """
+    now = datetime.now()
+    predicted_duration, ml_priority_score = prediction
+    sla_deadline = now + timedelta(minutes=sla_rules.get(patient.urgency_level.value, 120))
+    priority = priority_score(patient.urgency_level, patient.triage_score, ml_priority_score)
+    patient_row = dict(
+        patient_id=patient.patient_id,
+        age=patient.age,
+        gender=patient.gender,
+        medical_history=patient.medical_history,
+        symptoms=patient.symptoms,
+        urgency_level=patient.urgency_level,
+        preferred_doctor=patient.preferred_doctor,
+        arrival_time=patient.arrival_time,
+        triage_score=patient.triage_score,
+    )
+    case_row = dict(
+        case_id=f"case_{now.timestamp()}_{uuid.uuid4()}",
+        hospital_id=hospital_id,
+        patient_id=patient.patient_id,
+        status="pending",
+        priority_score=priority,
+        ml_priority_score=ml_priority_score,
+        predicted_duration=predicted_duration,
+        created_at=now,
+        last_updated=now,
+        sla_deadline=sla_deadline,
+        assignment_history=[],
+    )
+    outbox_row = dict(
+        id=str(uuid.uuid4()),
+        case_id=case_row["case_id"],
+        hospital_id=hospital_id,
+        score=queue_score(sla_deadline, priority),
+        created_at=now,
+    )
+    return patient_row, case_row, outbox_row
+
+
+def build_intake(patient: PatientProfile, hospital_id: str, sla_rules: dict,
+                 prediction: Tuple[Optional[float], Optional[float]] = (None, None)) -> Tuple[Patient, Case, QueueOutbox]:
+    """ORM objects for one case intake, see intake_rows()."""
+    patient_row, case_row, outbox_row = intake_rows(patient, hospital_id, sla_rules, prediction)
+    return Patient(**patient_row), Case(**case_row), QueueOutbox(**outbox_row)
+
+
+def _enqueue_commands(pipe, entries: Iterable[QueueOutbox], urgency_levels: Optional[Dict[str, str]] = None):
+    """`urgency_levels` maps case ids to their urgency for the queue depth metrics."""
+    hospital_ids = set()
+    for entry in entries:
+        pipe.zadd(queue_key(entry.hospital_id), {entry.case_id: entry.score})
+        aging_commands(pipe, entry.hospital_id, entry.case_id, entry.created_at.timestamp())
+        if urgency_levels and entry.case_id in urgency_levels:
+            intake_commands(pipe, entry.hospital_id, entry.case_id, urgency_levels[entry.case_id])
+        hospital_ids.add(entry.hospital_id)
+    for hospital_id in hospital_ids:
+        pipe.sadd(QUEUE_REGISTRY_KEY, hospital_id)
+        pipe.lpush(QUEUE_EVENTS_KEY, hospital_id)
+    if hospital_ids:
+        pipe.ltrim(QUEUE_EVENTS_KEY, 0, QUEUE_EVENTS_MAX_LEN - 1)
+
+
+async def publish_outbox_async(redis_client: redis.asyncio.Redis, entries: List[QueueOutbox],
+                               urgency_levels: Optional[Dict[str, str]] = None) -> bool:
+    """Push committed outbox entries to their queues.
+
+    The rows are left for relay_outbox() to delete in bulk, keeping intake
+    at one commit; on a Redis error it is also the one that enqueues them.
+    """
+    if not entries:
+        return True
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _enqueue_commands(pipe, entries, urgency_levels)
+        await pipe.execute()
+    except redis.RedisError as e:
+        logger.error(f"Redis error, {len(entries)} cases left in the outbox: {str(e)}")
+        return False
+    return True
+
+
+def publish_outbox(redis_client: redis.Redis, entries: List[QueueOutbox],
+                   urgency_levels: Optional[Dict[str, str]] = None) -> bool:
+    if not entries:
+        return True
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        _enqueue_commands(pipe, entries, urgency_levels)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.error(f"Redis error, {len(entries)} cases left in the outbox: {str(e)}")
+        return False
+    return True
+
+
+def relay_outbox(db: Session, redis_client: redis.Redis, limit: int = OUTBOX_RELAY_BATCH,
+                 grace_seconds: Optional[float] = OUTBOX_RELAY_GRACE_SECONDS) -> int:
+    """Delete outbox rows past the grace window, enqueueing those whose request did not get to Redis.
+
+    Safe to run from every worker, rows are claimed with SKIP LOCKED. Most
+    rows were already pushed by their request; only cases still pending
+    and neither queued nor leased by a consumer are enqueued, so a pushed
+    case keeps its current score and aging.
+    """
+    query = select(QueueOutbox).order_by(QueueOutbox.created_at).limit(limit).with_for_update(skip_locked=True)
+    if grace_seconds:
+        query = query.where(QueueOutbox.created_at < datetime.now() - timedelta(seconds=grace_seconds))
+    entries = list(db.scalars(query))
+    if not entries:
+        db.rollback()
+        return 0
+    urgency_levels = {
+        case_id: getattr(urgency, "value", urgency)
+        for case_id, urgency in db.execute(
+            select(Case.case_id, Patient.urgency_level)
+            .join(Patient, Patient.patient_id == Case.patient_id)
+            .where(Case.case_id.in_([entry.case_id for entry in entries]), Case.status == "pending")
+        )
+    }
+    pending = [entry for entry in entries if entry.case_id in urgency_levels]
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for entry in pending:
+            pipe.zscore(queue_key(entry.hospital_id), entry.case_id)
+            pipe.zscore(inflight_key(entry.hospital_id), entry.case_id)
+        scores = pipe.execute()
+        missing = [entry for entry, queued, leased in zip(pending, scores[::2], scores[1::2])
+                   if queued is None and leased is None]
+        pipe = redis_client.pipeline(transaction=False)
+        _enqueue_commands(pipe, missing, urgency_levels)
+        pipe.execute()
+    except redis.RedisError:
+        db.rollback()
+        raise
+    db.execute(delete(QueueOutbox).where(QueueOutbox.id.in_([entry.id for entry in entries])))
+    db.commit()
+    if missing:
+        logger.info(f"Relayed {len(missing)} of {len(entries)} queue outbox entries")
+    return len(entries)
@@ -0,0 +1,141 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import Case, Patient, UrgencyLevelEnum
+from services.priority_engine import aging_commands, aging_progress, priority_score, queue_score
+from services.queue_keys import queue_key
+
+REPRIORITIZE_BATCH_SIZE = int(os.getenv("REPRIORITIZE_BATCH_SIZE", "1000"))
+# A rebuild that dies half way leaves its shadow key behind, let it expire
+SHADOW_KEY_TTL_SECONDS = 600
+DEFAULT_SLA_MINUTES = 120
+
+# KEYS: shadow, queue. Only cases still in the live queue survive the
+# swap: those leased or acked while the shadow was being built are dropped,
+# those enqueued meanwhile are carried over with their live score. Then the
+# shadow replaces the live queue in one step.
+SWAP_SCRIPT = """
+local shadow, queue = KEYS[1], KEYS[2]
+local rebuilt = redis.call('ZRANGE', shadow, 0, -1)
+for _, case_id in ipairs(rebuilt) do
+    if not redis.call('ZSCORE', queue, case_id) then
+        redis.call('ZREM', shadow, case_id)
+    end
+end
+local live = redis.call('ZRANGE', queue, 0, -1, 'WITHSCORES')
+for i = 1, #live, 2 do
+    redis.call('ZADD', shadow, 'NX', live[i + 1], live[i])
+end
+if redis.call('EXISTS', shadow) == 1 then
+    redis.call('PERSIST', shadow)
+    redis.call('RENAME', shadow, queue)
+else
+    redis.call('DEL', queue)
+end
+return redis.call('ZCARD', queue)
+"""
+
+
+def shadow_key(hospital_id: str) -> str:
+    return f"{queue_key(hospital_id)}:rebuild"
+
+
+def changed_urgency_levels(old_rules: Optional[Dict], new_rules: Optional[Dict]) -> Set[str]:
+    """Urgency levels whose SLA minutes differ between two rule sets."""
+    old_rules, new_rules = old_rules or {}, new_rules or {}
+    return {
+        level.value for level in UrgencyLevelEnum
+        if old_rules.get(level.value, DEFAULT_SLA_MINUTES) != new_rules.get(level.value, DEFAULT_SLA_MINUTES)
+    }
+
+
+def sla_deadline(created_at: datetime, urgency_level, sla_rules: Dict) -> datetime:
+    level = getattr(urgency_level, "value", urgency_level)
+    return created_at + timedelta(minutes=sla_rules.get(level, DEFAULT_SLA_MINUTES))
+
+
+def pending_cases_query(hospital_id: str, urgency_levels: Optional[Iterable[str]] = None):
+    """Scoring inputs of a hospital's pending cases in one join, batched."""
+    query = (
+        select(Case.case_id, Case.created_at, Patient.urgency_level, Patient.triage_score, Case.ml_priority_score)
+        .join(Patient, Patient.patient_id == Case.patient_id)
+        .where(Case.hospital_id == hospital_id, Case.status == "pending")
+    )
+    if urgency_levels is not None:
+        query = query.where(Patient.urgency_level.in_([UrgencyLevelEnum(level) for level in urgency_levels]))
+    return query.execution_options(yield_per=REPRIORITIZE_BATCH_SIZE)
+
+
+def _rescore_commands(pipe, target: str, hospital_id: str, rows, sla_rules: Dict, in_place: bool):
+    """Queue scores with the aging credit earned so far, and the next aging bucket of each case."""
+    now = time.time()
+    scores = {}
+    for case_id, created_at, urgency_level, triage_score, ml_priority_score in rows:
+        enqueued_at = created_at.timestamp()
+        credit, applied = aging_progress(now - enqueued_at)
+        priority = priority_score(urgency_level, triage_score, ml_priority_score)
+        scores[case_id] = queue_score(sla_deadline(created_at, urgency_level, sla_rules), priority, credit)
+        aging_commands(pipe, hospital_id, case_id, enqueued_at, applied)
+    pipe.zadd(target, scores, xx=in_place)
+
+
+class QueueReprioritizer:
+    """Recomputes the queue scores of a hospital after its SLA rules change.
+
+    With the changed urgency levels known, only the pending cases of those
+    levels are rescored, in place with ZADD XX so cases that are leased or
+    already gone are not re-queued. Without them the whole queue is rebuilt
+    into a shadow key and swapped in atomically, so consumers never see an
+    empty queue. Either way the scores come from one joined query, streamed
+    and sent one pipeline per REPRIORITIZE_BATCH_SIZE cases, and the aging
+    schedule of the rescored cases is rebuilt along with them.
+    """
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self._swap = redis_client.register_script(SWAP_SCRIPT)
+
+    def run(self, db: Session, hospital_id: str, sla_rules: Dict, urgency_levels: Optional[Set[str]] = None) -> int:
+        """Returns the number of cases rescored."""
+        if urgency_levels is not None and not urgency_levels:
+            return 0
+        rescored = 0
+        target = queue_key(hospital_id) if urgency_levels is not None else shadow_key(hospital_id)
+        if urgency_levels is None:
+            self.redis_client.delete(target)
+        for rows in db.execute(pending_cases_query(hospital_id, urgency_levels)).partitions():
+            pipe = self.redis_client.pipeline(transaction=False)
+            _rescore_commands(pipe, target, hospital_id, rows, sla_rules, in_place=urgency_levels is not None)
+            if urgency_levels is None:
+                pipe.expire(target, SHADOW_KEY_TTL_SECONDS)
+            pipe.execute()
+            rescored += len(rows)
+        if urgency_levels is None:
+            self._swap(keys=[shadow_key(hospital_id), queue_key(hospital_id)])
+        return rescored
+
+    async def run_async(self, db: AsyncSession, hospital_id: str, sla_rules: Dict,
+                        urgency_levels: Optional[Set[str]] = None) -> int:
+        if urgency_levels is not None and not urgency_levels:
+            return 0
+        rescored = 0
+        target = queue_key(hospital_id) if urgency_levels is not None else shadow_key(hospital_id)
+        if urgency_levels is None:
+            await self.redis_client.delete(target)
+        result = await db.stream(pending_cases_query(hospital_id, urgency_levels))
+        async for rows in result.partitions():
+            pipe = self.redis_client.pipeline(transaction=False)
+            _rescore_commands(pipe, target, hospital_id, rows, sla_rules, in_place=urgency_levels is not None)
+            if urgency_levels is None:
+                pipe.expire(target, SHADOW_KEY_TTL_SECONDS)
+            await pipe.execute()
+            rescored += len(rows)
+        if urgency_levels is None:
+            await self._swap(keys=[shadow_key(hospital_id), queue_key(hospital_id)])
+        return rescored
@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+import redis
+from redis.client import Pipeline
+
+logger = logging.getLogger(__name__)
+
+REDIS_BATCH_MAX_COMMANDS = int(os.getenv("REDIS_BATCH_MAX_COMMANDS", "500"))
+REDIS_BATCH_MAX_DELAY_MS = float(os.getenv("REDIS_BATCH_MAX_DELAY_MS", "50"))
+
+
+class RedisBatcher:
+    """Coalesces Redis writes into one pipeline round trip.
+
+    Writes whose result nobody waits for (lease acks, doctor events, queue
+    inserts, counters) are deferred with defer() and sent along with the
+    next command that does need a reply, through flush(command). They are
+    also sent once REDIS_BATCH_MAX_COMMANDS are waiting, when the oldest has
+    waited REDIS_BATCH_MAX_DELAY_MS by the time the next one is deferred, or
+    on an explicit flush(). batch() opens an explicit pipeline context for
+    bulk paths that is sent when the outermost context exits.
+
+    Deferred writes must be safe to lose on a crash. Callers flush before
+    blocking, otherwise deferred writes wait until the next call.
+    """
+
+    def __init__(self, redis_client: redis.Redis, max_commands: int = REDIS_BATCH_MAX_COMMANDS,
+                 max_delay: float = REDIS_BATCH_MAX_DELAY_MS / 1000):
+        self.redis_client = redis_client
+        self.max_commands = max_commands
+        self.max_delay = max_delay
+        self._lock = threading.RLock()
+        self._pipe: Optional[Pipeline] = None
+        self._opened = 0.0
+        self._depth = 0
+        self.round_trips = 0
+        self.commands = 0
+
+    def _pipeline(self) -> Pipeline:
+        if self._pipe is None:
+            self._pipe = self.redis_client.pipeline(transaction=False)
+            self._opened = time.monotonic()
+        return self._pipe
+
+    def _due(self) -> bool:
+        return len(self._pipe) >= self.max_commands or time.monotonic() - self._opened >= self.max_delay
+
+    def defer(self, command: Callable[[Pipeline], Any]):
+        """Queue the commands `command` issues on the pipeline without waiting for them."""
+        with self._lock:
+            command(self._pipeline())
+            if self._depth == 0 and self._due():
+                self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pipe) if self._pipe is not None else 0
+
+    def flush(self, command: Optional[Callable[[Pipeline], Any]] = None) -> List[Any]:
+        """Send deferred commands, then those `command` issues, in one round trip.
+
+        Returns the replies of the commands `command` issued. Errors of
+        deferred commands are logged; replies to `command` are returned as
+        is, exceptions included, for the caller to handle.
+        """
+        with self._lock:
+            if self._pipe is None and command is None:
+                return []
+            pipe = self._pipeline()
+            deferred = len(pipe)
+            if command is not None:
+                command(pipe)
+            self._pipe = None
+            if not len(pipe):
+                return []
+            self.round_trips += 1
+            self.commands += len(pipe)
+            results = pipe.execute(raise_on_error=False)
+        for result in results[:deferred]:
+            if isinstance(result, Exception):
+                logger.error(f"Redis error in batched command: {str(result)}")
+        return results[deferred:]
+
+    @contextmanager
+    def batch(self) -> Iterator[Pipeline]:
+        """Pipeline context for bulk paths, sent when the outermost batch() exits."""
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self._pipeline()
+            finally:
+                self._depth -= 1
+            if self._depth == 0:
+                self.flush()
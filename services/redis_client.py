@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+import redis
+import redis.asyncio
+
+logger = logging.getLogger(__name__)
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+# How long a caller waits for a free connection once the pool is at REDIS_MAX_CONNECTIONS
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", "5"))
+# Unset by default: consumers block in BLPOP and pub/sub reads, a read timeout
+# must stay above CONSUMER_RESCAN_INTERVAL if one is configured.
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT")) if os.getenv("REDIS_SOCKET_TIMEOUT") else None
+REDIS_POOL_STATS_KEY = "redis_pool_stats"
+REDIS_POOL_STATS_TTL = int(os.getenv("REDIS_POOL_STATS_TTL", "120"))
+
+_lock = threading.Lock()
+_pool: Optional[redis.BlockingConnectionPool] = None
+_client: Optional[redis.Redis] = None
+_pid: Optional[int] = None
+_async_pool: Optional[redis.asyncio.BlockingConnectionPool] = None
+_async_client: Optional[redis.asyncio.Redis] = None
+_async_pid: Optional[int] = None
+
+
+def _pool_kwargs() -> Dict:
+    return dict(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_keepalive=True,
+    )
+
+
+def _create_pool() -> redis.BlockingConnectionPool:
+    return redis.BlockingConnectionPool(**_pool_kwargs())
+
+
+def _create_async_pool() -> redis.asyncio.BlockingConnectionPool:
+    return redis.asyncio.BlockingConnectionPool(**_pool_kwargs())
+
+
+def get_redis_client() -> redis.Redis:
+    """Process-wide Redis client backed by one bounded connection pool.
+
+    The pool is created on first use and recreated in a forked child, so a
+    pool created in the gunicorn master before --preload forks is never
+    shared with the workers.
+    """
+    global _pool, _client, _pid
+    pid = os.getpid()
+    if _client is None or _pid != pid:
+        with _lock:
+            if _client is None or _pid != pid:
+                _pool = _create_pool()
+                _client = redis.Redis(connection_pool=_pool)
+                _pid = pid
+    return _client
+
+
+def get_redis_pool() -> redis.BlockingConnectionPool:
+    get_redis_client()
+    return _pool
+
+
+def get_async_redis_client() -> redis.asyncio.Redis:
+    """Process-wide redis.asyncio client for the API's event loop.
+
+    Same settings and fork handling as get_redis_client(). Async connections
+    belong to the loop that opened them, which is fine for uvicorn workers
+    that run a single loop per process.
+    """
+    global _async_pool, _async_client, _async_pid
+    pid = os.getpid()
+    if _async_client is None or _async_pid != pid:
+        _async_pool = _create_async_pool()
+        _async_client = redis.asyncio.Redis(connection_pool=_async_pool)
+        _async_pid = pid
+    return _async_client
+
+
+async def close_async_redis_client():
+    global _async_pool, _async_client, _async_pid
+    if _async_client is not None and _async_pid == os.getpid():
+        await _async_client.aclose()
+        await _async_pool.disconnect()
+    _async_pool, _async_client, _async_pid = None, None, None
+
+
+def _reset_after_fork():
+    global _pool, _client, _pid, _async_pool, _async_client, _async_pid
+    # Sockets inherited from the parent belong to it, drop them without closing
+    _pool, _client, _pid = None, None, None
+    _async_pool, _async_client, _async_pid = None, None, None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _empty_stats() -> Dict:
+    return {"created": 0, "in_use": 0, "idle": 0, "max_connections": REDIS_MAX_CONNECTIONS}
+
+
+def pool_stats() -> Dict:
+    """Connection usage of this process' pools. `async` is only reported once the API has used it."""
+    pool = _pool
+    if pool is None or _pid != os.getpid():
+        stats = _empty_stats()
+    else:
+        created = len(pool._connections)
+        idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+        stats = {
+            "created": created,
+            "in_use": created - idle,
+            "idle": idle,
+            "max_connections": pool.max_connections,
+        }
+    async_pool = _async_pool
+    if async_pool is not None and _async_pid == os.getpid():
+        in_use = len(async_pool._in_use_connections)
+        idle = len(async_pool._available_connections)
+        stats["async"] = {
+            "created": in_use + idle,
+            "in_use": in_use,
+            "idle": idle,
+            "max_connections": async_pool.max_connections,
+        }
+    return stats
+
+
+def process_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def publish_process_stats(key: str, stats: Dict, role: str = "web"):
+    """Record one process' stats under its process id in the shared `key` hash."""
+    try:
+        client = get_redis_client()
+        client.hset(key, process_id(), json.dumps({**stats, "role": role, "updated_at": time.time()}))
+        client.expire(key, REDIS_POOL_STATS_TTL)
+    except redis.RedisError as e:
+        logger.error(f"Redis error publishing {key}: {str(e)}")
+
+
+def collect_process_stats(key: str) -> Dict[str, Dict]:
+    """Stats of every process that published to `key` within REDIS_POOL_STATS_TTL."""
+    cutoff = time.time() - REDIS_POOL_STATS_TTL
+    stats = {}
+    for process, entry in get_redis_client().hgetall(key).items():
+        entry = json.loads(entry)
+        if entry.get("updated_at", 0) >= cutoff:
+            stats[process.decode()] = entry
+    return stats
+
+
+def publish_pool_stats(role: str = "web"):
+    """Record this process' Redis pool usage in the shared REDIS_POOL_STATS_KEY hash."""
+    publish_process_stats(REDIS_POOL_STATS_KEY, pool_stats(), role)
+
+
+def collect_pool_stats() -> Dict[str, Dict]:
+    return collect_process_stats(REDIS_POOL_STATS_KEY)
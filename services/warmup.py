@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+
+from database import DB_POOL_SIZE, async_engine, dispose_pools_after_fork, engine
+from ml.features import FEATURE_NAMES
+from ml.inference import get_inference_batcher
+from ml.model_rollout import current_model_version
+from services.redis_client import get_async_redis_client, get_redis_client
+
+logger = logging.getLogger(__name__)
+
+WARMUP_PRELOAD_MODEL = os.getenv("WARMUP_PRELOAD_MODEL", "true").lower() == "true"
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+# Import time, under --preload that is the master's start and workers inherit it
+PROCESS_STARTED_AT = time.time()
+
+
+def preload_model() -> Optional[str]:
+    """Load the fleet's current model in the gunicorn master, before it forks.
+
+    Workers inherit the loaded model: its arrays are mapped from the model
+    cache and the rest is shared copy-on-write, so no worker pays for
+    imports, the download or unpickling on its first request.
+    """
+    if not WARMUP_PRELOAD_MODEL:
+        return None
+    from ml.model_manager import ModelManager
+    start = time.perf_counter()
+    try:
+        announcement = current_model_version(get_redis_client())
+    except Exception as e:
+        logger.error(f"Redis error reading the current model version: {str(e)}")
+        announcement = None
+    manager = ModelManager()
+    if not manager.load_model(announcement["version"] if announcement else None):
+        logger.warning("No model preloaded, workers start without one")
+        return None
+    logger.info(f"Preloaded model version {manager.get_model_version()} in {time.perf_counter() - start:.2f}s")
+    return manager.get_model_version()
+
+
+def reset_after_fork():
+    """Drop connections a worker inherited from the master.
+
+    Redis pools, the inference batcher and S3 clients already reset
+    themselves in a new process; the SQLAlchemy pools are disposed here.
+    """
+    dispose_pools_after_fork()
+
+
+class Warmup:
+    """Per-worker warmup behind the readiness probe.
+
+    Opens DB_POOL_SIZE connections on both engines, connects both Redis
+    clients and runs one prediction through the inference batcher when a
+    model is loaded. Retried every WARMUP_RETRY_INTERVAL until it succeeds;
+    the worker reports ready only then.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.attempts = 0
+        self.error: Optional[str] = None
+        self.steps: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+
+    def _timed(self, name: str, start: float):
+        self.steps[f"{name}_ms"] = (time.perf_counter() - start) * 1000
+
+    def warm_sync(self):
+        start = time.perf_counter()
+        get_redis_client().ping()
+        self._timed("redis", start)
+
+        start = time.perf_counter()
+        connections = [engine.connect() for _ in range(DB_POOL_SIZE)]
+        try:
+            for connection in connections:
+                connection.execute(text("SELECT 1"))
+        finally:
+            for connection in connections:
+                connection.close()
+        self._timed("db", start)
+
+        from ml.model_manager import ModelManager
+        if ModelManager().ml_model_trained:
+            start = time.perf_counter()
+            get_inference_batcher().predict([0.0] * len(FEATURE_NAMES))
+            self._timed("inference", start)
+
+    async def _warm_async_connection(self):
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    async def warm_async(self):
+        start = time.perf_counter()
+        await get_async_redis_client().ping()
+        self._timed("async_redis", start)
+
+        start = time.perf_counter()
+        # Concurrently, so the pool ends up holding DB_POOL_SIZE connections
+        await asyncio.gather(*(self._warm_async_connection() for _ in range(DB_POOL_SIZE)))
+        self._timed("async_db", start)
+
+    async def run(self):
+        while not self.ready:
+            self.attempts += 1
+            try:
+                await run_in_threadpool(self.warm_sync)
+                await self.warm_async()
+                self.ready_at = time.time()
+                self.error = None
+                self.ready = True
+                logger.info(f"Worker ready {self.ready_at - PROCESS_STARTED_AT:.2f}s after start: {self.steps}")
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"Warmup failed, retrying in {WARMUP_RETRY_INTERVAL}s: {str(e)}")
+                await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+
+    def status(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "attempts": self.attempts,
+            "error": self.error,
+            "steps": self.steps,
+            "seconds_to_ready": self.ready_at - PROCESS_STARTED_AT if self.ready_at else None,
+        }
+
+
+warmup = Warmup()
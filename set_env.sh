@@ -9,4 +9,81 @@ export POSTGRES_DB="medical_queue"
 
 export REDIS_HOST="localhost"
 export REDIS_PORT="6379"
-export REDIS_DB="0"
\ No newline at end of file
+export REDIS_DB="0"
+
+# Queue consumer
+export CONSUMER_MODE="event"
+export CONSUMER_RESCAN_INTERVAL="30"
+export CONSUMER_BATCH_SIZE="50"
+export ASSIGNMENT_STRATEGY="greedy"
+export ASSIGNMENT_TIME_BUDGET_MS="250"
+
+# Redis connection pool (per process)
+export REDIS_MAX_CONNECTIONS="50"
+export REDIS_POOL_TIMEOUT="5"
+export REDIS_HEALTH_CHECK_INTERVAL="30"
+export REDIS_SOCKET_CONNECT_TIMEOUT="5"
+export REDIS_BATCH_MAX_COMMANDS="500"
+export REDIS_BATCH_MAX_DELAY_MS="50"
+
+# SQLAlchemy engines (per engine, per process)
+export DB_POOL_SIZE="5"
+export DB_MAX_OVERFLOW="10"
+export DB_POOL_TIMEOUT="30"
+export DB_POOL_RECYCLE="1800"
+export DB_POOL_PRE_PING="true"
+export DB_STATEMENT_TIMEOUT_MS="30000"
+
+# Case intake
+export HOSPITAL_CACHE_TTL_SECONDS="60"
+export OUTBOX_RELAY_INTERVAL="5"
+export OUTBOX_RELAY_GRACE_SECONDS="5"
+export BULK_INTAKE_BATCH_SIZE="500"
+
+# Queue re-prioritization
+export REPRIORITIZE_BATCH_SIZE="1000"
+
+# Queue priority scoring and aging
+export PRIORITY_WEIGHT_URGENCY="0.5"
+export PRIORITY_WEIGHT_TRIAGE="0.3"
+export PRIORITY_WEIGHT_ML="0.2"
+export TRIAGE_SCORE_MAX="10"
+export PRIORITY_HORIZON_SECONDS="1800"
+export AGING_BUCKETS="1800:300,3600:600,7200:900,14400:1800"
+export AGING_REFRESH_INTERVAL="60"
+
+# Online ML inference
+export ML_INFERENCE_MAX_BATCH="64"
+export ML_INFERENCE_MAX_WAIT_MS="5"
+export ML_INFERENCE_EXECUTOR="inline"
+export ML_INFERENCE_WORKERS="2"
+export ML_INFERENCE_TIMEOUT="1"
+export ML_PRIORITY_DURATION_SCALE="120"
+export ML_TRAIN_CHUNK_SIZE="50000"
+export ML_TRAIN_N_JOBS="-1"
+
+# ML training jobs
+export TRAINING_JOB_TTL="604800"
+export TRAINING_JOB_TIMEOUT="3600"
+
+# ML model store and local cache
+export MODEL_STORE="s3"
+export MODEL_STORE_DIR="/var/lib/medical-queue/models"
+export MODEL_CACHE_DIR="/tmp/model_cache"
+export MODEL_CACHE_MAX_BYTES="2147483648"
+export MODEL_CACHE_LOCK_TIMEOUT="300"
+export MODEL_CACHE_VERIFY="true"
+export MODEL_VERSION_POLL_INTERVAL="60"
+
+# Startup warmup
+export WARMUP_PRELOAD_MODEL="true"
+export WARMUP_RETRY_INTERVAL="5"
+
+# Incremental training
+export OUTCOME_STREAM_MAXLEN="1000000"
+export INCREMENTAL_TRAIN_INTERVAL="900"
+export FULL_RETRAIN_INTERVAL="86400"
+export INCREMENTAL_TREES="10"
+export INCREMENTAL_MAX_TREES="300"
+export INCREMENTAL_MIN_ROWS="50"
+export INCREMENTAL_MAX_ROWS="100000"
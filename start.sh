@@ -1,2 +1,8 @@
 #!/bin/bash
-gunicorn -w ${WEB_WORKERS:=4} -k uvicorn.workers.UvicornWorker main:app --bind ${HOST:=0.0.0.0}:${PORT:=8000} --access-logfile - --error-logfile - --log-level ${LOG_LEVEL:=info} --timeout ${TIMEOUT:=300} --preload
\ No newline at end of file
+# Each worker holds a sync and an async engine of DB_POOL_SIZE + DB_MAX_OVERFLOW connections each,
+# keep 2 * WEB_WORKERS * (DB_POOL_SIZE + DB_MAX_OVERFLOW) plus the consumers under Postgres max_connections.
+# GET /metrics/db-pool reports checkout wait and saturation per worker.
+# gunicorn.conf.py loads the current model in the master before forking; GET /health/ready
+# answers 503 in a worker until its warmup is done.
+python database.py || exit 1
+gunicorn -c gunicorn.conf.py -w ${WEB_WORKERS:=4} -k uvicorn.workers.UvicornWorker main:app --bind ${HOST:=0.0.0.0}:${PORT:=8000} --access-logfile - --error-logfile - --log-level ${LOG_LEVEL:=info} --timeout ${TIMEOUT:=300} --preload
@@ -0,0 +1,74 @@
+import logging
+import os
+import signal
+import sys
+import time
+import traceback
+
+import redis
+
+from database import init_db
+from ml.model_manager import ModelManager
+from ml.model_rollout import publish_model_version
+from ml.training_jobs import MODE_INCREMENTAL, TRAINING_QUEUE_KEY, TrainingJobReporter
+from services.redis_client import get_redis_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRAINING_POLL_TIMEOUT = int(os.getenv("TRAINING_POLL_TIMEOUT", "30"))
+
+
+class TrainingWorker:
+    """Runs queued training jobs one at a time, away from the web workers.
+
+    The new model is saved to S3 under its version and, once it passed
+    validation, announced as the fleet's current version; pods load it
+    through their ModelVersionWatcher, so training never holds a pod's
+    model loading lock.
+    """
+
+    def __init__(self):
+        self.redis_client = get_redis_client()
+        self.model_manager = ModelManager()
+
+    def run_job(self, job_id: str):
+        reporter = TrainingJobReporter(self.redis_client, job_id)
+        reporter.start()
+        mode = reporter.job.get("mode")
+        logger.info(f"Training job {job_id} started ({mode})")
+        try:
+            if mode == MODE_INCREMENTAL:
+                metrics = self.model_manager.train_incremental(progress=reporter.progress)
+            else:
+                metrics = self.model_manager.train_ml_model(progress=reporter.progress)
+            metrics['announced'] = not metrics.get('skipped') and metrics.get('accepted', True)
+            if metrics['announced']:
+                publish_model_version(self.redis_client, metrics['version'])
+            reporter.succeed(metrics)
+            logger.info(f"Training job {job_id} finished, version {metrics.get('version')} "
+                        f"({'announced' if metrics['announced'] else 'not announced'})")
+        except Exception as e:
+            logger.error(f"Training job {job_id} failed: {str(e)}")
+            logger.error(f"Traceback -{traceback.format_exc()}")
+            reporter.fail(str(e))
+        finally:
+            reporter.release()
+
+    def run(self):
+        while True:
+            try:
+                job = self.redis_client.blpop([TRAINING_QUEUE_KEY], timeout=TRAINING_POLL_TIMEOUT)
+                if job:
+                    self.run_job(job[1].decode())
+            except redis.RedisError as e:
+                logger.error(f"Redis error: {str(e)}")
+                time.sleep(5)
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    init_db()
+    worker = TrainingWorker()
+    logger.info("Starting ML training worker...")
+    worker.run()